@@ -145,7 +145,7 @@ Tip: to add of silence (2 seconds) into your text just use "###" or "[pause]".
         '--custom_model', '--fine_tuned', '--output_format',
         '--temperature', '--length_penalty', '--num_beams', '--repetition_penalty',
         '--top_k', '--top_p', '--speed', '--enable_text_splitting', 
-        '--output_dir', '--version', '--workflow', '--help'
+        '--output_dir', '--version', '--workflow', '--parse_workers', '--streaming', '--tts_batch_size', '--tts_workers', '--help'
     ]
     #tts_engine_list = [k for k in models.keys() if k != BARK]
     tts_engine_list = [k for k in models.keys()]
@@ -172,7 +172,8 @@ Tip: to add of silence (2 seconds) into your text just use "###" or "[pause]".
     headless_optional_group.add_argument(options[10], type=str, default=None, help=f'''(Optional) Path to the custom model zip file cntaining mandatory model files. 
     Please refer to ./lib/models.py''')
     headless_optional_group.add_argument(options[11], type=str, default=default_fine_tuned, help='''(Optional) Fine tuned model path. Default is builtin model.''')
-    headless_optional_group.add_argument(options[12], type=str, default=default_output_format, help=f'''(Optional) Output audio format. Default is set in ./lib/conf.py''')
+    headless_optional_group.add_argument(options[12], type=str, default=default_output_format, help=f'''(Optional) Output audio format, or comma separated formats exported in parallel (e.g. m4b,mp3,ogg). 
+    Default is set in ./lib/conf.py''')
     headless_optional_group.add_argument(options[13], type=float, default=None, help=f"""(xtts only, optional) Temperature for the model. 
     Default to config.json model. Higher temperatures lead to more creative outputs.""")
     headless_optional_group.add_argument(options[14], type=float, default=None, help=f"""(xtts only, optional) A length penalty applied to the autoregressive decoder. 
@@ -190,6 +191,14 @@ Tip: to add of silence (2 seconds) into your text just use "###" or "[pause]".
     Default to config.json model.""")
     headless_optional_group.add_argument(options[20], action='store_true', help=f"""(xtts only, optional) Enable TTS text splitting. This option is known to not be very efficient. 
     Default to config.json model.""")                     
+    headless_optional_group.add_argument(options[24], type=int, default=default_parse_workers, help=f'''(Optional) Number of processes parsing the ebook documents in parallel. 
+    Default is set in ./lib/conf.py (1 = serial parsing).''')
+    headless_optional_group.add_argument(options[25], action='store_true', help=f'''(Optional) Start the conversion of the first blocks while the rest of the ebook 
+    is still being parsed. Lowers the time to first audio and the memory used on long ebooks.''')
+    headless_optional_group.add_argument(options[26], type=int, default=default_tts_batch_size, help=f'''(xtts only, optional) Number of sentences synthesized together on the GPU. 
+    Default is set in ./lib/conf.py (1 = one sentence at a time).''')
+    headless_optional_group.add_argument(options[27], type=int, default=default_tts_workers, help=f'''(Optional) Number of TTS processes converting the sentences in parallel, 
+    each one with its own model, spread over the available GPUs. Default is set in ./lib/conf.py (1 = single process).''')
     headless_optional_group.add_argument(options[21], type=str, help=f'''(Optional) Path to the output directory. Default is set in ./lib/conf.py''')
     headless_optional_group.add_argument(options[22], action='version', version=f'ebook2audiobook version {prog_version}', help='''Show the version of the script and exit''')
     headless_optional_group.add_argument(options[23], action='store_true', help=argparse.SUPPRESS)
@@ -0,0 +1,145 @@
+import json
+import os
+import regex as re
+import soundfile as sf
+import zlib
+
+class ConversionJournal:
+    """
+    Append-only journal of the sentence and block audio files already converted.
+
+    Each line records a file once it is complete: its kind, number, size,
+    crc32, frame count and sample rate. On load the journal is read in one pass and every entry is checked
+    against its file size (and crc32 when verify_checksums is set), so files
+    truncated or damaged by a crash are converted again. Sessions converted
+    before the journal existed are indexed once from their directories, keeping
+    only the audio files that decode to the end. Lookups are dict based.
+    """
+
+    def __init__(self, path, sentences_dir, chapters_dir, audio_format, chapter_format=None, verify_checksums=False):
+        self.path = path
+        self.sentences_dir = sentences_dir
+        self.chapters_dir = chapters_dir
+        self.audio_format = audio_format
+        self.chapter_format = chapter_format or audio_format
+        self.verify_checksums = verify_checksums
+        self.sentences = {}
+        self.chapters = {}
+        self.file = None
+
+    def get_sentence_path(self, sentence_number):
+        return os.path.join(self.sentences_dir, f'{sentence_number}.{self.audio_format}')
+
+    def get_chapter_path(self, chapter_num):
+        return os.path.join(self.chapters_dir, f'chapter_{chapter_num}.{self.chapter_format}')
+
+    @staticmethod
+    def checksum(file_path):
+        crc = 0
+        with open(file_path, 'rb') as f:
+            while chunk := f.read(1024 * 1024):
+                crc = zlib.crc32(chunk, crc)
+        return crc
+
+    @staticmethod
+    def is_complete_audio(file_path):
+        # The last frame only decodes when the file was written to the end
+        try:
+            with sf.SoundFile(file_path) as f:
+                if f.frames <= 0:
+                    return False
+                f.seek(f.frames - 1)
+                return len(f.read(1)) == 1
+        except Exception:
+            return False
+
+    @staticmethod
+    def get_frames(file_path):
+        info = sf.info(file_path)
+        return [info.frames, info.samplerate]
+
+    def _entries(self):
+        return {'sentence': self.sentences, 'chapter': self.chapters}
+
+    def _index_dirs(self):
+        patterns = [
+            (self.sentences, self.sentences_dir, re.compile(rf'^(\d+)\.{self.audio_format}$')),
+            (self.chapters, self.chapters_dir, re.compile(rf'^chapter_(\d+)\.{self.chapter_format}$'))
+        ]
+        for entries, directory, pattern in patterns:
+            if not os.path.isdir(directory):
+                continue
+            for entry in os.scandir(directory):
+                match = pattern.match(entry.name)
+                if match and self.is_complete_audio(entry.path):
+                    entries[int(match.group(1))] = [entry.stat().st_size, self.checksum(entry.path), *self.get_frames(entry.path)]
+
+    def load(self):
+        entries = self._entries()
+        if os.path.exists(self.path):
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        kind, number, *entry = json.loads(line)
+                    except ValueError:
+                        # Last line cut by a crash
+                        continue
+                    if kind in entries and len(entry) >= 2:
+                        entries[kind][number] = entry
+        else:
+            self._index_dirs()
+        for kind, path_func in (('sentence', self.get_sentence_path), ('chapter', self.get_chapter_path)):
+            for number, entry in list(entries[kind].items()):
+                file_path = path_func(number)
+                size, crc = entry[:2]
+                try:
+                    valid = os.path.getsize(file_path) == size and (not self.verify_checksums or self.checksum(file_path) == crc)
+                    if valid and len(entry) < 4:
+                        # Entry written before the frame counts were journaled
+                        entry[2:] = self.get_frames(file_path)
+                except Exception:
+                    valid = False
+                if not valid:
+                    if os.path.exists(file_path):
+                        msg = f'**Truncated or corrupted {kind} file {file_path}, it will be converted again'
+                        print(msg)
+                    del entries[kind][number]
+        # Rewrite the journal without the invalid or superseded entries
+        tmp_path = f'{self.path}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for kind in ('sentence', 'chapter'):
+                for number, entry in sorted(entries[kind].items()):
+                    f.write(json.dumps([kind, number, *entry]) + '\n')
+        os.replace(tmp_path, self.path)
+        self.file = open(self.path, 'a', encoding='utf-8')
+        return self
+
+    def _record(self, kind, number, file_path):
+        entry = [os.path.getsize(file_path), self.checksum(file_path), *self.get_frames(file_path)]
+        self._entries()[kind][number] = entry
+        self.file.write(json.dumps([kind, number, *entry]) + '\n')
+        self.file.flush()
+
+    def record_sentence(self, sentence_number):
+        self._record('sentence', sentence_number, self.get_sentence_path(sentence_number))
+
+    def record_chapter(self, chapter_num):
+        self._record('chapter', chapter_num, self.get_chapter_path(chapter_num))
+
+    def has_sentence(self, sentence_number):
+        return sentence_number in self.sentences
+
+    def has_chapter(self, chapter_num):
+        return chapter_num in self.chapters
+
+    def get_sentence_frames(self):
+        # {sentence_number: (frames, sample_rate)} of the converted sentences
+        return {number: (entry[2], entry[3]) for number, entry in self.sentences.items()}
+
+    def get_sentence_files(self, start, end):
+        return [self.get_sentence_path(n) for n in range(start, end + 1) if n in self.sentences]
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
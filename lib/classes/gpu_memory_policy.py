@@ -0,0 +1,79 @@
+import csv
+import os
+import torch
+
+class GpuMemoryPolicy:
+    """
+    When the CUDA caching allocator gives its cached blocks back to the driver.
+
+    torch.cuda.empty_cache() makes the next inference allocate its memory again,
+    so it is only called as the policy says:
+        'never': the cache is never emptied
+        'every_n': every `every` converted sentences
+        'oom': only after an out of memory, before the engine retries
+    With stats_file set, the allocator stats of each converted sentence are
+    appended to it as csv (the peak is the one since the previous sentence).
+    """
+
+    policies = ('never', 'every_n', 'oom')
+    stats_fields = ['pid', 'sentence', 'allocated_mb', 'reserved_mb', 'peak_allocated_mb', 'alloc_retries', 'ooms', 'emptied']
+
+    def __init__(self, device, policy='oom', every=50, stats_file=None):
+        if policy not in self.policies:
+            error = f'Unknown GPU memory policy {policy}, expected one of {self.policies}'
+            raise ValueError(error)
+        self.enabled = device == 'cuda' and torch.cuda.is_available()
+        self.policy = policy
+        self.every = max(1, int(every))
+        self.stats_file = stats_file if self.enabled else None
+        self.sentences = 0
+        self.ooms = 0
+        self.last_stats = None
+
+    @staticmethod
+    def is_oom(e):
+        return isinstance(e, torch.cuda.OutOfMemoryError) or 'out of memory' in str(e).lower()
+
+    def empty_cache(self):
+        if self.enabled:
+            torch.cuda.empty_cache()
+
+    def on_oom(self):
+        self.ooms += 1
+        if self.policy != 'never':
+            self.empty_cache()
+
+    def get_stats(self):
+        stats = torch.cuda.memory_stats()
+        return {
+            'allocated_mb': round(stats.get('allocated_bytes.all.current', 0) / 2**20, 1),
+            'reserved_mb': round(stats.get('reserved_bytes.all.current', 0) / 2**20, 1),
+            'peak_allocated_mb': round(stats.get('allocated_bytes.all.peak', 0) / 2**20, 1),
+            'alloc_retries': stats.get('num_alloc_retries', 0),
+            'ooms': self.ooms
+        }
+
+    def _write_stats(self, row):
+        try:
+            new_file = not os.path.exists(self.stats_file)
+            with open(self.stats_file, 'a', newline='', encoding='utf-8') as f:
+                writer = csv.DictWriter(f, fieldnames=self.stats_fields)
+                if new_file:
+                    writer.writeheader()
+                writer.writerow(row)
+        except OSError as e:
+            error = f'Could not write the GPU memory stats to {self.stats_file}: {e}'
+            print(error)
+            self.stats_file = None
+
+    def sentence_done(self, sentence_number):
+        if not self.enabled:
+            return
+        self.sentences += 1
+        emptied = self.policy == 'every_n' and self.sentences % self.every == 0
+        self.last_stats = self.get_stats()
+        torch.cuda.reset_peak_memory_stats()
+        if self.stats_file is not None:
+            self._write_stats(dict(self.last_stats, pid=os.getpid(), sentence=sentence_number, emptied=int(emptied)))
+        if emptied:
+            self.empty_cache()
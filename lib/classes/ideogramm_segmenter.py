@@ -0,0 +1,64 @@
+import threading
+
+class IdeogrammSegmenter:
+    """
+    Process-wide registry of word segmenters for languages written without spaces
+    (jieba, MeCab, Kkma, pythainlp).
+
+    Each segmenter is created lazily the first time its language is needed and
+    reused for every chapter and book afterwards. Kkma starts a JVM and MeCab loads
+    its dictionary, so building them once per chapter was costing seconds each time.
+    """
+
+    languages = ['zho', 'jpn', 'kor', 'tha', 'lao', 'mya', 'khm']
+
+    def __init__(self):
+        self.segmenters = {}
+        self.lock = threading.Lock()
+        self.locks = {}
+
+    def _build(self, lang):
+        if lang == 'zho':
+            import jieba
+            jieba.initialize()
+            return lambda text: list(jieba.cut(text))
+        elif lang == 'jpn':
+            import MeCab
+            mecab = MeCab.Tagger()
+            return lambda text: mecab.parse(text).split()
+        elif lang == 'kor':
+            from konlpy.tag import Kkma
+            kkma = Kkma()
+            return kkma.morphs
+        elif lang in ['tha', 'lao', 'mya', 'khm']:
+            from pythainlp.tokenize import word_tokenize
+            return lambda text: word_tokenize(text, engine='newmm')
+        return None
+
+    def _get(self, lang):
+        segmenter = self.segmenters.get(lang)
+        if segmenter is None:
+            with self.lock:
+                segmenter = self.segmenters.get(lang)
+                if segmenter is None:
+                    segmenter = self._build(lang)
+                    if segmenter is None:
+                        error = f'No ideogramm segmenter for language {lang}'
+                        raise ValueError(error)
+                    self.locks[lang] = threading.Lock()
+                    self.segmenters[lang] = segmenter
+        return segmenter, self.locks[lang]
+
+    def segment(self, text, lang):
+        segmenter, lock = self._get(lang)
+        # MeCab and Kkma instances are not thread safe
+        with lock:
+            return segmenter(text)
+
+    def segment_batch(self, texts, lang):
+        # One lock acquisition for all the chapters of a book
+        segmenter, lock = self._get(lang)
+        with lock:
+            return [segmenter(text) for text in texts]
+
+ideogramm_segmenter = IdeogrammSegmenter()
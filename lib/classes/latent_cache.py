@@ -0,0 +1,65 @@
+import hashlib
+import os
+import torch
+
+class LatentCache:
+    """
+    On-disk cache of XTTS speaker latents shared by every session and process.
+
+    An entry is a .pt file holding the gpt_cond_latent and speaker_embedding
+    tensors of a voice. Its key combines the sha256 of the voice file content
+    with the identity (path, size, mtime) of the model checkpoint, so editing
+    or replacing either one leads to a new entry instead of stale latents.
+    Entries are written to a temporary file then renamed, so concurrent
+    processes never read a partial file.
+    """
+
+    version = 1
+
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        # voice content hashes already computed by this process, keyed by (path, size, mtime)
+        self.file_hashes = {}
+
+    def get_file_hash(self, file_path):
+        stat = os.stat(file_path)
+        file_id = (os.path.abspath(file_path), stat.st_size, stat.st_mtime_ns)
+        if file_id not in self.file_hashes:
+            hash_func = hashlib.sha256()
+            with open(file_path, 'rb') as f:
+                while chunk := f.read(1024 * 1024):
+                    hash_func.update(chunk)
+            self.file_hashes[file_id] = hash_func.hexdigest()
+        return self.file_hashes[file_id]
+
+    def get_key(self, voice_path, checkpoint_path):
+        parts = [self.version, self.get_file_hash(voice_path)]
+        if checkpoint_path is not None and os.path.exists(checkpoint_path):
+            stat = os.stat(checkpoint_path)
+            parts += [os.path.abspath(checkpoint_path), stat.st_size, stat.st_mtime_ns]
+        else:
+            parts.append(checkpoint_path)
+        return hashlib.sha256('|'.join(str(part) for part in parts).encode('utf-8')).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f'{key}.pt')
+
+    def load(self, key):
+        try:
+            latents = torch.load(self._path(key), map_location='cpu')
+            return latents['gpt_cond_latent'], latents['speaker_embedding']
+        except (OSError, KeyError, RuntimeError, EOFError):
+            return None
+
+    def save(self, key, gpt_cond_latent, speaker_embedding):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_path = f'{self._path(key)}.{os.getpid()}.tmp'
+        try:
+            torch.save({
+                'gpt_cond_latent': gpt_cond_latent.detach().cpu(),
+                'speaker_embedding': speaker_embedding.detach().cpu()
+            }, tmp_path)
+            os.replace(tmp_path, self._path(key))
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
@@ -0,0 +1,166 @@
+import json
+import os
+import numpy as np
+import soundfile as sf
+
+from scipy.signal import lfilter, resample_poly
+
+class LoudnessMeter:
+    """
+    ITU-R BS.1770 / EBU R128 loudness of the audiobook, measured block by block.
+
+    Each block file is measured once: its K-weighted power per 100 ms and its
+    true peak are cached in cache_dir, keyed by the file name, size and mtime,
+    so a resumed or exported again book only measures its new or changed
+    blocks. The integrated loudness and loudness range of the book are then
+    computed from the concatenated 100 ms powers with the BS.1770 gating, as a
+    single pass over the whole book would, and turned into the linear gain
+    reaching target_i without going over target_tp.
+    """
+
+    version = 2
+    # Half length of the resample_poly() 4x interpolation filter, in input samples
+    peak_overlap = 10
+
+    def __init__(self, cache_dir, target_i=-16.0, target_tp=-1.5):
+        self.cache_dir = cache_dir
+        self.target_i = target_i
+        self.target_tp = target_tp
+
+    @staticmethod
+    def get_k_weighting(sample_rate):
+        # Pre-filter (high shelf) and RLB high-pass of BS.1770, designed for the sample rate
+        f0, gain, q = 1681.974450955533, 3.999843853973347, 0.7071752369554196
+        k = np.tan(np.pi * f0 / sample_rate)
+        vh = 10 ** (gain / 20)
+        vb = vh ** 0.4996667741545416
+        a0 = 1 + k / q + k * k
+        shelf = (
+            [(vh + vb * k / q + k * k) / a0, 2 * (k * k - vh) / a0, (vh - vb * k / q + k * k) / a0],
+            [1, 2 * (k * k - 1) / a0, (1 - k / q + k * k) / a0]
+        )
+        f0, q = 38.13547087602444, 0.5003270373238773
+        k = np.tan(np.pi * f0 / sample_rate)
+        a0 = 1 + k / q + k * k
+        high_pass = ([1, -2, 1], [1, 2 * (k * k - 1) / a0, (1 - k / q + k * k) / a0])
+        return [shelf, high_pass]
+
+    def get_peak(self, x, start, end):
+        # True peak of x[start:end] on the 4x oversampled signal
+        if end <= start:
+            return 0.0
+        return float(np.abs(resample_poly(x, 4, 1, axis=0)[4 * start:4 * end]).max(initial=0))
+
+    def measure(self, file_path):
+        powers = []
+        peak = 0.0
+        with sf.SoundFile(file_path) as f:
+            hop = max(1, round(f.samplerate / 10))
+            filters = self.get_k_weighting(f.samplerate)
+            states = [np.zeros((2, f.channels)) for _ in filters]
+            rest = np.empty(0)
+            # The oversampling runs over the previous block tail, and a block
+            # end is only measured with the next block, so the interpolation
+            # never sees zeros at a block edge inside the file
+            tail = np.empty((0, f.channels))
+            start = 0
+            for block in f.blocks(blocksize=hop * 600, always_2d=True, dtype='float64'):
+                weighted = block
+                for i, (b, a) in enumerate(filters):
+                    weighted, states[i] = lfilter(b, a, weighted, axis=0, zi=states[i])
+                squares = np.concatenate([rest, (weighted ** 2).sum(axis=1)])
+                count = len(squares) // hop * hop
+                powers.append(squares[:count].reshape(-1, hop).mean(axis=1))
+                rest = squares[count:]
+                x = np.concatenate([tail, block])
+                end = max(start, len(x) - self.peak_overlap)
+                peak = max(peak, self.get_peak(x, start, end))
+                keep = min(len(x), 2 * self.peak_overlap)
+                tail = x[len(x) - keep:]
+                start = end - (len(x) - keep)
+            peak = max(peak, self.get_peak(tail, start, len(tail)))
+        return np.concatenate(powers) if powers else np.empty(0), peak
+
+    def _get_cache_file(self, file_path):
+        return os.path.join(self.cache_dir, f'{os.path.basename(file_path)}.npz')
+
+    def _get_key(self, file_path):
+        stat = os.stat(file_path)
+        return np.array([self.version, stat.st_size, stat.st_mtime_ns], dtype=np.int64)
+
+    def load(self, file_path):
+        try:
+            with np.load(self._get_cache_file(file_path)) as cached:
+                if np.array_equal(cached['key'], self._get_key(file_path)):
+                    return cached['powers'], float(cached['peak'])
+        except (OSError, KeyError, ValueError):
+            pass
+        return None
+
+    def analyze_file(self, file_path):
+        cached = self.load(file_path)
+        if cached is not None:
+            return cached
+        key = self._get_key(file_path)
+        cache_file = self._get_cache_file(file_path)
+        powers, peak = self.measure(file_path)
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            tmp_file = f'{cache_file}.{os.getpid()}.tmp.npz'
+            np.savez(tmp_file, key=key, powers=powers, peak=peak)
+            os.replace(tmp_file, cache_file)
+        except OSError as e:
+            error = f'Could not save the loudness of {file_path}: {e}'
+            print(error)
+        return powers, peak
+
+    @staticmethod
+    def _loudness(power):
+        return -0.691 + 10 * np.log10(np.maximum(power, 1e-20))
+
+    def get_stats(self, measures):
+        # measures: (powers, peak) of each block, in book order
+        powers = np.concatenate([powers for powers, peak in measures]) if measures else np.empty(0)
+        peak = max((peak for powers, peak in measures), default=0.0)
+        stats = {'integrated': None, 'lra': None, 'true_peak': float(20 * np.log10(max(peak, 1e-10)))}
+        if len(powers) < 4:
+            return stats
+        # 400 ms gating blocks overlapping by 75%, absolute then relative gate
+        blocks = np.convolve(powers, np.ones(4) / 4, mode='valid')
+        blocks = blocks[self._loudness(blocks) > -70]
+        if len(blocks) == 0:
+            return stats
+        blocks = blocks[self._loudness(blocks) > self._loudness(blocks.mean()) - 10]
+        stats['integrated'] = float(self._loudness(blocks.mean()))
+        # Loudness range from the 3 s short-term loudness
+        short_term = np.convolve(powers, np.ones(30) / 30, mode='valid')
+        short_term = short_term[self._loudness(short_term) > -70]
+        if len(short_term) > 0:
+            short_term = short_term[self._loudness(short_term) > self._loudness(short_term.mean()) - 20]
+            levels = self._loudness(short_term)
+            stats['lra'] = float(np.percentile(levels, 95) - np.percentile(levels, 10))
+        return stats
+
+    def get_gain(self, stats, tolerance=0):
+        if stats['integrated'] is None:
+            return 0.0
+        max_gain = self.target_tp - stats['true_peak']
+        gain = min(self.target_i - stats['integrated'], max_gain)
+        # The gain of the previous export is kept when close enough, so the
+        # audio encoded with it can be reused (see incremental_export)
+        gain_file = os.path.join(self.cache_dir, 'gain.json')
+        try:
+            with open(gain_file, 'r', encoding='utf-8') as f:
+                previous = json.load(f)['gain']
+            if abs(previous - gain) < tolerance and previous <= max_gain:
+                return previous
+        except (OSError, KeyError, ValueError, TypeError):
+            pass
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            with open(gain_file, 'w', encoding='utf-8') as f:
+                json.dump({'gain': gain}, f)
+        except OSError as e:
+            error = f'Could not save the export gain: {e}'
+            print(error)
+        return gain
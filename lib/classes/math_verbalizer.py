@@ -0,0 +1,118 @@
+import regex as re
+
+from functools import lru_cache
+from num2words import num2words
+
+from lib.lang import default_language_code, language_math_phonemes
+from lib.models import VITS, FAIRSEQ, YOURTTS
+
+@lru_cache(maxsize=None)
+def is_num2words_compat(lang_iso1):
+    try:
+        num2words(1, lang=lang_iso1)
+        return True
+    except NotImplementedError:
+        return False
+    except Exception as e:
+        return False
+
+class MathVerbalizer:
+    """
+    Replaces math symbols and numbers with words for one (language, tts engine) pair.
+
+    Replacement tables and regex patterns are compiled once in _build(),
+    and num2words results are memoized since books repeat the same numbers
+    (years, page numbers, chapter numbers) over and over.
+    """
+
+    ambiguous_symbols = {"-", "/", "*", "x"}
+
+    def __init__(self, lang, lang_iso1, tts_engine, memo_size=4096):
+        self.lang = lang
+        self.lang_iso1 = lang_iso1
+        self.tts_engine = tts_engine
+        self.memo_size = memo_size
+        self._build()
+
+    def _build(self):
+        self.is_num2words_compat = is_num2words_compat(self.lang_iso1)
+        self.phonemes_list = language_math_phonemes.get(self.lang, language_math_phonemes[default_language_code])
+        # Separate ambiguous and non-ambiguous symbols
+        replacements = {k: v for k, v in self.phonemes_list.items() if not k.isdigit()}  # Keep only math symbols
+        self.normal_replacements = {k: v for k, v in replacements.items() if k not in self.ambiguous_symbols}
+        self.ambiguous_replacements = {k: v for k, v in replacements.items() if k in self.ambiguous_symbols}
+        self.math_pattern = None
+        if self.normal_replacements:
+            self.math_pattern = re.compile(r'(' + '|'.join(map(re.escape, self.normal_replacements.keys())) + r')')
+        # Regex pattern for ambiguous symbols (match only valid equations)
+        self.ambiguous_pattern = re.compile(
+            r'(?<!\S)(\d+)\s*([-/*x])\s*(\d+)(?!\S)|'  # Matches "num SYMBOL num" (e.g., "3 + 5", "7-2", "8 * 4")
+            r'(?<!\S)([-/*x])\s*(\d+)(?!\S)'           # Matches "SYMBOL num" (e.g., "-4", "/ 9")
+        )
+        self.number_pattern = None
+        if self.tts_engine == VITS or self.tts_engine == FAIRSEQ or self.tts_engine == YOURTTS:
+            if self.is_num2words_compat:
+                # Split big numbers into groups of 4
+                self.split_pattern = re.compile(r'(\d{4})(?=\d{4}(?!\.\d))')
+                # Detect numbers (handles negatives, commas, decimals, scientific notation)
+                self.number_pattern = re.compile(r'\s*(-?\d{1,3}(?:,\d{3})*(?:\.\d+(?!\s|$))?(?:[eE][-+]?\d+)?)\s*')
+                self._number2words = lru_cache(maxsize=self.memo_size)(self._number2words_uncached)
+            else:
+                # Split big numbers into groups of 2
+                self.split_pattern = re.compile(r'(\d{2})(?=\d{2}(?!\.\d))')
+                # Fallback: Replace numbers using phonemes dictionary
+                sorted_numbers = sorted((k for k in self.phonemes_list if k.isdigit()), key=len, reverse=True)
+                if sorted_numbers:
+                    self.number_pattern = re.compile(r'\b(' + '|'.join(map(re.escape, sorted_numbers)) + r')\b')
+
+    def _number2words_uncached(self, number):
+        try:
+            if "." in number or "e" in number or "E" in number:
+                number_value = float(number)
+            else:
+                number_value = int(number)
+            number_in_words = num2words(number_value, lang=self.lang_iso1)
+            return f" {number_in_words}"
+        except Exception as e:
+            print(f"Error converting number: {number}, Error: {e}")
+            return f"{number}"
+
+    def _replace_number(self, match):
+        return self._number2words(match.group().strip().replace(",", ""))
+
+    def _replace_phoneme(self, match):
+        return self.phonemes_list[match.group(0)]
+
+    def _replace_normal(self, match):
+        return f" {self.normal_replacements[match.group(0)]} "
+
+    def _replace_ambiguous(self, match):
+        symbol2 = match.group(2)
+        symbol3 = match.group(3)
+        if symbol2 in self.ambiguous_replacements: # "num SYMBOL num" case
+            return f"{match.group(1)} {self.ambiguous_replacements[symbol2]} {match.group(3)}"
+        elif symbol3 in self.ambiguous_replacements: # "SYMBOL num" case
+            return f"{self.ambiguous_replacements[symbol3]} {match.group(4)}"
+        return match.group(0)
+
+    def verbalize(self, text):
+        # Replace unambiguous math symbols normally
+        if self.math_pattern is not None:
+            text = self.math_pattern.sub(self._replace_normal, text)
+        if self.ambiguous_replacements:
+            text = self.ambiguous_pattern.sub(self._replace_ambiguous, text)
+        if self.tts_engine == VITS or self.tts_engine == FAIRSEQ or self.tts_engine == YOURTTS:
+            text = self.split_pattern.sub(r'\1 ', text)
+            if self.number_pattern is not None:
+                if self.is_num2words_compat:
+                    text = self.number_pattern.sub(self._replace_number, text)
+                else:
+                    text = self.number_pattern.sub(self._replace_phoneme, text)
+        return text
+
+@lru_cache(maxsize=32)
+def get_math_verbalizer(lang, lang_iso1, tts_engine):
+    return MathVerbalizer(lang, lang_iso1, tts_engine)
+
+def math2word(text, lang, lang_iso1, tts_engine):
+    return get_math_verbalizer(lang, lang_iso1, tts_engine).verbalize(text)
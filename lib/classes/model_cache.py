@@ -0,0 +1,146 @@
+import gc
+import os
+
+from collections import OrderedDict
+
+class ModelCache:
+    """
+    LRU cache of the loaded TTS models, shared by every session of the process.
+
+    Each entry records the bytes of its parameters and buffers and the device
+    they live on. Before a model is loaded and after it is added, the least
+    recently used entries are evicted until the models of that device fit in
+    max_bytes (memory_ratio of the device VRAM or RAM when max_bytes is None)
+    and the count fits in max_entries. Pinned entries (the models in use by a
+    session, e.g. the TTS and its voice conversion model) are never evicted.
+    Each owner (session) pins its own keys, and an entry stays pinned while
+    any owner holds it. The dict interface of the former loaded_tts is kept.
+    """
+
+    def __init__(self, max_entries=None, max_bytes=None, memory_ratio=0.75):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.memory_ratio = memory_ratio
+        self.entries = OrderedDict()
+        self.pins = {}
+        self.budgets = {}
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __getitem__(self, key):
+        self.entries.move_to_end(key)
+        return self.entries[key]['model']
+
+    def __setitem__(self, key, model):
+        self.put(key, model)
+
+    def __delitem__(self, key):
+        self.evict(key)
+
+    def keys(self):
+        return self.entries.keys()
+
+    def get(self, key, default=None):
+        if key not in self.entries:
+            return default
+        return self[key]
+
+    @staticmethod
+    def get_model_size(model):
+        if not hasattr(model, 'parameters'):
+            return 0
+        seen = set()
+        nbytes = 0
+        for tensor in list(model.parameters()) + list(model.buffers()):
+            if id(tensor) not in seen:
+                seen.add(id(tensor))
+                nbytes += tensor.numel() * tensor.element_size()
+        return nbytes
+
+    @staticmethod
+    def get_model_device(model):
+        try:
+            return next(model.parameters()).device.type
+        except (AttributeError, StopIteration):
+            return 'cpu'
+
+    def get_budget(self, device):
+        if self.max_bytes is not None:
+            return self.max_bytes
+        if device not in self.budgets:
+            try:
+                if device == 'cuda':
+                    import torch
+                    total = torch.cuda.get_device_properties(torch.cuda.current_device()).total_memory
+                else:
+                    import psutil
+                    total = psutil.virtual_memory().total
+                self.budgets[device] = int(total * self.memory_ratio)
+            except Exception:
+                self.budgets[device] = None
+        return self.budgets[device]
+
+    def used_bytes(self, device):
+        return sum(entry['nbytes'] for entry in self.entries.values() if entry['device'] == device)
+
+    @property
+    def pinned(self):
+        return set().union(*self.pins.values())
+
+    def pin(self, owner, *keys):
+        self.pins[owner] = set(keys)
+
+    def unpin(self, owner):
+        self.pins.pop(owner, None)
+
+    def put(self, key, model):
+        device = self.get_model_device(model)
+        self.entries[key] = {'model': model, 'nbytes': self.get_model_size(model), 'device': device}
+        self.entries.move_to_end(key)
+        self._shrink(device, 0, 0, keep=key)
+
+    def reserve(self, device, nbytes=0):
+        # Makes room for a model about to be loaded
+        self._shrink(device, nbytes, 1)
+
+    def estimate_size(self, device, model_path=None):
+        if model_path is not None and os.path.isfile(model_path):
+            return os.path.getsize(model_path)
+        sizes = [entry['nbytes'] for entry in self.entries.values() if entry['device'] == device]
+        return sum(sizes) // len(sizes) if sizes else 0
+
+    def _shrink(self, device, nbytes, slots, keep=None):
+        budget = self.get_budget(device)
+        pinned = self.pinned
+        for key in list(self.entries):
+            over_count = self.max_entries is not None and len(self.entries) + slots > self.max_entries
+            over_bytes = budget is not None and self.used_bytes(device) + nbytes > budget
+            if not over_count and not over_bytes:
+                return
+            if key in pinned or key == keep:
+                continue
+            if not over_count and self.entries[key]['device'] != device:
+                continue
+            self.evict(key)
+
+    def evict(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            return
+        msg = f"Unloading TTS model {key} ({entry['nbytes'] / 1024 ** 3:.2f} GB on {entry['device']})"
+        print(msg)
+        device = entry['device']
+        del entry
+        gc.collect()
+        if device == 'cuda':
+            import torch
+            torch.cuda.empty_cache()
+
+    def evict_unpinned(self):
+        pinned = self.pinned
+        for key in [key for key in self.entries if key not in pinned]:
+            self.evict(key)
@@ -0,0 +1,82 @@
+import hashlib
+import json
+import os
+import shutil
+
+class ParseCache:
+    """
+    On-disk cache of parsed ebooks.
+
+    An entry is a JSON lines file named after the key: the first line holds the
+    toc, metadata and cover state, then one line per block with its sentences.
+    The cover image is stored next to it. Entries are written to a temporary
+    file and only renamed once every block went through, so a cancelled or
+    failed parse never leaves a partial entry behind.
+    """
+
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+
+    def get_key(self, *parts):
+        return hashlib.sha256('|'.join(str(part) for part in parts).encode('utf-8')).hexdigest()
+
+    def _path(self, key, ext='jsonl'):
+        return os.path.join(self.cache_dir, f'{key}.{ext}')
+
+    @staticmethod
+    def toc2list(toc):
+        # ebooklib Link/Section objects to plain lists and dicts
+        items = []
+        for item in toc or []:
+            if isinstance(item, (list, tuple)):
+                items.append(ParseCache.toc2list(item))
+            elif hasattr(item, 'title'):
+                items.append({'title': item.title, 'href': getattr(item, 'href', None)})
+            else:
+                items.append(item)
+        return items
+
+    def load(self, key):
+        try:
+            with open(self._path(key), 'r', encoding='utf-8') as f:
+                return json.loads(f.readline())
+        except (OSError, ValueError):
+            return None
+
+    def iter_chapters(self, key):
+        with open(self._path(key), 'r', encoding='utf-8') as f:
+            f.readline()
+            for line in f:
+                yield json.loads(line)
+
+    def restore_cover(self, key, cover_path):
+        cached_cover = self._path(key, 'jpg')
+        if not os.path.exists(cached_cover):
+            return None
+        shutil.copyfile(cached_cover, cover_path)
+        return cover_path
+
+    def record(self, key, header, chapters, cover=None, is_cancelled=None):
+        # Yields the blocks of chapters while writing them to the cache
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_path = self._path(key, f'{os.getpid()}.tmp')
+        complete = False
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                header = dict(header, cover=isinstance(cover, str))
+                f.write(json.dumps(header, ensure_ascii=False, separators=(',', ':')) + '\n')
+                for sentences_array in chapters:
+                    f.write(json.dumps(list(sentences_array), ensure_ascii=False, separators=(',', ':')) + '\n')
+                    yield sentences_array
+            complete = is_cancelled is None or not is_cancelled()
+            if complete:
+                if isinstance(cover, str) and os.path.exists(cover):
+                    shutil.copyfile(cover, self._path(key, 'jpg'))
+                os.replace(tmp_path, self._path(key))
+        finally:
+            if not complete and os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def save(self, key, header, chapters, cover=None):
+        for _ in self.record(key, header, chapters, cover):
+            pass
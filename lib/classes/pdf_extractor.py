@@ -0,0 +1,120 @@
+import pymupdf
+import regex as re
+
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+# "extrac-\ntion" but not "well-\nKnown" or "1990-\n2000"
+hyphenation_pattern = re.compile(r'(?<=\p{L})-[ \t]*\n\s*(?=\p{Ll})')
+
+def get_page_text(page):
+    # Text blocks in reading order, lines of a block joined by spaces
+    # and words split at the end of a line rejoined
+    blocks = page.get_text('blocks', flags=pymupdf.TEXTFLAGS_TEXT, sort=True)
+    return '\n'.join(
+        ' '.join(hyphenation_pattern.sub('', block[4]).split())
+        for block in blocks if block[6] == 0 and block[4].strip()
+    )
+
+def extract_pages_text(pdf_path, first_page, last_page):
+    # Runs in a worker process, so the document is opened again there
+    with pymupdf.open(pdf_path) as doc:
+        return [get_page_text(doc[n]) for n in range(first_page, last_page)]
+
+class PdfExtractor:
+    """
+    Reads a PDF directly with pymupdf and cuts it into blocks of pages.
+
+    Blocks follow the top level entries of the PDF outline (bookmarks) when
+    there is one, otherwise they are made of pages_per_block pages. Pages are
+    extracted in parallel by up to workers processes, in ranges of at most
+    pages_per_task pages, and blocks are returned in reading order.
+    The document stays open until close(), or the end of a with block.
+    """
+
+    metadata_mapping = {
+        'title': 'title',
+        'author': 'creator',
+        'subject': 'description',
+        'keywords': 'subject'
+    }
+
+    def __init__(self, pdf_path, pages_per_block=10, pages_per_task=16, workers=1):
+        self.pdf_path = pdf_path
+        self.pages_per_block = pages_per_block
+        self.pages_per_task = pages_per_task
+        self.workers = workers
+        self.doc = pymupdf.open(pdf_path)
+        try:
+            self.page_count = self.doc.page_count
+            self.toc = self.doc.get_toc(simple=True)
+            self.blocks = self._build_blocks()
+        except Exception:
+            self.close()
+            raise
+
+    def close(self):
+        if self.doc is not None:
+            self.doc.close()
+            self.doc = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _build_blocks(self):
+        starts = []
+        for level in (1, 2):
+            pages = sorted({page - 1 for lvl, title, page in self.toc if lvl == level and 0 < page <= self.page_count})
+            if len(pages) > 1:
+                starts = pages
+                break
+        if not starts:
+            starts = list(range(0, self.page_count, self.pages_per_block))
+        elif starts[0] > 0:
+            # Pages before the first outline entry (cover, copyright, etc.)
+            starts.insert(0, 0)
+        ends = starts[1:] + [self.page_count]
+        return [(start, end) for start, end in zip(starts, ends) if end > start]
+
+    def get_metadata(self):
+        metadata = {}
+        for key, value in (self.doc.metadata or {}).items():
+            if key in self.metadata_mapping and value and value.strip():
+                metadata[self.metadata_mapping[key]] = value.strip()
+        return metadata
+
+    def save_cover(self, cover_path):
+        if not self.page_count:
+            return False
+        pixmap = self.doc[0].get_pixmap(dpi=150)
+        pixmap.save(cover_path, output='jpg')
+        return cover_path
+
+    def _tasks(self, start, end):
+        return [(first, min(first + self.pages_per_task, end)) for first in range(start, end, self.pages_per_task)]
+
+    def iter_blocks_text(self, is_cancelled=None):
+        if self.workers > 1 and self.page_count > self.pages_per_task:
+            # Spawned like the parse workers, torch may be initialized in this process
+            with ProcessPoolExecutor(max_workers=self.workers, mp_context=get_context('spawn')) as executor:
+                futures = [
+                    [executor.submit(extract_pages_text, self.pdf_path, first, last) for first, last in self._tasks(start, end)]
+                    for start, end in self.blocks
+                ]
+                try:
+                    for block_futures in futures:
+                        if is_cancelled is not None and is_cancelled():
+                            return
+                        yield '\n'.join(text for future in block_futures for text in future.result())
+                finally:
+                    for block_futures in futures:
+                        for future in block_futures:
+                            future.cancel()
+        else:
+            for start, end in self.blocks:
+                if is_cancelled is not None and is_cancelled():
+                    return
+                yield '\n'.join(get_page_text(self.doc[n]) for n in range(start, end))
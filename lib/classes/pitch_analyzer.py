@@ -0,0 +1,128 @@
+import hashlib
+import json
+import os
+import numpy as np
+import soundfile as sf
+
+class PitchAnalyzer:
+    """
+    Fundamental frequency (f0) and gender estimation of a voice.
+
+    The f0 is estimated with YIN on the frames loud enough to hold voice, taken
+    in order until max_seconds of them, and the median of the f0 of the voiced
+    ones is kept. Analyses of voice files are cached on disk
+    by the sha256 of the file content, so a voice analyzed once (e.g. by
+    VoiceExtractor when it is created) is never analyzed again.
+    """
+
+    version = 1
+
+    def __init__(self, cache_dir, fmin=60, fmax=400, max_seconds=4, max_read_seconds=30, yin_threshold=0.15, pitch_threshold=135):
+        self.cache_dir = cache_dir
+        self.fmin = fmin
+        self.fmax = fmax
+        self.max_seconds = max_seconds
+        self.max_read_seconds = max_read_seconds
+        self.yin_threshold = yin_threshold
+        self.pitch_threshold = pitch_threshold
+        self.results = {}
+
+    def get_file_hash(self, file_path):
+        hash_func = hashlib.sha256()
+        with open(file_path, 'rb') as f:
+            while chunk := f.read(1024 * 1024):
+                hash_func.update(chunk)
+        return hash_func.hexdigest()
+
+    def _frames(self, signal, sample_rate, frame_length, hop_length):
+        # Frames in time order, without the ones well below the level of the voice
+        count = 1 + (len(signal) - frame_length) // hop_length
+        if count < 1:
+            return np.empty((0, frame_length), dtype=np.float32)
+        frames = np.lib.stride_tricks.sliding_window_view(signal, frame_length)[::hop_length][:count]
+        rms = np.sqrt(np.mean(frames ** 2, axis=1))
+        loud = rms > max(np.percentile(rms, 90) * 0.25, 1e-4)
+        max_frames = int(self.max_seconds * sample_rate / hop_length)
+        return frames[loud][:max_frames]
+
+    def estimate_f0(self, signal, sample_rate):
+        signal = np.asarray(signal, dtype=np.float32)
+        if signal.ndim > 1:
+            signal = signal.mean(axis=1)
+        tau_min = max(2, int(sample_rate / self.fmax))
+        tau_max = int(sample_rate / self.fmin)
+        window = tau_max
+        frame_length = window + tau_max
+        frames = self._frames(signal, sample_rate, frame_length, window // 2)
+        if len(frames) == 0:
+            return None
+        frames = frames - frames.mean(axis=1, keepdims=True)
+        # YIN difference function d(tau) = e(0) + e(tau) - 2 r(tau), r computed by FFT
+        n_fft = 1 << int(np.ceil(np.log2(frame_length + window)))
+        cross = np.fft.irfft(np.fft.rfft(frames, n_fft) * np.conj(np.fft.rfft(frames[:, :window], n_fft)), n_fft)[:, :tau_max + 1]
+        squares = np.concatenate([np.zeros((len(frames), 1), dtype=np.float32), np.cumsum(frames ** 2, axis=1)], axis=1)
+        energy = squares[:, window:window + tau_max + 1] - squares[:, :tau_max + 1]
+        diff = squares[:, window:window + 1] + energy - 2 * cross
+        diff[:, 0] = 0
+        # Cumulative mean normalized difference
+        cumulative = np.cumsum(diff[:, 1:], axis=1)
+        cmnd = np.ones_like(diff)
+        cmnd[:, 1:] = diff[:, 1:] * np.arange(1, tau_max + 1) / np.maximum(cumulative, 1e-12)
+        candidates = cmnd[:, tau_min:tau_max] < self.yin_threshold
+        voiced = candidates.any(axis=1)
+        if voiced.sum() < 3:
+            return None
+        cmnd = cmnd[voiced]
+        taus = np.argmax(candidates[voiced], axis=1) + tau_min
+        # Walk down to the local minimum following the first dip below the threshold
+        rows = np.arange(len(taus))
+        while True:
+            step = (taus + 1 < tau_max) & (cmnd[rows, np.minimum(taus + 1, tau_max)] < cmnd[rows, taus])
+            if not step.any():
+                break
+            taus = taus + step
+        # Parabolic interpolation of the minimum
+        left = cmnd[rows, taus - 1]
+        center = cmnd[rows, taus]
+        right = cmnd[rows, np.minimum(taus + 1, tau_max)]
+        denominator = left - 2 * center + right
+        shift = np.where(np.abs(denominator) > 1e-12, 0.5 * (left - right) / np.where(denominator == 0, 1, denominator), 0)
+        f0 = sample_rate / (taus + np.clip(shift, -1, 1))
+        return float(np.median(f0))
+
+    def get_gender(self, f0):
+        if f0 is None or not 75 <= f0 <= 300:
+            return None
+        return 'female' if f0 > self.pitch_threshold else 'male'
+
+    def analyze_signal(self, signal, sample_rate):
+        f0 = self.estimate_f0(signal, sample_rate)
+        return {'f0': f0, 'gender': self.get_gender(f0)}
+
+    def analyze_file(self, file_path):
+        key = self.get_file_hash(file_path)
+        if key in self.results:
+            return self.results[key]
+        cache_file = os.path.join(self.cache_dir, f'{key}.json')
+        try:
+            with open(cache_file, 'r', encoding='utf-8') as f:
+                result = json.load(f)
+            if result.get('version') == self.version:
+                self.results[key] = result
+                return result
+        except (OSError, ValueError):
+            pass
+        sample_rate = sf.info(file_path).samplerate
+        signal, sample_rate = sf.read(file_path, frames=int(self.max_read_seconds * sample_rate), dtype='float32', always_2d=False)
+        result = dict(self.analyze_signal(signal, sample_rate), version=self.version)
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            tmp_file = f'{cache_file}.{os.getpid()}.tmp'
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                json.dump(result, f)
+            os.replace(tmp_file, cache_file)
+        except OSError as e:
+            error = f'Could not save the pitch analysis of {file_path}: {e}'
+            print(error)
+        self.results[key] = result
+        return result
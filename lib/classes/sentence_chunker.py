@@ -0,0 +1,86 @@
+class SentenceChunker:
+    """
+    Splits sentences longer than max_chars into chunks the TTS engines can handle.
+
+    Split points are chosen as before: the punctuation closest to the middle of
+    the sentence, then the closest space, then the middle itself, with the same
+    trailing ' -' markers. The work is done with an explicit stack on indexes of
+    the original string, so there is no recursion and no intermediate copies,
+    and chunks are streamed as a generator.
+    """
+
+    ideogramm_languages = ['zho', 'jpn', 'kor', 'tha', 'lao', 'mya', 'khm']
+    punctuation_priority = '.!?,;:'
+    space_priority = ' '
+    part2_strip = ' ,;:'
+
+    def __init__(self, max_chars, lang):
+        self.max_chars = max_chars
+        self.lang = lang
+        self.is_ideogramm = lang in self.ideogramm_languages
+
+    def _find_split_point(self, sentence, start, end, delimiters):
+        # Candidates are scanned from the middle outward so the first match is the
+        # most balanced one (the leftmost one on a tie).
+        length = end - start
+        low = max(1, length - self.max_chars)
+        high = min(length, self.max_chars) - 1
+        if low > high:
+            return -1
+        left = length // 2
+        right = left + 1
+        while left >= low or right <= high:
+            if left >= low and (right > high or length - 2 * left <= 2 * right - length):
+                if sentence[start + left] in delimiters:
+                    return left + 1
+                left -= 1
+            else:
+                if sentence[start + right] in delimiters:
+                    return right + 1
+                right += 1
+        return -1
+
+    def _mark(self, chunk, end):
+        if chunk and chunk[-1].isalpha():
+            return chunk + end
+        return chunk
+
+    def split(self, sentence):
+        max_chars = self.max_chars
+        stack = [(0, len(sentence))]
+        while stack:
+            item = stack.pop()
+            if isinstance(item, str):
+                yield item
+                continue
+            start, end = item
+            while start < end and sentence[start].isspace():
+                start += 1
+            while end > start and sentence[end - 1].isspace():
+                end -= 1
+            if end - start <= max_chars:
+                chunk = sentence[start:end]
+                yield chunk if self.is_ideogramm else self._mark(chunk, ' -')
+                continue
+            split_index = self._find_split_point(sentence, start, end, self.punctuation_priority)
+            if split_index == -1:
+                split_index = self._find_split_point(sentence, start, end, self.space_priority)
+            if split_index == -1:
+                split_index = (end - start) // 2
+            delim_used = sentence[start + split_index - 1]
+            part1_end = start + split_index
+            part2_start = part1_end
+            while part1_end > start and sentence[part1_end - 1].isspace():
+                part1_end -= 1
+            while part2_start < end and sentence[part2_start] in self.part2_strip:
+                part2_start += 1
+            if part2_start < end:
+                if end - part2_start <= max_chars:
+                    stack.append(self._mark(sentence[part2_start:end], ' -'))
+                else:
+                    stack.append((part2_start, end))
+            if part1_end - start <= max_chars:
+                mark = ' -' if not self.is_ideogramm and delim_used == ' ' else ''
+                stack.append(self._mark(sentence[start:part1_end], mark))
+            else:
+                stack.append((start, part1_end))
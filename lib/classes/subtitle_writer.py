@@ -0,0 +1,162 @@
+import os
+import regex as re
+
+from fractions import Fraction
+
+class SubtitleWriter:
+    """
+    Incremental subtitle writer for the converted sentences.
+
+    Cue timestamps are the exact sum of the sample counts of the sentences
+    before them, so there is no float drift over long books. The .vtt is
+    always written, with the sentence number as cue identifier, and .srt/.lrc
+    can be written alongside. On the first append of a run the files are
+    rebuilt in one pass: the sample counts come from the journal of the
+    converted sentences (see ConversionJournal) and the cue texts from the
+    .vtt. Cues are then appended to the open files while sentences come in
+    order. A sentence converted again before the last one (a resume recovering
+    a missing file) replaces its own cue and the files are rewritten, so the
+    cues after it follow its new duration.
+    """
+
+    def __init__(self, path, formats=None, journal=None):
+        self.base_path = os.path.splitext(path)[0]
+        self.formats = ['vtt'] + [f for f in (formats or []) if f in ('srt', 'lrc')]
+        self.files = {}
+        self.index = 1
+        # Sentences converted before this run, taken before it records new ones
+        self.journal_frames = journal.get_sentence_frames() if journal is not None else None
+        # {sentence_number: [frames, sample_rate, text]}, text is None when the cue was lost
+        self.sentences = {}
+        self.last = None
+        self.total = Fraction(0)
+
+    @staticmethod
+    def clean_text(text):
+        text = re.sub(r'[\r\n]+', ' ', text).strip()
+        return re.sub(r'\s{2,}', ' ', text)
+
+    @staticmethod
+    def format_timestamp(ms, separator='.'):
+        s, ms = divmod(ms, 1000)
+        m, s = divmod(s, 60)
+        h, m = divmod(m, 60)
+        return f'{h:02}:{m:02}:{s:02}{separator}{ms:03}'
+
+    @staticmethod
+    def parse_timestamp(timestamp):
+        h, m, s = timestamp.strip().replace(',', '.').split(':')
+        return (int(h) * 3600 + int(m) * 60) * 1000 + round(float(s) * 1000)
+
+    def _read_cues(self):
+        cues = []
+        vtt_path = f'{self.base_path}.vtt'
+        if not os.path.exists(vtt_path):
+            return cues
+        with open(vtt_path, 'r', encoding='utf-8') as f:
+            block = []
+            for line in f:
+                line = line.rstrip('\n')
+                if line:
+                    block.append(line)
+                    continue
+                self._parse_block(block, cues)
+                block = []
+            self._parse_block(block, cues)
+        return cues
+
+    def _parse_block(self, block, cues):
+        timing = next((i for i, line in enumerate(block) if '-->' in line), None)
+        if timing is None:
+            return
+        identifier = block[timing - 1] if timing > 0 else None
+        start, end = block[timing].split('-->')
+        cues.append({
+            'id': int(identifier) if identifier is not None and identifier.isdigit() else None,
+            'start': self.parse_timestamp(start),
+            'end': self.parse_timestamp(end.split()[0]),
+            'text': ' '.join(block[timing + 1:])
+        })
+
+    def _recover(self):
+        cues = self._read_cues()
+        if self.journal_frames is None:
+            # Without journal the durations are the ones of the cues
+            for cue in cues:
+                if cue['id'] is not None:
+                    self.sentences[cue['id']] = [cue['end'] - cue['start'], 1000, cue['text']]
+        else:
+            texts = {cue['id']: cue['text'] for cue in cues if cue['id'] is not None}
+            for number, (frames, sample_rate) in self.journal_frames.items():
+                self.sentences[number] = [frames, sample_rate, texts.get(number)]
+            # Cues written before they had identifiers follow the sentence order
+            legacy = [cue['text'] for cue in cues if cue['id'] is None]
+            missing = [number for number in sorted(self.sentences) if self.sentences[number][2] is None]
+            for number, text in zip(missing, legacy):
+                self.sentences[number][2] = text
+        self._rewrite()
+
+    @staticmethod
+    def _ms(seconds):
+        return round(seconds * 1000)
+
+    def _rewrite(self):
+        self.close()
+        for fmt in self.formats:
+            self.files[fmt] = open(f'{self.base_path}.{fmt}', 'w', encoding='utf-8')
+            if fmt == 'vtt':
+                self.files[fmt].write('WEBVTT\n\n')
+        self.index = 1
+        self.total = Fraction(0)
+        times = {}
+        for number in sorted(self.sentences):
+            frames, sample_rate, text = self.sentences[number]
+            start = self.total
+            self.total += Fraction(frames, sample_rate)
+            times[number] = (start, self.total)
+            if text is not None:
+                self._write_cue(number, self._ms(start), self._ms(self.total), text)
+        self.last = max(self.sentences, default=None)
+        self._flush()
+        return times
+
+    def _write_cue(self, identifier, start_ms, end_ms, text):
+        for fmt, f in self.files.items():
+            if fmt == 'vtt':
+                cue_id = f'{identifier}\n' if identifier is not None else ''
+                f.write(f'{cue_id}{self.format_timestamp(start_ms)} --> {self.format_timestamp(end_ms)}\n{text}\n\n')
+            elif fmt == 'srt':
+                f.write(f"{self.index}\n{self.format_timestamp(start_ms, ',')} --> {self.format_timestamp(end_ms, ',')}\n{text}\n\n")
+            elif fmt == 'lrc':
+                m, cs = divmod(start_ms // 10, 6000)
+                f.write(f'[{m:02}:{cs // 100:02}.{cs % 100:02}]{text}\n')
+        self.index += 1
+
+    def _flush(self):
+        # One write per file and cue, flushed so a resume finds every cue of the saved sentences
+        for f in self.files.values():
+            f.flush()
+
+    def append(self, sentence_number, num_samples, sample_rate, text):
+        if not self.files:
+            self._recover()
+        text = self.clean_text(text)
+        self.sentences[sentence_number] = [num_samples, sample_rate, text]
+        if self.last is not None and sentence_number <= self.last:
+            start, end = self._rewrite()[sentence_number]
+        else:
+            start = self.total
+            self.total += Fraction(num_samples, sample_rate)
+            end = self.total
+            self.last = sentence_number
+            self._write_cue(sentence_number, self._ms(start), self._ms(end), text)
+            self._flush()
+        return float(start), float(end)
+
+    def close(self):
+        for f in self.files.values():
+            f.close()
+        self.files = {}
+
+    def __del__(self):
+        self.close()
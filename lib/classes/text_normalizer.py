@@ -0,0 +1,109 @@
+import regex as re
+
+from functools import lru_cache
+
+from lib.classes.math_verbalizer import get_math_verbalizer
+from lib.lang import abbreviations_mapping, punctuation_switch, punctuation_list, punctuation_split, specialchars_mapping, specialchars_remove
+from lib.models import XTTSv2
+
+class TextNormalizer:
+    """
+    Text normalization rules of one (language, tts engine) pair.
+
+    All regex patterns and lookup tables are compiled once in _build(),
+    so normalize() only runs them. Output is the same as the former
+    per-call normalize_text().
+    """
+
+    # Bump when the normalized text changes, it is part of the parse cache key
+    version = 1
+
+    def __init__(self, lang, lang_iso1, tts_engine):
+        self.lang = lang
+        self.lang_iso1 = lang_iso1
+        self.tts_engine = tts_engine
+        self._build()
+
+    def _build(self):
+        # Abbreviations (the english table is used for every language having a table)
+        self.abbreviations = None
+        if self.lang in abbreviations_mapping:
+            self.abbreviations = {re.sub(r'\.', '', k).lower(): v for k, v in abbreviations_mapping['eng'].items()}
+            self.abbreviation_pattern = re.compile(r'\b(?:[a-zA-Z]+\.)+|[a-zA-Z]+')
+        # This regex matches sequences like a., c.i.a., f.d.a., m.c., etc...
+        self.acronym_pattern = re.compile(r'\b(?:[a-zA-Z]\.){1,}[a-zA-Z]?\b\.?')
+        self.pause_pattern = re.compile(r'(###|\[pause\])')
+        # Only single chars can match the punctuation_switch class
+        self.punctuation_switch_table = str.maketrans({k: v for k, v in punctuation_switch.items() if len(k) == 1})
+        self.newlines_pattern = re.compile(r'(\r\n|\r|\n)+')
+        self.newline_pattern = re.compile(r'[\r\n]')
+        self.spaces_pattern = re.compile(r'[ ]+')
+        self.ok_pattern = re.compile(r'\bok\b', flags=re.IGNORECASE)
+        self.parentheses_pattern = re.compile(r'\(([^)]+)\)')
+        pattern = '|'.join(map(re.escape, punctuation_split))
+        self.punctuation_split_pattern = re.compile(rf'(\s*({pattern})\s*)+')
+        if self.tts_engine == XTTSv2:
+            self.letter_digit_pattern = re.compile(r'(?<=[\p{L}])(?=\d)|(?<=\d)(?=[\p{L}])')
+            pattern_space = re.escape(''.join(punctuation_list))
+            self.punctuation_space_pattern = re.compile(r'\s*([{}])\s*'.format(pattern_space.replace(',', '').replace('.', '')))
+            self.comma_dot_pattern = re.compile(r'(?<!\d)\s*(\.{3}|[,.])\s*(?!\d)')
+        # Special chars to words and special chars to remove in one table
+        specialchars = specialchars_mapping[self.lang] if self.lang in specialchars_mapping else specialchars_mapping['eng']
+        table = {char: ' ' for char in specialchars_remove}
+        table.update({char: f' {word} ' for char, word in specialchars.items()})
+        self.specialchars_table = str.maketrans(table)
+        self.roman_pattern = re.compile(r'^(?=[IVXLCDM])((?:M{0,3})(?:CM|CD|D?C{0,3})?(?:XC|XL|L?X{0,3})?(?:IX|IV|V?I{0,3}))(?=\s|$)', re.IGNORECASE)
+        self.arabic_pattern = re.compile(r'^(\d+)(?=\s|$)')
+        self.numeral_punct_pattern = re.compile(r'^([IVXLCDM\d]+)[\.,:;]', re.IGNORECASE)
+        self.numeral_pattern = re.compile(r'^([IVXLCDM\d]+)', re.IGNORECASE)
+        self.math_verbalizer = get_math_verbalizer(self.lang, self.lang_iso1, self.tts_engine)
+
+    def _replace_abbreviation(self, match):
+        return self.abbreviations.get(match.group().replace('.', '').lower(), match.group())
+
+    def normalize(self, text):
+        if self.abbreviations is not None:
+            text = self.abbreviation_pattern.sub(self._replace_abbreviation, text)
+        # uppercase acronyms
+        text = self.acronym_pattern.sub(lambda m: m.group().replace('.', '').upper(), text)
+        # Replace ### and [pause] with ‡pause‡ (‡ = double dagger U+2021)
+        text = self.pause_pattern.sub('‡pause‡', text)
+        # Replace punctuations causing hallucinations
+        text = text.translate(self.punctuation_switch_table)
+        # Replace NBSP with a normal space
+        text = text.replace("\xa0", " ")
+        # Replace multiple newlines ("\n\n", "\r\r", "\n\r", etc.) with a single "\n"
+        text = self.newlines_pattern.sub('\n', text)
+        # Replace single newlines ("\n" or "\r") with spaces
+        text = self.newline_pattern.sub(' ', text)
+        # Replace multiple spaces with single space
+        text = self.spaces_pattern.sub(' ', text)
+        # Replace ok by 'Owkey'
+        text = self.ok_pattern.sub('"Okhey"', text)
+        # Replace parentheses with double quotes
+        text = self.parentheses_pattern.sub(r'"\1"', text)
+        # Reduce multiple consecutive punctuations
+        text = self.punctuation_split_pattern.sub(r'\2 ', text).strip()
+        if self.tts_engine == XTTSv2:
+            # Pattern 1: Add a space between UTF-8 characters and numbers
+            text = self.letter_digit_pattern.sub(' ', text)
+            # Ensure space before and after punctuation (excluding `,` and `.`)
+            text = self.punctuation_space_pattern.sub(r' \1 ', text)
+            # Ensure spaces before & after `,` and `.` ONLY when NOT between numbers
+            text = self.comma_dot_pattern.sub(r' \1 ', text)
+        # Replace special chars with words
+        text = text.translate(self.specialchars_table)
+        text = ' '.join(text.split())
+        if text.strip():
+            # Add punctuation after numbers or Roman numerals at start of a chapter.
+            if self.roman_pattern.match(text) or self.arabic_pattern.match(text):
+                # Add punctuation if not already present (e.g. "II", "4")
+                if not self.numeral_punct_pattern.match(text):
+                    text = self.numeral_pattern.sub(r'\1' + ' — ', text)
+            # Replace math symbols with words
+            text = self.math_verbalizer.verbalize(text)
+        return text
+
+@lru_cache(maxsize=None)
+def get_text_normalizer(lang, lang_iso1, tts_engine):
+    return TextNormalizer(lang, lang_iso1, tts_engine)
@@ -1,5 +1,6 @@
 import os
 import gc
+import inspect
 import numpy as np
 import regex as re
 import shutil
@@ -7,20 +8,22 @@ import soundfile as sf
 import subprocess
 import tempfile
 import torch
+import torch.nn.functional as F
 import torchaudio
 import threading
 import uuid
 
 from huggingface_hub import hf_hub_download
 from pathlib import Path
-from scipy.io import wavfile as wav
-from scipy.signal import find_peaks
 from TTS.api import TTS as coquiAPI
 from TTS.tts.configs.xtts_config import XttsConfig
 from TTS.tts.models.xtts import Xtts
 
 from lib.models import *
-from lib.conf import voices_dir, models_dir, default_audio_proc_format
+from lib.classes.gpu_memory_policy import GpuMemoryPolicy
+from lib.classes.latent_cache import LatentCache
+from lib.classes.pitch_analyzer import PitchAnalyzer
+from lib.conf import voices_dir, models_dir, default_audio_proc_format, enable_latent_cache, latent_cache_dir, pitch_cache_dir, gpu_empty_cache_policy, gpu_empty_cache_every, gpu_oom_retries, gpu_memory_stats_file
 from lib.lang import language_tts
 
 # Added for robust text preprocessing:
@@ -101,6 +104,8 @@ torch.multinomial = _safe_multinomial
 
 lock = threading.Lock()
 xtts_builtin_speakers_list = None
+latent_cache = LatentCache(latent_cache_dir)
+pitch_analyzer = PitchAnalyzer(pitch_cache_dir)
 
 class Coqui:
     def __init__(self, session):   
@@ -125,14 +130,15 @@ class Coqui:
             }.items()
             if self.session.get(key) is not None
         }
-        self.sentences_total_time = 0.0
-        self.sentence_idx = 1
-        self.params = {XTTSv2: {"latent_embedding":{}}, BARK: {}, VITS: {"semitones": {}}, FAIRSEQ: {"semitones": {}}, YOURTTS: {}}  
-        self.vtt_path = None
+        self.params = {XTTSv2: {"latent_embedding":{}}, BARK: {}, VITS: {"semitones": {}, "vc_targets": {}}, FAIRSEQ: {"semitones": {}, "vc_targets": {}}, YOURTTS: {}}  
+        self.subtitles = None
+        self.gpu_memory = GpuMemoryPolicy(self.session['device'], gpu_empty_cache_policy, gpu_empty_cache_every, gpu_memory_stats_file)
+        self.max_batch_size = None
         self._build()
  
     def _build(self):
         global xtts_builtin_speakers_list
+        self.model_keys = []
         model_path = None
         config_path = None
         if xtts_builtin_speakers_list is None:
@@ -141,7 +147,6 @@ class Coqui:
         tts_key = f"{self.session['tts_engine']}-{self.session['fine_tuned']}"
         settings = self.params[self.session['tts_engine']]
         settings['sample_rate'] = models[self.session['tts_engine']][self.session['fine_tuned']]['samplerate']
-        self.vtt_path = os.path.splitext(self.session['final_name'])[0] + '.vtt'
         if self.session['language'] in language_tts[XTTSv2].keys():
             if self.session['voice'] is not None and self.session['language'] != 'eng':
                 speaker = re.sub(r'_(24000|16000)\.wav$', '', os.path.basename(self.session['voice']))
@@ -154,18 +159,12 @@ class Coqui:
                                 print(msg)
                                 model_path = models[XTTSv2]['internal']['repo']
                                 tts_internal_key = f"{self.session['tts_engine']}-internal"
-                                if tts_internal_key in loaded_tts.keys():
-                                    self.tts = loaded_tts[tts_internal_key]
-                                else:
-                                    if len(loaded_tts) == max_tts_in_memory:
-                                        self._unload_tts(self.session['device'])
-                                    hf_repo = models[self.session['tts_engine']]['internal']['repo']
-                                    hf_sub = ''
-                                    model_path = hf_hub_download(repo_id=hf_repo, filename=f"{hf_sub}model.pth", cache_dir=self.cache_dir)
-                                    config_path = hf_hub_download(repo_id=hf_repo, filename=f"{hf_sub}config.json", cache_dir=self.cache_dir)
-                                    vocab_path = hf_hub_download(repo_id=hf_repo, filename=f"{hf_sub}vocab.json", cache_dir=self.cache_dir)
-                                    self.tts = self._load_checkpoint(model_path, config_path, vocab_path, self.session['device'])
-                                    loaded_tts[tts_internal_key] = self.tts
+                                hf_repo = models[self.session['tts_engine']]['internal']['repo']
+                                hf_sub = ''
+                                model_path = hf_hub_download(repo_id=hf_repo, filename=f"{hf_sub}model.pth", cache_dir=self.cache_dir)
+                                config_path = hf_hub_download(repo_id=hf_repo, filename=f"{hf_sub}config.json", cache_dir=self.cache_dir)
+                                vocab_path = hf_hub_download(repo_id=hf_repo, filename=f"{hf_sub}vocab.json", cache_dir=self.cache_dir)
+                                self.tts = self._get_model(tts_internal_key, lambda: self._load_checkpoint(model_path, config_path, vocab_path, self.session['device']), model_path)
                                 if not self.tts:
                                     return None
                                 lang_dir = 'con-' if self.session['language'] == 'con' else self.session['language']
@@ -182,16 +181,13 @@ class Coqui:
                                         **self.fine_tuned_params
                                     )
                                 audio_data = result.get('wav')
-                                if audio_data is not None:
-                                    audio_data = audio_data.tolist()
-                                else:
+                                if audio_data is None:
                                     error = f'No audio waveform found in convert_sentence2audio() result: {result}'
                                     print(error)
                                     return None
-                                sourceTensor = self._tensor_type(audio_data)
-                                audio_tensor = sourceTensor.clone().detach().unsqueeze(0).cpu()
+                                audio_tensor = self._audio_segment(audio_data)
                                 torchaudio.save(file_path, audio_tensor, 24000, format='wav')
-                                del audio_data, sourceTensor, audio_tensor  
+                                del audio_data, audio_tensor
                                 for samplerate in [16000, 24000]:
                                     output_file = file_path.replace('.wav', f'_{samplerate}.wav')
                                     if self._normalize_audio(file_path, output_file, samplerate):
@@ -219,12 +215,7 @@ class Coqui:
                 config_path = os.path.join(self.session['custom_model_dir'], self.session['tts_engine'], self.session['custom_model'],'config.json')
                 vocab_path = os.path.join(self.session['custom_model_dir'], self.session['tts_engine'], self.session['custom_model'],'vocab.json')
                 tts_custom_key = f"{self.session['tts_engine']}-{self.session['custom_model']}"
-                if tts_custom_key in loaded_tts.keys():
-                    self.tts = loaded_tts[tts_custom_key]
-                else:
-                    if len(loaded_tts) == max_tts_in_memory:
-                        self._unload_tts(self.session['device'])
-                    self.tts = self._load_checkpoint(model_path, config_path, vocab_path, self.session['device'])
+                self.tts = self._get_model(tts_custom_key, lambda: self._load_checkpoint(model_path, config_path, vocab_path, self.session['device']), model_path)
             else:
                 msg = f"Loading TTS {self.session['tts_engine']} model, it takes a while, please be patient..."
                 print(msg)
@@ -235,22 +226,14 @@ class Coqui:
                 model_path = hf_hub_download(repo_id=hf_repo, filename=f"{hf_sub}model.pth", cache_dir=self.cache_dir)
                 config_path = hf_hub_download(repo_id=hf_repo, filename=f"{hf_sub}config.json", cache_dir=self.cache_dir)
                 vocab_path = hf_hub_download(repo_id=hf_repo, filename=f"{hf_sub}vocab.json", cache_dir=self.cache_dir)
-                if tts_key in loaded_tts.keys():
-                    self.tts = loaded_tts[tts_key]
-                else:
-                    if len(loaded_tts) == max_tts_in_memory:
-                        self._unload_tts(self.session['device'])
-                    self.tts = self._load_checkpoint(model_path, config_path, vocab_path, self.session['device'])
+                self.tts = self._get_model(tts_key, lambda: self._load_checkpoint(model_path, config_path, vocab_path, self.session['device']), model_path)
+            settings['checkpoint_path'] = model_path
         elif self.session['tts_engine'] == BARK:
             if self.session['custom_model'] is None:
                 model_path = models[self.session['tts_engine']][self.session['fine_tuned']]['repo']
                 msg = f"Loading TTS {model_path} model, it takes a while, please be patient..."
                 print(msg)
-                if tts_key in loaded_tts.keys():
-                    self.tts = loaded_tts[tts_key]
-                else:
-                    self._unload_tts(self.session['device'])
-                    self.tts = self._load_api(model_path, self.session['device'])
+                self.tts = self._get_model(tts_key, lambda: self._load_api(model_path, self.session['device']))
             else:
                 msg = f"{self.session['tts_engine']} custom model not implemented yet!"
                 print(msg)
@@ -267,28 +250,18 @@ class Coqui:
                     model_path = models[self.session['tts_engine']][self.session['fine_tuned']]['repo'].replace("[lang_iso1]", iso_dir).replace("[xxx]", sub)
                     msg = f"Loading TTS {model_path} model, it takes a while, please be patient..."
                     print(msg)
-                    if tts_key in loaded_tts.keys():
-                        self.tts = loaded_tts[tts_key]
-                    else:
-                        if len(loaded_tts) == max_tts_in_memory:
-                            self._unload_tts(self.session['device'])
-                        self.tts = self._load_api(model_path, self.session['device'])
+                    self.tts = self._get_model(tts_key, lambda: self._load_api(model_path, self.session['device']))
                     if not self.tts:
                         return None
                     if self.session['voice'] is not None:
                         tts_vc_key = default_vc_model
                         msg = f"Loading vocoder {tts_vc_key} zeroshot model, it takes a while, please be patient..."
                         print(msg)
-                        if tts_vc_key in loaded_tts.keys():
-                            self.tts_vc = loaded_tts[tts_vc_key]
-                        else:
-                            self.tts_vc = self._load_api_vc(self.session['device'])
-                            if self.tts_vc:
-                                loaded_tts[tts_vc_key] = self.tts_vc
-                            else:
-                                error = 'TTS VC engine could not be created!'
-                                print(error)
-                                return None
+                        self.tts_vc = self._get_model(tts_vc_key, lambda: self._load_api_vc(self.session['device']))
+                        if not self.tts_vc:
+                            error = 'TTS VC engine could not be created!'
+                            print(error)
+                            return None
                 else:
                     msg = f"{self.session['tts_engine']} checkpoint for {self.session['language']} not found!"
                     print(msg)
@@ -302,28 +275,16 @@ class Coqui:
                 model_path = models[self.session['tts_engine']][self.session['fine_tuned']]['repo'].replace("[lang]", self.session['language'])
                 msg = f"Loading TTS {tts_key} model, it takes a while, please be patient..."
                 print(msg)
-                if tts_key in loaded_tts.keys():
-                    self.tts = loaded_tts[tts_key]
-                else:
-                    if len(loaded_tts) == max_tts_in_memory:
-                        self._unload_tts(self.session['device'])
-                    self.tts = self._load_api(model_path, self.session['device'])
+                self.tts = self._get_model(tts_key, lambda: self._load_api(model_path, self.session['device']))
                 if self.session['voice'] is not None:
                     tts_vc_key = default_vc_model
                     msg = f"Loading TTS {tts_vc_key} zeroshot model, it takes a while, please be patient..."
                     print(msg)
-                    if tts_vc_key in loaded_tts.keys():
-                        self.tts_vc = loaded_tts[tts_vc_key]
-                    else:
-                        if len(loaded_tts) == max_tts_in_memory:
-                            self._unload_tts(self.session['device'])
-                        self.tts_vc = self._load_api_vc(self.session['device'])
-                        if self.tts_vc:
-                            loaded_tts[tts_vc_key] = self.tts_vc
-                        else:
-                            error = 'TTS VC engine could not be created!'
-                            print(error)
-                            return None
+                    self.tts_vc = self._get_model(tts_vc_key, lambda: self._load_api_vc(self.session['device']))
+                    if not self.tts_vc:
+                        error = 'TTS VC engine could not be created!'
+                        print(error)
+                        return None
             else:
                 msg = f"{self.session['tts_engine']} custom model not implemented yet!"
                 print(msg)
@@ -333,18 +294,12 @@ class Coqui:
                 model_path = models[self.session['tts_engine']][self.session['fine_tuned']]['repo']
                 msg = f"Loading TTS {model_path} model, it takes a while, please be patient..."
                 print(msg)
-                if tts_key in loaded_tts.keys():
-                    self.tts = loaded_tts[tts_key]
-                else:
-                    if len(loaded_tts) == max_tts_in_memory:
-                        self._unload_tts(self.session['device'])
-                    self.tts = self._load_api(model_path, self.session['device'])
+                self.tts = self._get_model(tts_key, lambda: self._load_api(model_path, self.session['device']))
             else:
                 msg = f"{self.session['tts_engine']} custom model not implemented yet!"
                 print(msg)
                 return None
         if self.tts:
-            loaded_tts[tts_key] = self.tts
             return self.tts
         else:
             self._unload_tts(self.session['device'])
@@ -413,63 +368,99 @@ class Coqui:
         msg = f"Saved NPZ file: {npz_path}"
         print(msg)
         
-    def _detect_gender(self, voice_path, pitch_threshold=135, peak_height_ratio=0.2):
+    def _detect_gender(self, voice_path):
         """
         Attempts to detect the gender of a speaker based on pitch analysis.
         
         Args:
             voice_path (str): Path to the audio file.
-            pitch_threshold (float, optional): Frequency threshold (Hz) for gender classification.
-            peak_height_ratio (float, optional): Peak detection sensitivity ratio.
         
         Returns:
             str or None: Detected gender ('male' or 'female') or None if undetermined.
         """
         try:
-            # Load audio file
-            sample_rate, signal = wav.read(voice_path)
-            print(f"Loaded audio file: {voice_path} at {sample_rate} Hz")
-
-            # Convert stereo to mono if needed
-            if signal.ndim > 1:
-                print(f"Converting stereo to mono: original shape {signal.shape}")
-                signal = np.mean(signal, axis=1)
-
-            # Compute FFT
-            fft_spectrum = np.abs(np.fft.fft(signal))
-            freqs = np.fft.fftfreq(len(fft_spectrum), d=1/sample_rate)
-
-            # Consider only positive frequencies
-            positive_freqs = freqs[:len(freqs)//2]
-            positive_magnitude = fft_spectrum[:len(fft_spectrum)//2]
-
-            # Find peaks in frequency spectrum
-            peak_height = np.max(positive_magnitude) * peak_height_ratio
-            peaks, _ = find_peaks(positive_magnitude, height=peak_height)
-            print(f"Detected {len(peaks)} significant peaks in spectrum")
-
-            if not peaks.size:
-                print("No significant peaks detected.")
-                return None
-
-            # Analyze peaks for pitch detection within human voice range
-            for peak in peaks:
-                freq = positive_freqs[peak]
-                if 75 <= freq <= 300:
-                    gender = "female" if freq > pitch_threshold else "male"
-                    print(f"Detected pitch: {freq:.2f} Hz. Inferred gender: {gender}")
-                    return gender
-
-            print("No pitch within typical human range detected.")
+            # Cached by file content, voices are usually analyzed once by VoiceExtractor
+            result = pitch_analyzer.analyze_file(voice_path)
+            print(f"Detected pitch of {voice_path}: {result['f0']} Hz. Inferred gender: {result['gender']}")
+            return result['gender']
+        except Exception as e:
+            print(f"Error in _detect_gender() for file {voice_path}: {e}")
             return None
 
+    def _detect_signal_gender(self, signal, sample_rate):
+        # Same as _detect_gender() on audio already in memory
+        try:
+            result = pitch_analyzer.analyze_signal(signal, sample_rate)
+            print(f"Detected pitch: {result['f0']} Hz. Inferred gender: {result['gender']}")
+            return result['gender']
         except Exception as e:
-            print(f"Error in _detect_gender() for file {voice_path}: {e}")
+            print(f"Error in _detect_signal_gender(): {e}")
             return None
 
+    def _convert_voice(self, audio, sample_rate, settings):
+        # Voice conversion of the builtin voice output to settings['voice_path'], in memory:
+        # pitch shift and resampling with torchaudio instead of temp wav files and sox,
+        # and the knnvc features of the target voice computed once per voice_path
+        source = self._audio_segment(audio)
+        voice_path = settings['voice_path']
+        if voice_path in settings['semitones'].keys():
+            semitones = settings['semitones'][voice_path]
+        else:
+            voice_path_gender = self._detect_gender(voice_path)
+            voice_builtin_gender = self._detect_signal_gender(source[0].numpy(), sample_rate)
+            msg = f"Cloned voice seems to be {voice_path_gender}\nBuiltin voice seems to be {voice_builtin_gender}"
+            print(msg)
+            if voice_builtin_gender != voice_path_gender:
+                semitones = -4 if voice_path_gender == 'male' else 4
+                msg = f"Adapting builtin voice frequencies from the clone voice..."
+                print(msg)
+            else:
+                semitones = 0
+            settings['semitones'][voice_path] = semitones
+        if semitones > 0:
+            source = torchaudio.functional.pitch_shift(source, sample_rate, semitones)
+        vc = self.tts_vc.voice_converter
+        with torch.no_grad():
+            if hasattr(vc.vc_model, 'get_matching_set'):
+                vc_sample_rate = vc.vc_model.config.audio.sample_rate
+                if sample_rate != vc_sample_rate:
+                    source = torchaudio.functional.resample(source, orig_freq=sample_rate, new_freq=vc_sample_rate)
+                if voice_path not in settings['vc_targets'].keys():
+                    settings['vc_targets'][voice_path] = vc.vc_model.get_matching_set([voice_path])
+                output = vc.vc_model.match(vc.vc_model.get_features(source), settings['vc_targets'][voice_path])
+                if vc.vocoder_model is not None:
+                    output = vc.vocoder_model.inference(output)
+                return output.squeeze()
+            # Other voice conversion models only read files
+            proc_dir = os.path.join(self.session['voice_dir'], 'proc')
+            os.makedirs(proc_dir, exist_ok=True)
+            tmp_wav = os.path.join(proc_dir, f"{uuid.uuid4()}.wav")
+            try:
+                torchaudio.save(tmp_wav, source, sample_rate, format='wav')
+                return self.tts_vc.voice_conversion(source_wav=tmp_wav, target_wav=voice_path)
+            finally:
+                if os.path.exists(tmp_wav):
+                    os.remove(tmp_wav)
+
+    def _get_model(self, key, load, model_path=None):
+        # Models are shared by every session through loaded_tts, the least recently
+        # used ones are unloaded when the memory budget of the device is reached
+        if key in loaded_tts:
+            model = loaded_tts[key]
+        else:
+            loaded_tts.reserve(self.session['device'], loaded_tts.estimate_size(self.session['device'], model_path))
+            model = load()
+            if model:
+                loaded_tts[key] = model
+        if model:
+            self.model_keys.append(key)
+            loaded_tts.pin(self.session['id'], *self.model_keys)
+        return model
+
     def _unload_tts(self, device):
-        for key in list(loaded_tts.keys()):
-            del loaded_tts[key]
+        # Frees the models no session is using, this one included
+        loaded_tts.unpin(self.session['id'])
+        loaded_tts.evict_unpinned()
         if self.tts:
             del self.tts
         if self.tts_vc:
@@ -480,15 +471,19 @@ class Coqui:
             torch.cuda.synchronize()
 
     def _tensor_type(self, audio_data):
+        # float32 numpy arrays and tensors are wrapped without copy
         if isinstance(audio_data, torch.Tensor):
             return audio_data
-        elif isinstance(audio_data, np.ndarray):  
-            return torch.from_numpy(audio_data).float()
-        elif isinstance(audio_data, list):  
-            return torch.tensor(audio_data, dtype=torch.float32)
+        elif isinstance(audio_data, (np.ndarray, list)):
+            return torch.as_tensor(audio_data, dtype=torch.float32)
         else:
             raise TypeError(f"Unsupported type for audio_data: {type(audio_data)}")
 
+    def _audio_segment(self, audio_data):
+        # (1, samples) cpu tensor, only copied when it comes from the GPU or has another dtype.
+        # The segments are concatenated (copied once) before being trimmed and saved.
+        return self._tensor_type(audio_data).detach().to('cpu', torch.float32).reshape(1, -1)
+
     def _trim_audio(self, audio_data, sample_rate, silence_threshold=0.001, buffer_sec=0.007):
         # Ensure audio_data is a PyTorch tensor
         if isinstance(audio_data, list):  
@@ -569,64 +564,6 @@ class Coqui:
             print("FFmpeg stderr output:", e.stderr)
             return False
 
-    def _append_sentence2vtt(self, sentence_obj, path):
-        """
-        Enhanced version of appending a sentence to a VTT file, adding safety and clearer flow.
-        
-        Args:
-            sentence_obj (dict): Dictionary with 'start', 'end', 'text', and optionally 'resume_check'.
-            path (str): Path to the VTT file.
-        
-        Returns:
-            int: Next index for subtitles.
-        """
-
-        def _format_timestamp(seconds):
-            m, s = divmod(seconds, 60)
-            h, m = divmod(m, 60)
-            return f"{int(h):02}:{int(m):02}:{s:06.3f}"
-
-        print(f"Appending sentence to VTT file: {path}")
-
-        # Step 1: Determine the current index by counting "-->" in existing file
-        index = 1
-        if os.path.exists(path):
-            try:
-                with open(path, "r", encoding="utf-8") as f:
-                    lines = f.readlines()
-                    for line in lines:
-                        if "-->" in line:
-                            index += 1
-                print(f"Current subtitle index: {index}")
-            except Exception as e:
-                print(f"Error reading existing VTT file: {e}")
-
-        # Step 2: If file does not exist, create and add header
-        if not os.path.exists(path):
-            print("VTT file does not exist. Creating with header.")
-            with open(path, "w", encoding="utf-8") as f:
-                f.write("WEBVTT\n\n")
-
-        # Step 3: Format start, end, and text (cleaned and robust)
-        try:
-            start = _format_timestamp(sentence_obj["start"])
-            end = _format_timestamp(sentence_obj["end"])
-            text_raw = sentence_obj["text"]
-            # Clean up text: remove newlines, trim whitespace, ensure single spaces
-            text = re.sub(r'[\r\n]+', ' ', text_raw).strip()
-            text = re.sub(r'\s{2,}', ' ', text)
-            print(f"Formatted subtitle: {start} --> {end} | Text length: {len(text)}")
-
-            # Step 4: Append to file
-            with open(path, "a", encoding="utf-8") as f:
-                f.write(f"{start} --> {end}\n{text}\n\n")
-
-            print(f"Subtitle appended successfully. Next index: {index + 1}")
-            return index + 1
-        except Exception as e:
-            print(f"Error appending subtitle: {e}")
-            return index + 1  # Fail-safe: move to next index even if error
-
     def _is_valid(self, audio_data):
         if audio_data is None:
             return False
@@ -711,23 +648,263 @@ class Coqui:
         return text 
 
 
-    def convert(self, sentence_number, sentence):
+    def _set_voice_path(self, settings):
+        settings['voice_path'] = (
+            self.session['voice'] if self.session['voice'] is not None 
+            else os.path.join(self.session['custom_model_dir'], self.session['tts_engine'], self.session['custom_model'], 'ref.wav') if self.session['custom_model'] is not None
+            else models[self.session['tts_engine']][self.session['fine_tuned']]['voice']
+        )
+
+    def _set_xtts_latents(self, settings):
         global xtts_builtin_speakers_list
+        if settings['voice_path'] is not None and settings['voice_path'] in settings['latent_embedding'].keys():
+            settings['gpt_cond_latent'], settings['speaker_embedding'] = settings['latent_embedding'][settings['voice_path']]
+        else:
+            msg = 'Computing speaker latents...'
+            print(msg)
+            if settings['voice_path'] in default_xtts_settings['voices'].values():
+                settings['gpt_cond_latent'], settings['speaker_embedding'] = xtts_builtin_speakers_list[settings['voice_path']].values()
+            else:
+                latents = None
+                latent_key = None
+                if enable_latent_cache and settings['voice_path'] is not None and os.path.exists(settings['voice_path']):
+                    # Latents of a voice already used by another session or process
+                    latent_key = latent_cache.get_key(settings['voice_path'], settings.get('checkpoint_path'))
+                    latents = latent_cache.load(latent_key)
+                if latents is None:
+                    latents = self.tts.get_conditioning_latents(audio_path=[settings['voice_path']])
+                    if latent_key is not None:
+                        try:
+                            latent_cache.save(latent_key, *latents)
+                        except Exception as e:
+                            error = f'Could not save the speaker latents to the cache: {e}'
+                            print(error)
+                settings['gpt_cond_latent'], settings['speaker_embedding'] = latents
+            settings['latent_embedding'][settings['voice_path']] = settings['gpt_cond_latent'], settings['speaker_embedding']
+
+    def _xtts_inference_batch(self, texts, gpt_cond_latent, speaker_embedding):
+        # Same as Xtts.inference() for several texts, but the autoregressive GPT
+        # generation runs once for all of them. Prefixes (conditioning latents + text)
+        # are left padded and masked out, XTTS GPT2 has no absolute position
+        # embeddings so every text is generated as if it was alone. The latents
+        # forward pass and the HiFiGAN decoder still run per text.
+        tts = self.tts
+        gpt = tts.gpt
+        params = {
+            key: param.default for key, param in inspect.signature(tts.inference).parameters.items()
+            if param.default is not inspect.Parameter.empty
+        }
+        params.update(self.fine_tuned_params)
+        language = self.session['language_iso1'].split('-')[0]
+        length_scale = 1.0 / max(params['speed'], 0.05)
+        gpt_cond_latent = gpt_cond_latent.to(tts.device)
+        speaker_embedding = speaker_embedding.to(tts.device)
+        text_tokens = []
+        prefixes = []
+        for text in texts:
+            tokens = torch.IntTensor(tts.tokenizer.encode(text.strip().lower(), lang=language)).unsqueeze(0).to(tts.device)
+            if tokens.shape[-1] >= tts.args.gpt_max_text_tokens:
+                error = f'XTTS can only generate text with a maximum of {tts.args.gpt_max_text_tokens} tokens.'
+                raise ValueError(error)
+            text_tokens.append(tokens)
+            text_inputs = F.pad(tokens, (0, 1), value=gpt.stop_text_token)
+            text_inputs = F.pad(text_inputs, (1, 0), value=gpt.start_text_token)
+            emb = gpt.text_embedding(text_inputs) + gpt.text_pos_embedding(text_inputs)
+            prefixes.append(torch.cat([gpt_cond_latent, emb], dim=1))
+        prefix_len = max(prefix.shape[1] for prefix in prefixes)
+        prefix_emb = torch.zeros(len(prefixes), prefix_len, prefixes[0].shape[-1], dtype=prefixes[0].dtype, device=tts.device)
+        attention_mask = torch.zeros(len(prefixes), prefix_len + 1, dtype=torch.long, device=tts.device)
+        for i, prefix in enumerate(prefixes):
+            prefix_emb[i, prefix_len - prefix.shape[1]:] = prefix[0]
+            attention_mask[i, prefix_len - prefix.shape[1]:] = 1
+        gpt.gpt_inference.store_prefix_emb(prefix_emb)
+        gpt_inputs = torch.full((len(prefixes), prefix_len + 1), fill_value=1, dtype=torch.long, device=tts.device)
+        gpt_inputs[:, -1] = gpt.start_audio_token
+        gpt_codes = gpt.gpt_inference.generate(
+            gpt_inputs,
+            bos_token_id=gpt.start_audio_token,
+            pad_token_id=gpt.stop_audio_token,
+            eos_token_id=gpt.stop_audio_token,
+            max_length=gpt.max_gen_mel_tokens + gpt_inputs.shape[-1],
+            attention_mask=attention_mask,
+            do_sample=params['do_sample'],
+            top_p=params['top_p'],
+            top_k=params['top_k'],
+            temperature=params['temperature'],
+            num_beams=params['num_beams'],
+            length_penalty=params['length_penalty'],
+            repetition_penalty=params['repetition_penalty'],
+            output_attentions=False
+        )[:, gpt_inputs.shape[1]:]
+        wavs = []
+        for i, tokens in enumerate(text_tokens):
+            # Finished rows are padded with the stop token, keep the first one like a single generation
+            codes = gpt_codes[i:i + 1]
+            stops = (codes[0] == gpt.stop_audio_token).nonzero()
+            if stops.numel() > 0:
+                codes = codes[:, :stops[0, 0] + 1]
+            expected_output_len = torch.tensor([codes.shape[-1] * gpt.code_stride_len], device=tts.device)
+            text_len = torch.tensor([tokens.shape[-1]], device=tts.device)
+            gpt_latents = gpt(
+                tokens,
+                text_len,
+                codes,
+                expected_output_len,
+                cond_latents=gpt_cond_latent,
+                return_attentions=False,
+                return_latent=True
+            )
+            if length_scale != 1.0:
+                gpt_latents = F.interpolate(
+                    gpt_latents.transpose(1, 2), scale_factor=length_scale, mode="linear"
+                ).transpose(1, 2)
+            wavs.append(tts.hifigan_decoder(gpt_latents, g=speaker_embedding).cpu().squeeze())
+        return wavs
+
+    def _xtts_inference(self, text, settings):
+        with torch.no_grad():
+            result = self.tts.inference(
+                text=text,
+                language=self.session['language_iso1'],
+                gpt_cond_latent=settings['gpt_cond_latent'],
+                speaker_embedding=settings['speaker_embedding'],
+                **self.fine_tuned_params
+            )
+        return result.get('wav')
+
+    def _split_text(self, text):
+        # Two halves cut at the punctuation close to the middle, or else at the closest space
+        middle = len(text) // 2
+        for pattern, max_offset in ((r'[,;:!?…—]\s', len(text) // 4), (r'\s', len(text))):
+            cuts = [m.end() for m in re.finditer(pattern, text)]
+            if cuts:
+                cut = min(cuts, key=lambda c: abs(c - middle))
+                if abs(cut - middle) <= max_offset and text[:cut].strip() and text[cut:].strip():
+                    return [text[:cut].strip(), text[cut:].strip()]
+        return [text]
+
+    def _oom_retry(self, infer, text, retries=None):
+        # infer(text) returns the audio of text. On CUDA out of memory the text is
+        # generated again in two shorter chunks, up to gpu_oom_retries times.
+        retries = gpu_oom_retries if retries is None else retries
+        try:
+            return infer(text)
+        except Exception as e:
+            if retries <= 0 or not self.gpu_memory.is_oom(e):
+                raise
+            self.gpu_memory.on_oom()
+            chunks = self._split_text(text)
+            msg = f'CUDA out of memory, generating the text again in {len(chunks)} chunk(s)...'
+            print(msg)
+            audio_parts = [self._oom_retry(infer, chunk, retries - 1) for chunk in chunks]
+            audio_segments = [self._audio_segment(audio_part) for audio_part in audio_parts if self._is_valid(audio_part)]
+            return torch.cat(audio_segments, dim=-1).squeeze(0) if audio_segments else None
+
+    def _save_sentence(self, sentence_number, sentence, audio_segments, silence_tensor, sample_rate, audio2trim, trim_audio_buffer):
+        final_sentence = os.path.join(self.session['chapters_dir_sentences'], f'{sentence_number}.{default_audio_proc_format}')
+        if audio_segments and torch.equal(audio_segments[-1], silence_tensor):
+            audio_segments = audio_segments[:-1]
+
+        if audio_segments:
+            audio_tensor = torch.cat(audio_segments, dim=-1)
+            if audio2trim:
+                audio_tensor = self._trim_audio(audio_tensor.squeeze(), sample_rate, 0.001, trim_audio_buffer).unsqueeze(0)
+            torchaudio.save(final_sentence, audio_tensor, sample_rate, format=default_audio_proc_format)
+            if self.subtitles is not None:
+                self.subtitles.append(sentence_number, audio_tensor.shape[-1], sample_rate, sentence)
+            del audio_tensor
+        self.gpu_memory.sentence_done(sentence_number)
+        if os.path.exists(final_sentence):
+            return True
+        else:
+            error = f"Cannot create {final_sentence}"
+            print(error)
+            return False
+
+    def convert_batch(self, sentence_numbers, sentences):
+        try:
+            # Only the XTTS generation is batched, the other engines (and XTTS
+            # text splitting) convert the sentences one by one
+            if self.session['tts_engine'] != XTTSv2 or len(sentences) == 1 or self.fine_tuned_params.get('enable_text_splitting'):
+                for sentence_number, sentence in zip(sentence_numbers, sentences):
+                    if not self.convert(sentence_number, sentence):
+                        return False
+                return True
+            if not self.tts:
+                error = f"TTS engine failed to load!"
+                print(error)
+                return False
+            settings = self.params[XTTSv2]
+            self._set_voice_path(settings)
+            self._set_xtts_latents(settings)
+            sample_rate = settings['sample_rate']
+            silence_tensor = torch.zeros(1, sample_rate * 2)
+            batch_size = max(1, int(self.session['tts_batch_size'] or 1))
+            if self.max_batch_size is not None:
+                batch_size = min(batch_size, self.max_batch_size)
+            items = []
+            for sentence in sentences:
+                audio2trim = sentence.endswith('-')
+                if audio2trim:
+                    sentence = sentence[:-1]
+                parts = [p.replace('.', '— ').strip() for p in sentence.split('‡pause‡')]
+                items.append((sentence, audio2trim, parts))
+            texts = [part for sentence, audio2trim, parts in items for part in parts if part]
+            # Texts of close lengths are generated together to limit the padding
+            order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+            audio_parts = [None] * len(texts)
+            start = 0
+            while start < len(order):
+                batch = order[start:start + batch_size]
+                if len(batch) == 1:
+                    audio_parts[batch[0]] = self._oom_retry(lambda text: self._xtts_inference(text, settings), texts[batch[0]])
+                    start += 1
+                    continue
+                try:
+                    with torch.no_grad():
+                        wavs = self._xtts_inference_batch([texts[i] for i in batch], settings['gpt_cond_latent'], settings['speaker_embedding'])
+                except Exception as e:
+                    if not self.gpu_memory.is_oom(e):
+                        raise
+                    # Smaller batches for the rest of the conversion
+                    self.gpu_memory.on_oom()
+                    batch_size = self.max_batch_size = len(batch) // 2
+                    msg = f'CUDA out of memory, TTS batch size lowered to {batch_size}'
+                    print(msg)
+                    continue
+                for i, wav in zip(batch, wavs):
+                    audio_parts[i] = wav
+                start += len(batch)
+            index = 0
+            for sentence_number, (sentence, audio2trim, parts) in zip(sentence_numbers, items):
+                audio_segments = []
+                for text_part in parts:
+                    if not text_part:
+                        audio_segments.append(silence_tensor)
+                        continue
+                    audio_part = audio_parts[index]
+                    index += 1
+                    if self._is_valid(audio_part):
+                        audio_segments.append(self._audio_segment(audio_part))
+                        audio_segments.append(silence_tensor)
+                if not self._save_sentence(sentence_number, sentence, audio_segments, silence_tensor, sample_rate, audio2trim, 0.07):
+                    return False
+            return True
+        except Exception as e:
+            error = f'convert_batch(): {e}'
+            raise ValueError(error)
+
+    def convert(self, sentence_number, sentence):
         try:
             #sentence = self._preprocess_text(sentence)  # Added for text preprocessing
             audio_data = False
             audio2trim = False
             trim_audio_buffer = 0.001
             settings = self.params[self.session['tts_engine']]
-            final_sentence = os.path.join(self.session['chapters_dir_sentences'], f'{sentence_number}.{default_audio_proc_format}')
             if sentence.endswith('-'):
                 sentence = sentence[:-1]
                 audio2trim = True
-            settings['voice_path'] = (
-                self.session['voice'] if self.session['voice'] is not None 
-                else os.path.join(self.session['custom_model_dir'], self.session['tts_engine'], self.session['custom_model'], 'ref.wav') if self.session['custom_model'] is not None
-                else models[self.session['tts_engine']][self.session['fine_tuned']]['voice']
-            )
+            self._set_voice_path(settings)
             sentence_parts = sentence.split('‡pause‡')
             if self.session['tts_engine'] == XTTSv2 or self.session['tts_engine'] == FAIRSEQ:
                 sentence_parts = [p.replace('.', '— ') for p in sentence_parts]
@@ -738,32 +915,13 @@ class Coqui:
                 for text_part in sentence_parts:
                     text_part = text_part.strip()
                     if not text_part:
-                        audio_segments.append(silence_tensor.clone())
+                        audio_segments.append(silence_tensor)
                         continue
                     audio_part = None
                     if self.session['tts_engine'] == XTTSv2:
                         trim_audio_buffer = 0.07 
-                        if settings['voice_path'] is not None and settings['voice_path'] in settings['latent_embedding'].keys():
-                            settings['gpt_cond_latent'], settings['speaker_embedding'] = settings['latent_embedding'][settings['voice_path']]
-                        else:
-                            msg = 'Computing speaker latents...'
-                            print(msg)
-                            if settings['voice_path'] in default_xtts_settings['voices'].values():
-                                settings['gpt_cond_latent'], settings['speaker_embedding'] = xtts_builtin_speakers_list[settings['voice_path']].values()
-                            else:
-                                settings['gpt_cond_latent'], settings['speaker_embedding'] = self.tts.get_conditioning_latents(audio_path=[settings['voice_path']])  
-                            settings['latent_embedding'][settings['voice_path']] = settings['gpt_cond_latent'], settings['speaker_embedding']
-                        with torch.no_grad():
-                            result = self.tts.inference(
-                                text=text_part,
-                                language=self.session['language_iso1'],
-                                gpt_cond_latent=settings['gpt_cond_latent'],
-                                speaker_embedding=settings['speaker_embedding'],
-                                **self.fine_tuned_params
-                            )
-                        audio_part = result.get('wav')
-                        if self._is_valid(audio_part):
-                            audio_part = audio_part.tolist()
+                        self._set_xtts_latents(settings)
+                        audio_part = self._oom_retry(lambda text: self._xtts_inference(text, settings), text_part)
                     elif self.session['tts_engine'] == BARK:
                         trim_audio_buffer = 0.001
                         '''
@@ -796,10 +954,7 @@ class Coqui:
                             "text_temp": 0.2
                         }                      
                         with torch.no_grad():
-                            audio_part = self.tts.tts(
-                                text=text_part,
-                                **speaker_argument
-                            )
+                            audio_part = self._oom_retry(lambda text: self.tts.tts(text=text, **speaker_argument), text_part)
                     elif self.session['tts_engine'] == VITS:
                         speaker_argument = {}
                         if self.session['language'] == 'eng' and 'vctk/vits' in models[self.session['tts_engine']]['internal']['sub']:
@@ -809,118 +964,20 @@ class Coqui:
                             if self.session['language'] in models[self.session['tts_engine']]['internal']['sub']['custom/vits'] or self.session['language_iso1'] in models[self.session['tts_engine']]['internal']['sub']['custom/vits']:
                                 speaker_argument = {"speaker": '09901'}
                         if settings['voice_path'] is not None:
-                            proc_dir = os.path.join(self.session['voice_dir'], 'proc')
-                            os.makedirs(proc_dir, exist_ok=True)
-                            tmp_in_wav = os.path.join(proc_dir, f"{uuid.uuid4()}.wav")
-                            tmp_out_wav = os.path.join(proc_dir, f"{uuid.uuid4()}.wav")
-                            self.tts.tts_to_file(
-                                text=text_part,
-                                file_path=tmp_in_wav,
-                                **speaker_argument
-                            )
-                            if settings['voice_path'] in settings['semitones'].keys():
-                                semitones = settings['semitones'][settings['voice_path']]
-                            else:
-                                voice_path_gender = self._detect_gender(settings['voice_path'])
-                                voice_builtin_gender = self._detect_gender(tmp_in_wav)
-                                msg = f"Cloned voice seems to be {voice_path_gender}\nBuiltin voice seems to be {voice_builtin_gender}"
-                                print(msg)
-                                if voice_builtin_gender != voice_path_gender:
-                                    semitones = -4 if voice_path_gender == 'male' else 4
-                                    msg = f"Adapting builtin voice frequencies from the clone voice..."
-                                    print(msg)
-                                else:
-                                    semitones = 0
-                                settings['semitones'][settings['voice_path']] = semitones
-                            if semitones > 0:
-                                try:
-                                    cmd = [
-                                        shutil.which('sox'), tmp_in_wav,
-                                        "-r", str(settings['sample_rate']), tmp_out_wav,
-                                        "pitch", str(semitones * 100)
-                                    ]
-                                    subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-                                except subprocess.CalledProcessError as e:
-                                    print(f"Subprocess error: {e.stderr}")
-                                    DependencyError(e)
-                                    return False
-                                except FileNotFoundError as e:
-                                    print(f"File not found: {e}")
-                                    DependencyError(e)
-                                    return False
-                            else:
-                                tmp_out_wav = tmp_in_wav
                             with torch.no_grad():
-                                audio_part = self.tts_vc.voice_conversion(
-                                    source_wav=tmp_out_wav,
-                                    target_wav=settings['voice_path']
-                                )
+                                audio_part = self._oom_retry(lambda text: self.tts.tts(text=text, **speaker_argument), text_part)
+                            audio_part = self._convert_voice(audio_part, self.tts.synthesizer.output_sample_rate, settings)
                             settings['sample_rate'] = 16000
-                            if os.path.exists(tmp_in_wav):
-                                os.remove(tmp_in_wav)
-                            if os.path.exists(tmp_out_wav):
-                                os.remove(tmp_out_wav)
                         else:
-                            audio_part = self.tts.tts(
-                                text=text_part,
-                                **speaker_argument
-                            )
+                            audio_part = self._oom_retry(lambda text: self.tts.tts(text=text, **speaker_argument), text_part)
                     elif self.session['tts_engine'] == FAIRSEQ:
                         if settings['voice_path'] is not None:
                             settings['voice_path'] = re.sub(r'_24000\.wav$', '_16000.wav', settings['voice_path'])
-                            proc_dir = os.path.join(self.session['voice_dir'], 'proc')
-                            os.makedirs(proc_dir, exist_ok=True)
-                            tmp_in_wav = os.path.join(proc_dir, f"{uuid.uuid4()}.wav")
-                            tmp_out_wav = os.path.join(proc_dir, f"{uuid.uuid4()}.wav")
-                            self.tts.tts_to_file(
-                                text=text_part,
-                                file_path=tmp_in_wav
-                            )
-                            if settings['voice_path'] in settings['semitones'].keys():
-                                semitones = settings['semitones'][settings['voice_path']]
-                            else:
-                                voice_path_gender = self._detect_gender(settings['voice_path'])
-                                voice_builtin_gender = self._detect_gender(tmp_in_wav)
-                                msg = f"Cloned voice seems to be {voice_path_gender}\nBuiltin voice seems to be {voice_builtin_gender}"
-                                print(msg)
-                                if voice_builtin_gender != voice_path_gender:
-                                    semitones = -4 if voice_path_gender == 'male' else 4
-                                    msg = f"Adapting builtin voice frequencies from the clone voice..."
-                                    print(msg)
-                                else:
-                                    semitones = 0
-                                settings['semitones'][settings['voice_path']] = semitones
-                            if semitones > 0:
-                                try:
-                                    cmd = [
-                                        shutil.which('sox'), tmp_in_wav,
-                                        "-r", str(settings['sample_rate']), tmp_out_wav,
-                                        "pitch", str(semitones * 100)
-                                    ]
-                                    subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-                                except subprocess.CalledProcessError as e:
-                                    print(f"Subprocess error: {e.stderr}")
-                                    DependencyError(e)
-                                    return False
-                                except FileNotFoundError as e:
-                                    print(f"File not found: {e}")
-                                    DependencyError(e)
-                                    return False
-                            else:
-                                tmp_out_wav = tmp_in_wav
                             with torch.no_grad():
-                                audio_part = self.tts_vc.voice_conversion(
-                                    source_wav=tmp_out_wav,
-                                    target_wav=settings['voice_path']
-                                )
-                            if os.path.exists(tmp_in_wav):
-                                os.remove(tmp_in_wav)
-                            if os.path.exists(tmp_out_wav):
-                                os.remove(tmp_out_wav)
+                                audio_part = self._oom_retry(lambda text: self.tts.tts(text=text), text_part)
+                            audio_part = self._convert_voice(audio_part, self.tts.synthesizer.output_sample_rate, settings)
                         else:
-                            audio_part = self.tts.tts(
-                                text=text_part
-                            )
+                            audio_part = self._oom_retry(lambda text: self.tts.tts(text=text), text_part)
                     elif self.session['tts_engine'] == YOURTTS:
                         trim_audio_buffer = 0.005
                         speaker_argument = {}
@@ -932,45 +989,11 @@ class Coqui:
                             voice_key = default_yourtts_settings['voices']['ElectroMale-2']
                             speaker_argument = {"speaker": voice_key}
                         with torch.no_grad():
-                            audio_part = self.tts.tts(
-                                text=text_part,
-                                language=language,
-                                **speaker_argument
-                            )
+                            audio_part = self._oom_retry(lambda text: self.tts.tts(text=text, language=language, **speaker_argument), text_part)
                     if self._is_valid(audio_part):
-                        sourceTensor = self._tensor_type(audio_part)
-                        audio_tensor = sourceTensor.clone().detach().unsqueeze(0).cpu()
-                        audio_segments.append(audio_tensor)
-                        audio_segments.append(silence_tensor.clone())
-
-                if audio_segments and torch.equal(audio_segments[-1], silence_tensor):
-                    audio_segments = audio_segments[:-1]
-
-                if audio_segments:
-                    audio_tensor = torch.cat(audio_segments, dim=-1)
-                    if audio2trim:
-                        audio_tensor = self._trim_audio(audio_tensor.squeeze(), sample_rate, 0.001, trim_audio_buffer).unsqueeze(0)
-                    start_time = self.sentences_total_time
-                    duration = audio_tensor.shape[-1] / sample_rate
-                    end_time = start_time + duration
-                    self.sentences_total_time = end_time
-                    sentence_obj = {
-                        "start": start_time,
-                        "end": end_time,
-                        "text": sentence,
-                        "resume_check": self.sentence_idx
-                    }
-                    self.sentence_idx = self._append_sentence2vtt(sentence_obj, self.vtt_path)
-                    torchaudio.save(final_sentence, audio_tensor, sample_rate, format=default_audio_proc_format)
-                    del audio_tensor
-                if self.session['device'] == 'cuda':
-                    torch.cuda.empty_cache()
-                if os.path.exists(final_sentence):
-                    return True
-                else:
-                    error = f"Cannot create {final_sentence}"
-                    print(error)
-                    return False
+                        audio_segments.append(self._audio_segment(audio_part))
+                        audio_segments.append(silence_tensor)
+                return self._save_sentence(sentence_number, sentence, audio_segments, silence_tensor, sample_rate, audio2trim, trim_audio_buffer)
             else:
                 error = f"TTS engine failed to load!"
                 print(error)
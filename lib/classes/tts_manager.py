@@ -38,5 +38,11 @@ class TTSManager:
                 # Single string (backward compatibility)
                 return self.tts.convert(sentence_number, result)
 
+        except Exception as e:
+            raise ValueError(e)
+
+    def convert_sentences2audio(self, sentence_numbers, sentences):
+        try:
+            return self.tts.convert_batch(sentence_numbers, sentences)
         except Exception as e:
             raise ValueError(e)
\ No newline at end of file
@@ -0,0 +1,195 @@
+import multiprocessing
+import os
+import torch
+
+from collections import deque
+from queue import Empty
+
+def tts_worker(worker_id, worker_session, num_threads, tasks, results):
+    # Runs in its own process with its own model copy. The CUDA device was
+    # selected by the parent through CUDA_VISIBLE_DEVICES before spawning.
+    if num_threads is not None:
+        torch.set_num_threads(num_threads)
+    from lib.classes.tts_manager import TTSManager
+    tts_manager = TTSManager(worker_session)
+    if not tts_manager.active:
+        results.put((worker_id, None, False))
+        return
+    # Subtitles are written by the parent process, in sentence order
+    tts_manager.tts.subtitles = None
+    while True:
+        batch = tasks.get()
+        if batch is None:
+            break
+        sentence_numbers = [sentence_number for sentence_number, sentence in batch]
+        try:
+            if len(batch) == 1:
+                success = tts_manager.convert_sentence2audio(*batch[0])
+            else:
+                success = tts_manager.convert_sentences2audio(sentence_numbers, [sentence for sentence_number, sentence in batch])
+        except Exception as e:
+            error = f'TTS worker {os.getpid()} failed on sentences {sentence_numbers}: {e}'
+            print(error)
+            success = False
+        results.put((worker_id, sentence_numbers, success))
+
+class TTSWorkerPool:
+    """
+    Pool of TTS processes converting batches of sentences in parallel.
+
+    With the cuda device, workers are spread round robin over the visible GPUs,
+    otherwise they all run on the CPU and share its cores. Each worker loads its
+    own model and writes {sentence_number}.flac into chapters_dir_sentences like
+    a single TTSManager would. Results are (sentence_numbers, success) tuples,
+    returned in completion order.
+
+    Every worker has its own task queue holding at most `prefetch` batches, so
+    the pool knows which batches each worker holds. When a worker dies (OOM
+    killer, segfault) its unanswered batches go to the other workers, once:
+    a batch lost twice, or the last worker dying, fails the conversion.
+    """
+
+    prefetch = 2
+
+    def __init__(self, session, workers):
+        self.workers = workers
+        self.pending = 0
+        self.processes = []
+        self.tasks = []
+        self.assigned = [deque() for _ in range(workers)]
+        self.dead = set()
+        self.requeued = set()
+        self.backlog = deque()
+        self.ready = []
+        # The parsed chapters are not needed by the workers and can be huge
+        worker_session = {key: value for key, value in session.items() if key != 'chapters'}
+        ctx = multiprocessing.get_context('spawn')
+        self.results = ctx.Queue()
+        self.devices = self.get_devices(session['device'])
+        num_threads = None if self.devices else max(1, (os.cpu_count() or 1) // workers)
+        visible_devices = os.environ.get('CUDA_VISIBLE_DEVICES')
+        try:
+            for i in range(workers):
+                if self.devices:
+                    os.environ['CUDA_VISIBLE_DEVICES'] = self.devices[i % len(self.devices)]
+                tasks = ctx.Queue()
+                process = ctx.Process(target=tts_worker, args=(i, worker_session, num_threads, tasks, self.results), daemon=True)
+                process.start()
+                self.tasks.append(tasks)
+                self.processes.append(process)
+        finally:
+            if visible_devices is None:
+                os.environ.pop('CUDA_VISIBLE_DEVICES', None)
+            else:
+                os.environ['CUDA_VISIBLE_DEVICES'] = visible_devices
+
+    @staticmethod
+    def get_devices(device):
+        if device != 'cuda' or not torch.cuda.is_available():
+            return []
+        visible_devices = os.environ.get('CUDA_VISIBLE_DEVICES')
+        if visible_devices:
+            return [d.strip() for d in visible_devices.split(',') if d.strip()]
+        return [str(i) for i in range(torch.cuda.device_count())]
+
+    def _receive(self, result):
+        worker_id, sentence_numbers, success = result
+        if sentence_numbers is None:
+            # The worker could not load its model and exits
+            self.ready.append((None, False))
+            return
+        if worker_id in self.dead:
+            # Late result of a batch already sent to another worker
+            return
+        # A worker converts its batches in the order they were sent
+        self.assigned[worker_id].popleft()
+        self.ready.append((sentence_numbers, success))
+
+    def _drain(self):
+        while True:
+            try:
+                self._receive(self.results.get_nowait())
+            except Empty:
+                return
+
+    def _check_workers(self):
+        exited = [i for i, process in enumerate(self.processes) if i not in self.dead and not process.is_alive()]
+        if not exited:
+            return
+        # Results sent before exiting are not lost batches
+        self._drain()
+        for i in exited:
+            self.dead.add(i)
+            lost = list(self.assigned[i])
+            self.assigned[i].clear()
+            if not lost:
+                continue
+            process = self.processes[i]
+            msg = f'**TTS worker {process.pid} exited with code {process.exitcode}, converting its {len(lost)} batches again'
+            print(msg)
+            for batch in reversed(lost):
+                sentence_numbers = tuple(sentence_number for sentence_number, sentence in batch)
+                if sentence_numbers in self.requeued:
+                    error = f'Sentences {list(sentence_numbers)} were lost twice by a TTS worker exiting unexpectedly!'
+                    raise RuntimeError(error)
+                self.requeued.add(sentence_numbers)
+                self.backlog.appendleft(batch)
+        if len(self.dead) == self.workers:
+            error = 'All TTS workers exited unexpectedly!'
+            raise RuntimeError(error)
+
+    def _dispatch(self):
+        while self.backlog:
+            alive = [i for i in range(self.workers) if i not in self.dead and len(self.assigned[i]) < self.prefetch]
+            if not alive:
+                return
+            i = min(alive, key=lambda i: len(self.assigned[i]))
+            batch = self.backlog.popleft()
+            self.assigned[i].append(batch)
+            self.tasks[i].put(batch)
+
+    def submit(self, batch):
+        self.backlog.append(list(batch))
+        self.pending += 1
+        while True:
+            self._check_workers()
+            self._dispatch()
+            if not self.backlog:
+                return
+            # Every worker is busy, collect a result to free one
+            try:
+                self._receive(self.results.get(timeout=1))
+            except Empty:
+                continue
+
+    def poll(self):
+        self._drain()
+        self._check_workers()
+        self._dispatch()
+        results = self.ready
+        self.ready = []
+        self.pending -= sum(1 for sentence_numbers, success in results if sentence_numbers is not None)
+        return results
+
+    def wait(self, timeout=1):
+        if not self.ready:
+            try:
+                self._receive(self.results.get(timeout=timeout))
+            except Empty:
+                pass
+        return self.poll()
+
+    def terminate(self):
+        for process in self.processes:
+            if process.is_alive():
+                process.terminate()
+        for process in self.processes:
+            process.join()
+
+    def close(self):
+        for i, tasks in enumerate(self.tasks):
+            if i not in self.dead:
+                tasks.put(None)
+        for process in self.processes:
+            process.join(timeout=10)
+        self.terminate()
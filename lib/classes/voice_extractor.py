@@ -11,7 +11,8 @@ from io import BytesIO
 from pydub import AudioSegment
 from torchvggish import vggish, vggish_input
 
-from lib.conf import voice_formats
+from lib.classes.pitch_analyzer import PitchAnalyzer
+from lib.conf import voice_formats, pitch_cache_dir
 from lib.models import XTTSv2, models
 
 class VoiceExtractor:
@@ -27,6 +28,7 @@ class VoiceExtractor:
         self.output_dir = self.session['voice_dir']
         self.demucs_dir = os.path.join(self.output_dir, 'htdemucs', os.path.splitext(os.path.basename(self.voice_file))[0])
         self.final_files = [] 
+        self.pitch_analyzer = PitchAnalyzer(pitch_cache_dir)
 
     def _validate_format(self):
         file_extension = os.path.splitext(self.voice_file)[1].lower()
@@ -86,6 +88,23 @@ class VoiceExtractor:
             raise ValueError(error)   
         return False, error
 
+    def _analyze_pitch(self):
+        # The f0 and gender of the voice files are cached by content hash,
+        # so the conversions using this voice never analyze it again
+        if not self.final_files:
+            msg = '_analyze_pitch() error: no voice file to analyze'
+            return False, msg
+        try:
+            msgs = []
+            for file in self.final_files:
+                result = self.pitch_analyzer.analyze_file(file)
+                msgs.append(f"{os.path.basename(file)}: pitch {result['f0']} Hz, gender: {result['gender']}")
+            msg = 'Voice ' + ', '.join(msgs)
+            return True, msg
+        except Exception as e:
+            msg = f'_analyze_pitch() error: {e}'
+        return False, msg
+
     def _detect_background(self):
         try:
             torch_home = os.path.join(self.models_dir, 'hub')
@@ -315,6 +334,9 @@ class VoiceExtractor:
                                 if success:
                                     success, msg = self._wav2npz()
                                     print(msg)
+                                    if success:
+                                        success, msg = self._analyze_pitch()
+                                        print(msg)
         except Exception as e:
             msg = f'extract_voice() error: {e}'
             raise ValueError(msg)
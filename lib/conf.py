@@ -44,6 +44,13 @@ debug_mode = True
 device_list = ['cpu', 'gpu', 'mps']
 default_device = "cuda"
 
+default_parse_workers = 1 # ebook documents parsed in parallel by get_chapters() (1 = serial)
+default_streaming = False # synthesize blocks while the rest of the ebook is still being parsed
+streaming_queue_size = 4 # parsed blocks buffered ahead of the TTS in streaming mode
+default_tts_batch_size = 1 # sentences synthesized per xtts batch by convert_chapters2audio() (1 = one by one)
+default_tts_workers = 1 # tts processes converting sentences in parallel, one model copy each, round robin over the cuda devices (1 = single process)
+html_parser = 'lxml' # or 'bs4', html backend of filter_chapter() and get_ebook_title()
+
 python_env_dir = os.path.abspath(os.path.join('.','python_env'))
 requirements_file = os.path.abspath(os.path.join('.','requirements.txt'))
 
@@ -63,7 +70,28 @@ audiobooks_host_dir = os.path.abspath(os.path.join('audiobooks','gui','host'))
 audiobooks_cli_dir = os.path.abspath(os.path.join('audiobooks','cli'))
 
 ebook_formats = ['.epub', '.mobi', '.azw3', '.fb2', '.lrf', '.rb', '.snb', '.tcr', '.pdf', '.txt', '.rtf', '.doc', '.docx', '.html', '.odt', '.azw']
+native_epub = True # read valid .epub input directly with ebooklib, Calibre only converts the other formats
+calibre_stream_output = True # print the ebook-convert log as it runs instead of capturing it
+native_pdf = True # extract .pdf pages directly with pymupdf instead of the Markdown/Calibre conversion
+pdf_pages_per_block = 10 # pages per block when the PDF has no outline
+enable_parse_cache = True # reuse the parsed sentences of an ebook already converted with the same language and tts engine
+parse_cache_dir = os.path.join(tmp_dir, 'parse_cache')
+enable_latent_cache = True # reuse the xtts speaker latents of a voice file across sessions and processes
+latent_cache_dir = os.path.join(models_dir, 'latents')
+pitch_cache_dir = os.path.join(models_dir, 'pitch') # f0/gender analyses of the voice files, keyed by content hash
 voice_formats = ['.mp4', '.m4b', '.m4a', '.mp3', '.wav', '.aac', '.flac', '.alac', '.ogg', '.aiff', '.aif', '.wma', '.dsd', '.opus', '.pcmu', '.pcma', '.gsm'] # Add or remove the format you wish
 output_formats = ['m4b', 'm4a', 'mp4', 'webm', 'mov', 'mp3', 'flac', 'wav', 'ogg', 'aac']
 default_audio_proc_format = 'flac' # or 'wav', 'mp3', 'aac', 'm4a', 'm4b', 'amr', '3gp', 'alac'
+lossless_assembly = True # blocks are decoded to pcm and joined by stream copy, the audio is only encoded once by the final export
+block_audio_format = 'wav' if lossless_assembly else default_audio_proc_format
+subtitle_formats = ['vtt'] # subtitles written next to the audiobook, add 'srt' and/or 'lrc' (vtt is always written)
+resume_verify_checksums = False # on resume also check the crc32 of the converted audio files recorded in the journal, not only their size
+gpu_empty_cache_policy = 'oom' # when torch.cuda.empty_cache() runs: 'never', 'every_n' sentences or only after an 'oom'
+gpu_empty_cache_every = 50 # sentences between two torch.cuda.empty_cache() with the 'every_n' policy
+gpu_oom_retries = 2 # on CUDA out of memory, times the text is generated again in shorter chunks (batches are halved first)
+gpu_memory_stats_file = None # csv file where the cuda allocator stats of each sentence are appended, e.g. os.path.join(tmp_dir, 'gpu_memory_stats.csv')
+export_audio_filters = 'loudnorm=I=-16:LRA=11:TP=-1.5,afftdn=nf=-70' # loudness normalization and denoise of the final export
+two_pass_loudnorm = True # measure the loudness of each block once (cached) and export with one linear gain only, instead of export_audio_filters above
+loudnorm_target = (-16, -1.5) # integrated loudness (LUFS) and true peak (dBTP) reached by two_pass_loudnorm
+incremental_export = True # m4b/m4a/mp4: keep the aac of each block and only encode the new or changed ones before remuxing the book
 default_output_format = 'm4b' # or 'm4b', 'm4a', 'mp4', 'webm', 'mov', 'mp3', 'flac', 'wav', 'ogg', 'aac'
\ No newline at end of file
@@ -23,6 +23,7 @@ import random
 import regex as re
 import requests
 import shutil
+import soundfile as sf
 import socket
 import subprocess
 import sys
@@ -41,20 +42,22 @@ import lib.lang as lang
 import lib.models as mod
 
 from bs4 import BeautifulSoup
-from collections import Counter
+from collections import Counter, deque
 from collections.abc import Mapping
 from collections.abc import MutableMapping
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from datetime import datetime
+from fractions import Fraction
 from ebooklib import epub
 from glob import glob
+from html.entities import name2codepoint
+from lxml import etree
 from iso639 import languages
 from markdown import markdown
-from multiprocessing import Manager, Event
+from multiprocessing import Manager, Event, get_context
 from multiprocessing.managers import DictProxy, ListProxy
-from num2words import num2words
 from pathlib import Path
-from pydub import AudioSegment
-from queue import Queue, Empty
+from queue import Queue, Empty, Full
 from starlette.requests import ClientDisconnect
 from tqdm import tqdm
 from types import MappingProxyType
@@ -64,7 +67,16 @@ from urllib.parse import urlparse
 from lib.classes.voice_extractor import VoiceExtractor
 #from lib.classes.argos_translator import ArgosTranslator
 from lib.classes.tts_manager import TTSManager
+from lib.classes.tts_worker_pool import TTSWorkerPool
+from lib.classes.conversion_journal import ConversionJournal
+from lib.classes.text_normalizer import TextNormalizer, get_text_normalizer
+from lib.classes.ideogramm_segmenter import ideogramm_segmenter
+from lib.classes.sentence_chunker import SentenceChunker
+from lib.classes.pdf_extractor import PdfExtractor
+from lib.classes.parse_cache import ParseCache
 from lib.classes.silent_tqdm import SilentTqdm
+from lib.classes.subtitle_writer import SubtitleWriter
+from lib.classes.loudness_meter import LoudnessMeter
 
 def inject_configs(target_namespace):
     # Extract variables from both modules and inject them into the target namespace
@@ -74,6 +86,24 @@ def inject_configs(target_namespace):
 # Inject configurations into the global namespace of this module
 inject_configs(globals())
 
+parse_cache = ParseCache(parse_cache_dir)
+
+heading_tags = {"h1", "h2", "h3", "h4", "h5", "h6"}
+# Known non-chapter epub:type values skipped by filter_chapter()
+excluded_epub_types = {
+    "frontmatter", "backmatter", "toc", "titlepage", "colophon",
+    "acknowledgments", "dedication", "glossary", "index",
+    "appendix", "bibliography", "copyright-page", "landmark"
+}
+epub_ops_namespace = "http://www.idpf.org/2007/ops"
+# Named entities of the XHTML DTD, unknown to the XML parser without it
+html_entities = {name: chr(code) for name, code in name2codepoint.items() if name not in {"amp", "lt", "gt", "quot", "apos"}}
+# ffmpeg pcm codec of each soundfile subtype, for the lossless block assembly
+pcm_codecs = {
+    "PCM_U8": "pcm_u8", "PCM_16": "pcm_s16le", "PCM_24": "pcm_s24le",
+    "PCM_32": "pcm_s32le", "FLOAT": "pcm_f32le", "DOUBLE": "pcm_f64le"
+}
+
 class DependencyError(Exception):
     def __init__(self, message=None):
         super().__init__(message)
@@ -136,6 +166,7 @@ class SessionContext:
                 "chapters_dir": None,
                 "chapters_dir_sentences": None,
                 "epub_path": None,
+                "ebook_hash": None,
                 "filename_noext": None,
                 "tts_engine": default_tts_engine,
                 "fine_tuned": default_fine_tuned,
@@ -158,9 +189,14 @@ class SessionContext:
                 "top_p": default_xtts_settings['top_k'],
                 "speed": default_xtts_settings['speed'],
                 "enable_text_splitting": default_xtts_settings['enable_text_splitting'],
+                "parse_workers": default_parse_workers,
+                "streaming": default_streaming,
+                "tts_batch_size": default_tts_batch_size,
+                "tts_workers": default_tts_workers,
                 "event": None,
                 "final_name": None,
                 "output_format": default_output_format,
+                "export_formats": [default_output_format],
                 "metadata": {
                     "title": None, 
                     "creator": None,
@@ -196,8 +232,9 @@ def prepare_dirs(src, session):
         os.makedirs(session['voice_dir'], exist_ok=True)
         os.makedirs(session['audiobooks_dir'], exist_ok=True)
         session['ebook'] = os.path.join(session['process_dir'], os.path.basename(src))
+        session['ebook_hash'] = calculate_hash(src)
         if os.path.exists(session['ebook']):
-            if compare_files_by_hash(session['ebook'], src):
+            if calculate_hash(session['ebook']) == session['ebook_hash']:
                 resume = True
         if not resume:
             shutil.rmtree(session['chapters_dir'], ignore_errors=True)
@@ -358,150 +395,33 @@ def proxy2dict(proxy_obj):
             return str(source)  # Convert non-serializable types to strings
     return recursive_copy(proxy_obj, set())
 
-def math2word(text, lang, lang_iso1, tts_engine):
-    def check_compat():
-        try:
-            num2words(1, lang=lang_iso1)
-            return True
-        except NotImplementedError:
-            return False
-        except Exception as e:
-            return False
-
-    def rep_num(match):
-        number = match.group().strip().replace(",", "")
-        try:
-            if "." in number or "e" in number or "E" in number:
-                number_value = float(number)
-            else:
-                number_value = int(number)
-            number_in_words = num2words(number_value, lang=lang_iso1)
-            return f" {number_in_words}"
-        except Exception as e:
-            print(f"Error converting number: {number}, Error: {e}")
-            return f"{number}"
-
-    def replace_ambiguous(match):
-        symbol2 = match.group(2)
-        symbol3 = match.group(3)
-        if symbol2 in ambiguous_replacements: # "num SYMBOL num" case
-            return f"{match.group(1)} {ambiguous_replacements[symbol2]} {match.group(3)}"            
-        elif symbol3 in ambiguous_replacements: # "SYMBOL num" case
-            return f"{ambiguous_replacements[symbol3]} {match.group(4)}"
-        return match.group(0)
-
-    is_num2words_compat = check_compat()
-    phonemes_list = language_math_phonemes.get(lang, language_math_phonemes[default_language_code])
-    # Separate ambiguous and non-ambiguous symbols
-    ambiguous_symbols = {"-", "/", "*", "x"}
-    replacements = {k: v for k, v in phonemes_list.items() if not k.isdigit()}  # Keep only math symbols
-    normal_replacements = {k: v for k, v in replacements.items() if k not in ambiguous_symbols}
-    ambiguous_replacements = {k: v for k, v in replacements.items() if k in ambiguous_symbols}
-    # Replace unambiguous math symbols normally
-    if normal_replacements:
-        math_pattern = r'(' + '|'.join(map(re.escape, normal_replacements.keys())) + r')'
-        text = re.sub(math_pattern, lambda m: f" {normal_replacements[m.group(0)]} ", text)
-    # Regex pattern for ambiguous symbols (match only valid equations)
-    ambiguous_pattern = (
-        r'(?<!\S)(\d+)\s*([-/*x])\s*(\d+)(?!\S)|'  # Matches "num SYMBOL num" (e.g., "3 + 5", "7-2", "8 * 4")
-        r'(?<!\S)([-/*x])\s*(\d+)(?!\S)'           # Matches "SYMBOL num" (e.g., "-4", "/ 9")
-    )
-    if ambiguous_replacements:
-        text = re.sub(ambiguous_pattern, replace_ambiguous, text)
-    # Regex pattern for detecting numbers (handles negatives, commas, decimals, scientific notation)
-    number_pattern = r'\s*(-?\d{1,3}(?:,\d{3})*(?:\.\d+(?!\s|$))?(?:[eE][-+]?\d+)?)\s*'
-    if tts_engine == VITS or tts_engine == FAIRSEQ or tts_engine == YOURTTS:
-        if is_num2words_compat:
-            # Pattern 2: Split big numbers into groups of 4
-            text = re.sub(r'(\d{4})(?=\d{4}(?!\.\d))', r'\1 ', text)
-            text = re.sub(number_pattern, rep_num, text)
-        else:
-            # Pattern 2: Split big numbers into groups of 2
-            text = re.sub(r'(\d{2})(?=\d{2}(?!\.\d))', r'\1 ', text)
-            # Fallback: Replace numbers using phonemes dictionary
-            sorted_numbers = sorted((k for k in phonemes_list if k.isdigit()), key=len, reverse=True)
-            if sorted_numbers:
-                number_pattern = r'\b(' + '|'.join(map(re.escape, sorted_numbers)) + r')\b'
-                text = re.sub(number_pattern, lambda match: phonemes_list[match.group(0)], text)
-    return text
-
 def normalize_text(text, lang, lang_iso1, tts_engine):
-    # Remove emojis
-    emoji_pattern = re.compile(f"[{''.join(emojis_array)}]+", flags=re.UNICODE)
-    emoji_pattern.sub('', text)
-    if lang in abbreviations_mapping:
-        text = re.sub(r'\b(?:[a-zA-Z]+\.)+|[a-zA-Z]+', lambda m: {re.sub(r'\.', '', k).lower(): v for k, v in abbreviations_mapping["eng"].items()}.get(m.group().replace('.', '').lower(), m.group()), text)
-    # This regex matches sequences like a., c.i.a., f.d.a., m.c., etc...
-    pattern = re.compile(r'\b(?:[a-zA-Z]\.){1,}[a-zA-Z]?\b\.?')
-    # uppercase acronyms
-    text = re.sub(r'\b(?:[a-zA-Z]\.){1,}[a-zA-Z]?\b\.?', lambda m: m.group().replace('.', '').upper(), text)
-    # Replace ### and [pause] with ‡pause‡ (‡ = double dagger U+2021)
-    text = re.sub(r'(###|\[pause\])', '‡pause‡', text)
-    # Replace punctuations causing hallucinations
-    pattern = f"[{''.join(map(re.escape, punctuation_switch.keys()))}]"
-    text = re.sub(pattern, lambda match: punctuation_switch.get(match.group(), match.group()), text)
-    # Replace NBSP with a normal space
-    text = text.replace("\xa0", " ")
-    # Replace multiple newlines ("\n\n", "\r\r", "\n\r", etc.) with a single "\n"
-    text = re.sub(r'(\r\n|\r|\n)+', '\n', text)
-    # Replace single newlines ("\n" or "\r") with spaces
-    text = re.sub(r'[\r\n]', ' ', text)
-    # Replace multiple  and spaces with single space
-    text = re.sub(r'[     ]+', ' ', text)
-    # Replace ok by 'Owkey'
-    text = re.sub(r'\bok\b', '"Okhey"', text, flags=re.IGNORECASE)
-    # Replace parentheses with double quotes
-    text = re.sub(r'\(([^)]+)\)', r'"\1"', text)
-    # Escape special characters in the punctuation list for regex
-    pattern = '|'.join(map(re.escape, punctuation_split))
-    # Reduce multiple consecutive punctuations
-    text = re.sub(rf'(\s*({pattern})\s*)+', r'\2 ', text).strip()
-    if tts_engine == XTTSv2:
-        # Pattern 1: Add a space between UTF-8 characters and numbers
-        text = re.sub(r'(?<=[\p{L}])(?=\d)|(?<=\d)(?=[\p{L}])', ' ', text)
-    if tts_engine == XTTSv2:
-        pattern_space = re.escape(''.join(punctuation_list))
-        # Ensure space before and after punctuation (excluding `,` and `.`)
-        punctuation_pattern_space = r'\s*([{}])\s*'.format(pattern_space.replace(',', '').replace('.', ''))
-        text = re.sub(punctuation_pattern_space, r' \1 ', text)
-        # Ensure spaces before & after `,` and `.` ONLY when NOT between numbers
-        comma_dot_pattern = r'(?<!\d)\s*(\.{3}|[,.])\s*(?!\d)'
-        text = re.sub(comma_dot_pattern, r' \1 ', text)
-    # Replace special chars with words
-    specialchars = specialchars_mapping[lang] if lang in specialchars_mapping else specialchars_mapping["eng"]
-    for char, word in specialchars.items():
-        text = text.replace(char, f" {word} ")
-    for char in specialchars_remove:
-        text = text.replace(char, ' ')
-    text = ' '.join(text.split())
-    if text.strip():
-        # Add punctuation after numbers or Roman numerals at start of a chapter.
-        roman_pattern = r'^(?=[IVXLCDM])((?:M{0,3})(?:CM|CD|D?C{0,3})?(?:XC|XL|L?X{0,3})?(?:IX|IV|V?I{0,3}))(?=\s|$)'
-        arabic_pattern = r'^(\d+)(?=\s|$)'
-        if re.match(roman_pattern, text, re.IGNORECASE) or re.match(arabic_pattern, text):
-            # Add punctuation if not already present (e.g. "II", "4")
-            if not re.match(r'^([IVXLCDM\d]+)[\.,:;]', text, re.IGNORECASE):
-                text = re.sub(r'^([IVXLCDM\d]+)', r'\1' + ' — ', text, flags=re.IGNORECASE)
-        # Replace math symbols with words
-        text = math2word(text, lang, lang_iso1, tts_engine)
-    return text
+    return get_text_normalizer(lang, lang_iso1, tts_engine).normalize(text)
 
 def convert2epub(session):
     if session['cancellation_requested']:
         print('Cancel requested')
         return False
     try:
-        util_app = shutil.which('ebook-convert')
-        if not util_app:
-            error = "The 'ebook-convert' utility is not installed or not found."
-            print(error)
-            return False
         file_input = session['ebook']
         file_ext = os.path.splitext(file_input)[1].lower()
         if file_ext not in ebook_formats:
             error = f'Unsupported file format: {file_ext}'
             print(error)
             return False
+        if file_ext == '.epub' and native_epub:
+            if is_valid_epub(file_input):
+                msg = 'File input is a valid EPUB, Calibre conversion skipped'
+                print(msg)
+                shutil.copyfile(file_input, session['epub_path'])
+                return True
+            msg = 'File input is not a valid EPUB for ebooklib, converting it with Calibre...'
+            print(msg)
+        util_app = shutil.which('ebook-convert')
+        if not util_app:
+            error = "The 'ebook-convert' utility is not installed or not found."
+            print(error)
+            return False
         if file_ext == '.pdf':
             msg = 'File input is a PDF. flatten it in MD and HTML...'
             print(msg)
@@ -512,26 +432,46 @@ def convert2epub(session):
                 html_file.write(markdown_text)
         msg = f"Running command: {util_app} {file_input} {session['epub_path']}"
         print(msg)
-        result = subprocess.run(
-            [
-                util_app, file_input, session['epub_path'],
-                '--input-encoding=utf-8',
-                '--output-profile=generic_eink',
-                '--epub-version=3',
-                '--flow-size=0',
-                '--chapter-mark=pagebreak',
-                '--page-breaks-before', "//*[name()='h1' or name()='h2']",
-                '--disable-font-rescaling',
-                '--pretty-print',
-                '--smarten-punctuation',
-                '--verbose'
-            ],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True,
-            encoding='utf-8'
-        )
-        print(result.stdout)
+        calibre_cmd = [
+            util_app, file_input, session['epub_path'],
+            '--input-encoding=utf-8',
+            '--output-profile=generic_eink',
+            '--epub-version=3',
+            '--flow-size=0',
+            '--chapter-mark=pagebreak',
+            '--page-breaks-before', "//*[name()='h1' or name()='h2']",
+            '--disable-font-rescaling',
+            '--pretty-print',
+            '--smarten-punctuation',
+            '--verbose'
+        ]
+        if calibre_stream_output:
+            # Print the Calibre log as it comes instead of holding it in memory
+            process = subprocess.Popen(
+                calibre_cmd,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
+                text=True,
+                encoding='utf-8',
+                errors='ignore'
+            )
+            for line in process.stdout:
+                print(line, end='')
+            returncode = process.wait()
+        else:
+            result = subprocess.run(
+                calibre_cmd,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                text=True,
+                encoding='utf-8'
+            )
+            print(result.stdout)
+            returncode = result.returncode
+        if returncode != 0:
+            error = f'ebook-convert failed with exit code {returncode}'
+            print(error)
+            return False
         return True
     except subprocess.CalledProcessError as e:
         print(f"Subprocess error: {e.stderr}")
@@ -542,6 +482,14 @@ def convert2epub(session):
         DependencyError(e)
         return False
 
+def is_valid_epub(file_input):
+    # The EPUB can be used as is if ebooklib can read it and it has a readable spine
+    try:
+        epubBook = epub.read_epub(file_input, {'ignore_ncx': True})
+        return len(get_spine_docs(epubBook)) > 0
+    except Exception as e:
+        return False
+
 def get_ebook_title(epubBook, all_docs):
     # 1. Try metadata (official EPUB title)
     meta_title = epubBook.get_metadata("DC", "title")
@@ -550,6 +498,11 @@ def get_ebook_title(epubBook, all_docs):
     # 2. Try <title> in the head of the first XHTML document
     if all_docs:
         html = all_docs[0].get_content().decode("utf-8")
+        if html_parser == 'lxml':
+            try:
+                return get_ebook_title_lxml(html)
+            except Exception as e:
+                pass
         soup = BeautifulSoup(html, "html.parser")
         title_tag = soup.select_one("head > title")
         if title_tag and title_tag.text.strip():
@@ -562,6 +515,46 @@ def get_ebook_title(epubBook, all_docs):
                 return alt
     return None
 
+def parse_html_lxml(html):
+    # Spine documents are XHTML, and the XML parser keeps their nesting as
+    # written like BeautifulSoup html.parser does, where the lxml HTML parser
+    # moves blocks out of <p> or <h*> and their text is lost. The parser is
+    # strict: a document that is not well formed (unquoted attributes, bare &,
+    # unknown entities, unclosed tags) raises etree.XMLSyntaxError and the
+    # caller parses it with BeautifulSoup instead, as the recovery mode of
+    # libxml2 silently drops or garbles that markup. CDATA sections are
+    # merged into the text around them, so they go to BeautifulSoup too.
+    # lxml parsers are not thread safe, and the explicit encoding makes lxml
+    # ignore the <?xml encoding=...?> declaration of the decoded document
+    if '<![CDATA[' in html:
+        error = 'CDATA section'
+        raise etree.XMLSyntaxError(error, None, 0, 0)
+    data = re.sub(r'&([A-Za-z][A-Za-z0-9]*);', lambda m: html_entities.get(m.group(1), m.group(0)), html).encode('utf-8')
+    parser = etree.XMLParser(encoding='utf-8', no_network=True, huge_tree=True)
+    root = etree.fromstring(data, parser=parser)
+    # Plain lowercase tag names as in BeautifulSoup
+    for element in root.iter(etree.Element):
+        element.tag = etree.QName(element).localname.lower()
+    return root
+
+def get_epub_type_lxml(element):
+    # epub:type is namespaced in XHTML, a plain attribute without the namespace declaration
+    return (element.get(f'{{{epub_ops_namespace}}}type') or element.get('epub:type') or '').lower()
+
+def get_ebook_title_lxml(html):
+    root = parse_html_lxml(html)
+    title_tag = root.find('head/title')
+    if title_tag is not None:
+        title = ''.join(title_tag.itertext()).strip()
+        if title:
+            return title
+    img = root.find('.//img[@alt]')
+    if img is not None:
+        alt = img.get('alt').strip()
+        if alt and "cover" not in alt.lower():
+            return alt
+    return None
+
 def get_cover(epubBook, session):
     try:
         if session['cancellation_requested']:
@@ -586,6 +579,104 @@ def get_cover(epubBook, session):
         DependencyError(e)
         return False
 
+def get_spine_docs(epubBook):
+    # Get spine item IDs
+    spine_ids = {item[0] for item in epubBook.spine}
+    # Filter only spine documents (i.e., reading order)
+    return [
+        item for item in epubBook.get_items_of_type(ebooklib.ITEM_DOCUMENT)
+        if item.id in spine_ids
+    ]
+
+def get_chapters_batch(all_docs, session):
+    # Serial parsing of a whole book, the texts of all its documents are
+    # segmented in one call (see get_sentences_batch)
+    texts = []
+    for doc in all_docs:
+        if session['cancellation_requested']:
+            return None
+        try:
+            text = get_chapter_text(doc.get_content(), session['language'])
+        except Exception as e:
+            DependencyError(e)
+            text = None
+        if text is not None:
+            texts.append(text)
+    chapters = filter_texts(texts, session['language'], session['language_iso1'], session['tts_engine'])
+    return [sentences_array for sentences_array in chapters if sentences_array is not None]
+
+def iter_chapters(all_docs, session):
+    # Yields the sentences of each document one by one, stops silently on cancellation
+    parse_workers = min(int(session['parse_workers'] or 1), len(all_docs))
+    if parse_workers > 1:
+        msg = f'Parsing {len(all_docs)} blocks with {parse_workers} workers...'
+        print(msg)
+        # Spawned, not forked: this runs in the streaming producer thread while
+        # torch (and CUDA) are already initialized in this process
+        with ProcessPoolExecutor(max_workers=parse_workers, mp_context=get_context('spawn')) as executor:
+            futures = [
+                executor.submit(filter_chapter_html, doc.get_content(), session['language'], session['language_iso1'], session['tts_engine'])
+                for doc in all_docs
+            ]
+            try:
+                # Results are collected in document order whatever order workers finish
+                for future in futures:
+                    if session['cancellation_requested']:
+                        return
+                    sentences_array = future.result()
+                    if sentences_array is not None:
+                        yield sentences_array
+            finally:
+                for f in futures:
+                    f.cancel()
+    else:
+        for doc in all_docs:
+            if session['cancellation_requested']:
+                return
+            sentences_array = filter_chapter(doc, session['language'], session['language_iso1'], session['tts_engine'])
+            if sentences_array is not None:
+                yield sentences_array
+
+def stream_chapters(chapters_iter):
+    # Runs the chapters_iter parsing generator in a producer thread while the caller
+    # consumes the blocks. Only streaming_queue_size blocks are held in memory at once.
+    chapters_queue = Queue(maxsize=streaming_queue_size)
+    stop_event = threading.Event()
+    errors = []
+
+    def put(item):
+        while not stop_event.is_set():
+            try:
+                chapters_queue.put(item, timeout=0.5)
+                return True
+            except Full:
+                continue
+        return False
+
+    def producer():
+        try:
+            for sentences_array in chapters_iter:
+                if not put(sentences_array):
+                    return
+        except Exception as e:
+            errors.append(e)
+        finally:
+            put(None)
+
+    thread = threading.Thread(target=producer, daemon=True)
+    thread.start()
+    try:
+        while True:
+            sentences_array = chapters_queue.get()
+            if sentences_array is None:
+                break
+            yield sentences_array
+        if errors:
+            raise errors[0]
+    finally:
+        stop_event.set()
+        thread.join()
+
 def get_chapters(epubBook, session):
     try:
         msg = r'''
@@ -610,21 +701,17 @@ YOU CAN IMPROVE IT OR ASK TO A TRAINING MODEL EXPERT.
         except Exception as toc_error:
             error = f"Error extracting TOC: {toc_error}"
             print(error)
-        # Get spine item IDs
-        spine_ids = [item[0] for item in epubBook.spine]
-        # Filter only spine documents (i.e., reading order)
-        all_docs = [
-            item for item in epubBook.get_items_of_type(ebooklib.ITEM_DOCUMENT)
-            if item.id in spine_ids
-        ]
+        all_docs = get_spine_docs(epubBook)
         if not all_docs:
             return [], []
         title = get_ebook_title(epubBook, all_docs)
-        chapters = []
-        for doc in all_docs:
-            sentences_array = filter_chapter(doc, session['language'], session['language_iso1'], session['tts_engine'])
-            if sentences_array is not None:
-                chapters.append(sentences_array)
+        if int(session['parse_workers'] or 1) > 1:
+            chapters = list(iter_chapters(all_docs, session))
+        else:
+            chapters = get_chapters_batch(all_docs, session)
+        if session['cancellation_requested']:
+            print('Cancel requested')
+            return None, None
         #if title:
         #    if chapters[0]:
         #        chapters[0][0] =  f' — "{title}" . {chapters[0][0]}'
@@ -634,78 +721,240 @@ YOU CAN IMPROVE IT OR ASK TO A TRAINING MODEL EXPERT.
         DependencyError(error)
         return None, None
 
-def filter_chapter(doc, lang, lang_iso1, tts_engine):
+def get_parse_cache_key(session):
+    # Every setting changing the parsed sentences must be part of the key
+    return parse_cache.get_key(
+        session['ebook_hash'], session['language'], session['tts_engine'], TextNormalizer.version,
+        html_parser, native_epub, native_pdf, pdf_pages_per_block
+    )
+
+def get_cached_cover(parse_cache_key, session):
     try:
-        chapter_sentences = None
-        raw_html = doc.get_body_content().decode("utf-8")
-        soup = BeautifulSoup(raw_html, 'html.parser')
+        if session['cancellation_requested']:
+            print('Cancel requested')
+            return False
+        cover_path = os.path.join(session['process_dir'], session['filename_noext'] + '.jpg')
+        return parse_cache.restore_cover(parse_cache_key, cover_path) or True
+    except Exception as e:
+        DependencyError(e)
+        return False
+
+def get_pdf_extractor(session):
+    try:
+        msg = 'File input is a PDF, extracting its pages directly...'
+        print(msg)
+        return PdfExtractor(session['ebook'], pages_per_block=pdf_pages_per_block, workers=int(session['parse_workers'] or 1))
+    except Exception as e:
+        DependencyError(e)
+        return None
 
-        if not soup.body or not soup.body.get_text(strip=True):
+def get_pdf_cover(pdf_extractor, session):
+    try:
+        if session['cancellation_requested']:
+            print('Cancel requested')
+            return False
+        cover_path = os.path.join(session['process_dir'], session['filename_noext'] + '.jpg')
+        # The first page is used as cover like Calibre does
+        return pdf_extractor.save_cover(cover_path) or True
+    except Exception as e:
+        DependencyError(e)
+        return False
+
+def iter_pdf_chapters(pdf_extractor, session):
+    # Yields the sentences of each block of pages, stops silently on cancellation
+    for text in pdf_extractor.iter_blocks_text(lambda: session['cancellation_requested']):
+        sentences_array = filter_text(text, session['language'], session['language_iso1'], session['tts_engine'])
+        if sentences_array is not None:
+            yield sentences_array
+
+def get_pdf_chapters(pdf_extractor, session):
+    try:
+        chapters = list(iter_pdf_chapters(pdf_extractor, session))
+        if session['cancellation_requested']:
+            print('Cancel requested')
             return None
- 
-        # Get epub:type from <body> or outermost <section>
-        epub_type = soup.body.get("epub:type", "").lower()
-        if not epub_type:
-            section_tag = soup.find("section")
-            if section_tag and section_tag.get("epub:type"):
-                epub_type = section_tag.get("epub:type").lower()
-
-        # Skip known non-chapter types
-        excluded_types = {
-            "frontmatter", "backmatter", "toc", "titlepage", "colophon",
-            "acknowledgments", "dedication", "glossary", "index",
-            "appendix", "bibliography", "copyright-page", "landmark"
-        }
-        if any(part in epub_type for part in excluded_types):
+        return chapters
+    except Exception as e:
+        error = f'Error extracting PDF pages: {e}'
+        DependencyError(error)
+        return None
+
+def filter_chapter(doc, lang, lang_iso1, tts_engine):
+    return filter_chapter_html(doc.get_content(), lang, lang_iso1, tts_engine)
+
+def get_chapter_text(content, lang):
+    # Takes the raw document bytes so it can run in a parse worker process.
+    # The whole document is used since get_body_content() drops the <body>
+    # tag when it has no attributes, which is common outside of Calibre output.
+    text_array = get_text_array(content.decode("utf-8"), lang)
+    if text_array is None:
+        return None
+    return "\n".join(text_array)
+
+def filter_chapter_html(content, lang, lang_iso1, tts_engine):
+    try:
+        text = get_chapter_text(content, lang)
+        if text is None:
             return None
-        
-        for script in soup(["script", "style"]):
-            script.decompose()
-
-        text_array = []
-        handled_tables = set()
-        for tag in soup.find_all(["h1", "h2", "h3", "h4", "h5", "h6", "p", "table"]):
-            if tag.name == "table":
-                # Ensure we don't process the same table multiple times
-                if tag in handled_tables:
-                    continue
-                handled_tables.add(tag)
-                rows = tag.find_all("tr")
-                if not rows:
-                    continue
-                header_cells = [td.get_text(strip=True) for td in rows[0].find_all(["td", "th"])]
-                for row in rows[1:]:
-                    cells = [td.get_text(strip=True).replace('\xa0', ' ') for td in row.find_all("td")]
-                    if len(cells) == len(header_cells):
-                        line = " — ".join(f"{header}: {cell}" for header, cell in zip(header_cells, cells))
-                    else:
-                        line = " — ".join(cells)
-                    if line:
-                        text_array.append(line)
-            elif tag.name == "p" and tag.find_parent("table"):
-                continue  # Already handled in the <table> section
-            elif tag.name in ["h1", "h2", "h3", "h4", "h5", "h6"]:
-                raw_text = tag.get_text(strip=True)
-                if raw_text:
-                    # replace roman numbers by digits
-                    raw_text = replace_roman_numbers(raw_text, lang)
-                    text_array.append(f'— "{raw_text}". ‡pause‡')
-            else:
-                raw_text = tag.get_text(strip=True)
-                if raw_text:
-                    text_array.append(raw_text)
-        text = "\n".join(text_array)
-        if text.strip():
-            # Normalize lines and remove unnecessary spaces and switch special chars
-            text = normalize_text(text, lang, lang_iso1, tts_engine)
-            if text.strip() and len(text.strip()) > 1:
-                chapter_sentences = get_sentences(text, lang)
-        return chapter_sentences
+        return filter_text(text, lang, lang_iso1, tts_engine)
     except Exception as e:
         DependencyError(e)
         return None
 
-def get_sentences(text, lang):
+def filter_text(text, lang, lang_iso1, tts_engine):
+    chapter_sentences = None
+    if text.strip():
+        # Normalize lines and remove unnecessary spaces and switch special chars
+        text = normalize_text(text, lang, lang_iso1, tts_engine)
+        if text.strip() and len(text.strip()) > 1:
+            chapter_sentences = get_sentences(text, lang)
+    return chapter_sentences
+
+def filter_texts(texts, lang, lang_iso1, tts_engine):
+    # Same as filter_text() on every text, segmented in one get_sentences_batch() call
+    normalized = []
+    for text in texts:
+        if text.strip():
+            text = normalize_text(text, lang, lang_iso1, tts_engine)
+        normalized.append(text if text.strip() and len(text.strip()) > 1 else None)
+    sentences = iter(get_sentences_batch([text for text in normalized if text is not None], lang))
+    return [next(sentences) if text is not None else None for text in normalized]
+
+def get_text_array(raw_html, lang):
+    if html_parser == 'lxml':
+        try:
+            return get_text_array_lxml(raw_html, lang)
+        except Exception as e:
+            # Not well formed XHTML (see parse_html_lxml()), parsed with BeautifulSoup
+            pass
+    return get_text_array_bs4(raw_html, lang)
+
+def get_text_array_bs4(raw_html, lang):
+    soup = BeautifulSoup(raw_html, 'html.parser')
+
+    if not soup.body or not soup.body.get_text(strip=True):
+        return None
+
+    # Get epub:type from <body> or outermost <section>
+    epub_type = soup.body.get("epub:type", "").lower()
+    if not epub_type:
+        section_tag = soup.find("section")
+        if section_tag and section_tag.get("epub:type"):
+            epub_type = section_tag.get("epub:type").lower()
+
+    # Skip known non-chapter types
+    if any(part in epub_type for part in excluded_epub_types):
+        return None
+
+    for script in soup(["script", "style"]):
+        script.decompose()
+
+    text_array = []
+    handled_tables = set()
+    for tag in soup.find_all(["h1", "h2", "h3", "h4", "h5", "h6", "p", "table"]):
+        if tag.name == "table":
+            # Ensure we don't process the same table multiple times
+            if tag in handled_tables:
+                continue
+            handled_tables.add(tag)
+            rows = tag.find_all("tr")
+            if not rows:
+                continue
+            header_cells = [td.get_text(strip=True) for td in rows[0].find_all(["td", "th"])]
+            for row in rows[1:]:
+                cells = [td.get_text(strip=True).replace('\xa0', ' ') for td in row.find_all("td")]
+                if len(cells) == len(header_cells):
+                    line = " — ".join(f"{header}: {cell}" for header, cell in zip(header_cells, cells))
+                else:
+                    line = " — ".join(cells)
+                if line:
+                    text_array.append(line)
+        elif tag.name == "p" and tag.find_parent("table"):
+            continue  # Already handled in the <table> section
+        elif tag.name in ["h1", "h2", "h3", "h4", "h5", "h6"]:
+            raw_text = tag.get_text(strip=True)
+            if raw_text:
+                # replace roman numbers by digits
+                raw_text = replace_roman_numbers(raw_text, lang)
+                text_array.append(f'— "{raw_text}". ‡pause‡')
+        else:
+            raw_text = tag.get_text(strip=True)
+            if raw_text:
+                text_array.append(raw_text)
+    return text_array
+
+def iter_strings_lxml(element):
+    # The strings of BeautifulSoup: each text and tail is its own string, and
+    # the text of comments, processing instructions, scripts and styles is left out
+    if isinstance(element.tag, str) and element.tag not in ("script", "style"):
+        if element.text:
+            yield element.text
+        for child in element:
+            yield from iter_strings_lxml(child)
+            if child.tail:
+                yield child.tail
+
+def get_text_lxml(element):
+    # Same as BeautifulSoup get_text(strip=True)
+    return ''.join(text.strip() for text in iter_strings_lxml(element))
+
+def get_text_array_lxml(raw_html, lang):
+    # Same output as get_text_array_bs4() in one walk of the lxml tree
+    if not re.search(r'<body[\s/>]', raw_html, flags=re.IGNORECASE):
+        return None
+    root = parse_html_lxml(raw_html)
+    body = root.find('body')
+    if body is None or not get_text_lxml(body):
+        return None
+
+    # Get epub:type from <body> or outermost <section>
+    epub_type = get_epub_type_lxml(body)
+    if not epub_type:
+        section_tag = root.find(".//section")
+        if section_tag is not None:
+            epub_type = get_epub_type_lxml(section_tag)
+
+    # Skip known non-chapter types
+    if any(part in epub_type for part in excluded_epub_types):
+        return None
+
+    text_array = []
+    table_depth = 0
+    for event, tag in etree.iterwalk(root, events=("start", "end")):
+        if tag.tag == "table":
+            if event == "end":
+                table_depth -= 1
+                continue
+            table_depth += 1
+            rows = list(tag.iter("tr"))
+            if not rows:
+                continue
+            header_cells = [get_text_lxml(td) for td in rows[0].iter("td", "th")]
+            for row in rows[1:]:
+                cells = [get_text_lxml(td).replace('\xa0', ' ') for td in row.iter("td")]
+                if len(cells) == len(header_cells):
+                    line = " — ".join(f"{header}: {cell}" for header, cell in zip(header_cells, cells))
+                else:
+                    line = " — ".join(cells)
+                if line:
+                    text_array.append(line)
+        elif event == "end":
+            continue
+        elif tag.tag == "p":
+            if table_depth:
+                continue  # Already handled in the <table> section
+            raw_text = get_text_lxml(tag)
+            if raw_text:
+                text_array.append(raw_text)
+        elif tag.tag in heading_tags:
+            raw_text = get_text_lxml(tag)
+            if raw_text:
+                # replace roman numbers by digits
+                raw_text = replace_roman_numbers(raw_text, lang)
+                text_array.append(f'— "{raw_text}". ‡pause‡')
+    return text_array
+
+def get_sentences(text, lang, ideogramm_list=None):
     def combine_punctuation(tokens):
         if not tokens:
             return tokens
@@ -721,26 +970,6 @@ def get_sentences(text, lang):
                 result.append(token)
         return result
 
-    def segment_ideogramms(text):
-        if lang == 'zho':
-            import jieba
-            return list(jieba.cut(text))
-        elif lang == 'jpn':
-            import MeCab
-            mecab = MeCab.Tagger()
-            return mecab.parse(text).split()
-        elif lang == 'kor':
-            from konlpy.tag import Kkma
-            kkma = Kkma()
-            return kkma.morphs(text)
-        elif lang in ['tha', 'lao', 'mya', 'khm']:
-            from pythainlp.tokenize import word_tokenize
-            return word_tokenize(text, engine='newmm')
-        else:
-            pattern_split = [re.escape(p) for p in punctuation_split_set]
-            pattern = f"({'|'.join(pattern_split)})"
-            return re.split(pattern, text)
-
     def join_ideogramms(idg_list):
         buffer = ''
         for token in idg_list:
@@ -764,67 +993,12 @@ def get_sentences(text, lang):
         if buffer.strip() and not all(c in punctuation_split_set for c in buffer):
             yield buffer
 
-    def find_best_split_point_prioritize_punct(sentence, max_chars):
-        best_index = -1
-        min_diff = float('inf')
-        punctuation_priority = '.!?,;:'
-        space_priority = ' '
-        for i in range(1, min(len(sentence), max_chars)):
-            if sentence[i] in punctuation_priority:
-                left_len = i
-                right_len = len(sentence) - i
-                diff = abs(left_len - right_len)
-                if left_len <= max_chars and right_len <= max_chars and diff < min_diff:
-                    best_index = i + 1
-                    min_diff = diff
-        if best_index == -1:
-            for i in range(1, min(len(sentence), max_chars)):
-                if sentence[i] in space_priority:
-                    left_len = i
-                    right_len = len(sentence) - i
-                    diff = abs(left_len - right_len)
-                    if left_len <= max_chars and right_len <= max_chars and diff < min_diff:
-                        best_index = i + 1
-                        min_diff = diff
-        return best_index
-
-    def split_sentence(sentence):
-        sentence = sentence.strip()
-        if len(sentence) <= max_chars:
-            if lang not in ['zho', 'jpn', 'kor', 'tha', 'lao', 'mya', 'khm']:
-                if sentence and sentence[-1].isalpha():
-                    return [sentence + ' -']
-            return [sentence]
-        split_index = find_best_split_point_prioritize_punct(sentence, max_chars)
-        if split_index == -1:
-            split_index = len(sentence) // 2
-        delim_used = sentence[split_index - 1] if split_index > 0 else None
-        end = ''
-        if lang not in ['zho', 'jpn', 'kor', 'tha', 'lao', 'mya', 'khm']:
-            end = ' -' if delim_used == ' ' else end
-        part1 = sentence[:split_index].rstrip()
-        part2 = sentence[split_index:].lstrip(' ,;:')
-        result = []
-        if len(part1) <= max_chars:
-            if part1 and part1[-1].isalpha():
-                part1 += end
-            result.append(part1)
-        else:
-            result.extend(split_sentence(part1))
-        if part2:
-            if len(part2) <= max_chars:
-                if part2 and part2[-1].isalpha():
-                    part2 += ' -'
-                result.append(part2)
-            else:
-                result.extend(split_sentence(part2))
-        return result
-
     max_chars = language_mapping[lang]['max_chars'] - 2
     pattern_split = [re.escape(p) for p in punctuation_split_set]
     pattern = f"({'|'.join(pattern_split)})"
     if lang in ['zho', 'jpn', 'kor', 'tha', 'lao', 'mya', 'khm']:
-        ideogramm_list = segment_ideogramms(text)
+        if ideogramm_list is None:
+            ideogramm_list = ideogramm_segmenter.segment(text, lang)
         raw_list = list(join_ideogramms(ideogramm_list))
     else:
         raw_list = re.split(pattern, text)
@@ -838,10 +1012,18 @@ def get_sentences(text, lang):
     if tmp_list and tmp_list[-1] == 'Start':
         tmp_list.pop()
     sentences = []
+    chunker = SentenceChunker(max_chars, lang)
     for sentence in tmp_list:
-        sentences.extend(split_sentence(sentence.strip()))
+        sentences.extend(chunker.split(sentence.strip()))
     return sentences
 
+def get_sentences_batch(texts, lang):
+    # Segments all the chapters of a book with one segmenter call
+    if lang in ideogramm_segmenter.languages:
+        ideogramm_lists = ideogramm_segmenter.segment_batch(texts, lang)
+        return [get_sentences(text, lang, ideogramm_list) for text, ideogramm_list in zip(texts, ideogramm_lists)]
+    return [get_sentences(text, lang) for text in texts]
+
 import psutil
 
 def get_ram():
@@ -917,62 +1099,85 @@ def get_sanitized(str, replacement="_"):
     sanitized = sanitized.strip("_")
     return sanitized
 
-def convert_chapters2audio(session):
+def get_conversion_journal(session):
+    # Blocks and sentences already converted by a previous run
+    journal = ConversionJournal(
+        os.path.join(session['chapters_dir'], 'journal.jsonl'),
+        session['chapters_dir_sentences'],
+        session['chapters_dir'],
+        default_audio_proc_format,
+        block_audio_format,
+        resume_verify_checksums
+    ).load()
+    if journal.chapters:
+        msg = f'Resuming from block {max(journal.chapters)}'
+        print(msg)
+    if journal.sentences:
+        msg = f'Resuming from sentence {max(journal.sentences)}'
+        print(msg)
+    return journal
+
+def convert_chapters2audio(session, chapters=None):
+    journal = None
+    subtitles = None
     try:
         if session['cancellation_requested']:
             print('Cancel requested')
             return False
+        if (session.get('tts_workers') or 1) > 1:
+            return convert_chapters2audio_sharded(session, chapters)
         progress_bar = None
         if is_gui_process:
             progress_bar = gr.Progress(track_tqdm=True)        
         tts_manager = TTSManager(session)
         if not tts_manager.active:
-            error = f"TTS engine {session['tts_engine']} could not be loaded!\nPossible reason can be not enough VRAM/RAM memory.\nTry to lower max_tts_in_memory in ./lib/models.py"
+            error = f"TTS engine {session['tts_engine']} could not be loaded!\nPossible reason can be not enough VRAM/RAM memory.\nTry to lower max_tts_memory or max_tts_in_memory in ./lib/models.py"
             print(error)
             return False
-        resume_chapter = 0
-        missing_chapters = []
-        resume_sentence = 0
-        missing_sentences = []
-        existing_chapters = sorted(
-            [f for f in os.listdir(session['chapters_dir']) if f.endswith(f'.{default_audio_proc_format}')],
-            key=lambda x: int(re.search(r'\d+', x).group())
-        )
-        if existing_chapters:
-            resume_chapter = max(int(re.search(r'\d+', f).group()) for f in existing_chapters) 
-            msg = f'Resuming from block {resume_chapter}'
-            print(msg)
-            existing_chapter_numbers = {int(re.search(r'\d+', f).group()) for f in existing_chapters}
-            missing_chapters = [
-                i for i in range(1, resume_chapter) if i not in existing_chapter_numbers
-            ]
-            if resume_chapter not in missing_chapters:
-                missing_chapters.append(resume_chapter)
-        existing_sentences = sorted(
-            [f for f in os.listdir(session['chapters_dir_sentences']) if f.endswith(f'.{default_audio_proc_format}')],
-            key=lambda x: int(re.search(r'\d+', x).group())
-        )
-        if existing_sentences:
-            resume_sentence = max(int(re.search(r'\d+', f).group()) for f in existing_sentences)
-            msg = f"Resuming from sentence {resume_sentence}"
-            print(msg)
-            existing_sentence_numbers = {int(re.search(r'\d+', f).group()) for f in existing_sentences}
-            missing_sentences = [
-                i for i in range(1, resume_sentence) if i not in existing_sentence_numbers
-            ]
-            if resume_sentence not in missing_sentences:
-                missing_sentences.append(resume_sentence)
-        total_chapters = len(session['chapters'])
-        total_sentences = sum(len(array) for array in session['chapters'])
+        journal = get_conversion_journal(session)
+        resume_chapter = max(journal.chapters, default=0)
+        resume_sentence = max(journal.sentences, default=0)
+        # The engine appends the cue of each sentence it saves
+        subtitles = SubtitleWriter(session['final_name'], subtitle_formats, journal)
+        tts_manager.tts.subtitles = subtitles
+        if chapters is None:
+            chapters = session['chapters']
+        # Streamed blocks (see stream_chapters()) have no known total until parsing ends
+        total_sentences = sum(len(array) for array in chapters) if hasattr(chapters, '__len__') else None
         sentence_number = 0
-        with tqdm(total=total_sentences, desc='conversion 0.00%', bar_format='{desc}: {n_fmt}/{total_fmt} ', unit='step', initial=resume_sentence) as t:
-            msg = f'A total of {total_chapters} blocks and {total_sentences} sentences...'
-            for x in range(0, total_chapters):
+        tts_batch_size = max(1, session.get('tts_batch_size') or 1)
+
+        def convert_pending(pending, chapter_num, t):
+            # Sentences waiting for conversion are sent to the engine together
+            if not pending:
+                return True
+            if len(pending) == 1:
+                success = tts_manager.convert_sentence2audio(*pending[0])
+            else:
+                success = tts_manager.convert_sentences2audio([n for n, s in pending], [s for n, s in pending])
+            if not success:
+                return False
+            for pending_number, pending_sentence in pending:
+                journal.record_sentence(pending_number)
+                if total_sentences:
+                    percentage = (pending_number / total_sentences) * 100
+                    t.set_description(f'Converting {percentage:.2f}%')
+                else:
+                    t.set_description(f'Converting block {chapter_num}')
+                msg = f"\nSentence: {pending_sentence}"
+                print(msg)
+                t.update(1)
+            pending.clear()
+            return True
+
+        with tqdm(total=total_sentences, desc='conversion 0.00%', bar_format='{desc}: {n_fmt}/{total_fmt} ', unit='step', initial=len(journal.sentences)) as t:
+            for x, sentences in enumerate(chapters):
                 chapter_num = x + 1
-                chapter_audio_file = f'chapter_{chapter_num}.{default_audio_proc_format}'
-                sentences = session['chapters'][x]
+                chapter_audio_file = f'chapter_{chapter_num}.{block_audio_format}'
                 sentences_count = len(sentences)
                 start = sentence_number
+                pending = []
+                block_converted = False
                 msg = f'Block {chapter_num} containing {sentences_count} sentences...'
                 print(msg)
                 for i, sentence in enumerate(sentences):
@@ -980,31 +1185,30 @@ def convert_chapters2audio(session):
                         msg = 'Cancel requested'
                         print(msg)
                         return False
-                    if sentence_number in missing_sentences or sentence_number > resume_sentence or (sentence_number == 0 and resume_sentence == 0):
-                        if sentence_number <= resume_sentence and sentence_number > 0:
+                    if not journal.has_sentence(sentence_number):
+                        if sentence_number < resume_sentence:
                             msg = f'**Recovering missing file sentence {sentence_number}'
                             print(msg)
-                        if tts_manager.convert_sentence2audio(sentence_number, sentence):                           
-                            percentage = (sentence_number / total_sentences) * 100
-                            t.set_description(f'Converting {percentage:.2f}%')
-                            msg = f"\nSentence: {sentence}"
-                            print(msg)
-                        else:
+                        pending.append((sentence_number, sentence))
+                        block_converted = True
+                        if len(pending) >= tts_batch_size and not convert_pending(pending, chapter_num, t):
                             return False
-                        t.update(1)
-                    if progress_bar is not None:
+                    if progress_bar is not None and total_sentences:
                         progress_bar(sentence_number / total_sentences)
                     sentence_number += 1
-                if progress_bar is not None:
+                if not convert_pending(pending, chapter_num, t):
+                    return False
+                if progress_bar is not None and total_sentences:
                     progress_bar(sentence_number / total_sentences)
                 end = sentence_number - 1 if sentence_number > 1 else sentence_number
                 msg = f"End of Block {chapter_num}"
                 print(msg)
-                if chapter_num in missing_chapters or sentence_number > resume_sentence:
-                    if chapter_num <= resume_chapter:
+                if block_converted or not journal.has_chapter(chapter_num):
+                    if chapter_num < resume_chapter:
                         msg = f'**Recovering missing file block {chapter_num}'
                         print(msg)
-                    if combine_audio_sentences(chapter_audio_file, start, end, session):
+                    if combine_audio_sentences(chapter_audio_file, start, end, session, journal):
+                        journal.record_chapter(chapter_num)
                         msg = f'Combining block {chapter_num} to audio, sentence {start} to {end}'
                         print(msg)
                     else:
@@ -1017,18 +1221,157 @@ def convert_chapters2audio(session):
     except Exception as e:
         DependencyError(e)
         return False
+    finally:
+        # The models of this session can be evicted by the next ones
+        mod.loaded_tts.unpin(session['id'])
+        if subtitles is not None:
+            subtitles.close()
+        if journal is not None:
+            journal.close()
+
+def convert_chapters2audio_sharded(session, chapters=None):
+    # Same as convert_chapters2audio() but the sentences are spread over
+    # session['tts_workers'] TTS processes (see TTSWorkerPool). Blocks are
+    # combined as soon as all their sentences exist and the subtitles are
+    # written here, in sentence order.
+    tts_pool = None
+    subtitles = None
+    journal = None
+    try:
+        progress_bar = None
+        if is_gui_process:
+            progress_bar = gr.Progress(track_tqdm=True)
+        journal = get_conversion_journal(session)
+        resume_chapter = max(journal.chapters, default=0)
+        resume_sentence = max(journal.sentences, default=0)
+        if chapters is None:
+            chapters = session['chapters']
+        total_sentences = sum(len(array) for array in chapters) if hasattr(chapters, '__len__') else None
+        tts_batch_size = max(1, session.get('tts_batch_size') or 1)
+        subtitles = SubtitleWriter(session['final_name'], subtitle_formats, journal)
+        msg = f"Starting {session['tts_workers']} TTS workers..."
+        print(msg)
+        tts_pool = TTSWorkerPool(session, session['tts_workers'])
+        blocks = {}
+        sentence_blocks = {}
+        sentences_text = {}
+        vtt_order = deque()
+        converted = set()
+        sentence_number = 0
+
+        def handle_results(results, t):
+            for sentence_numbers, success in results:
+                if not success:
+                    return False
+                for converted_number in sentence_numbers:
+                    # Sentences complete out of order, the percentage follows the count
+                    t.update(1)
+                    if total_sentences:
+                        percentage = (t.n / total_sentences) * 100
+                        t.set_description(f'Converting {percentage:.2f}%')
+                    else:
+                        t.set_description(f'Converting block {sentence_blocks[converted_number]}')
+                    msg = f"\nSentence: {sentences_text[converted_number]}"
+                    print(msg)
+                    journal.record_sentence(converted_number)
+                    converted.add(converted_number)
+                    blocks[sentence_blocks.pop(converted_number)]['outstanding'].discard(converted_number)
+            while vtt_order and vtt_order[0] in converted:
+                converted_number = vtt_order.popleft()
+                converted.remove(converted_number)
+                text = sentences_text.pop(converted_number)
+                text = text[:-1] if text.endswith('-') else text
+                sentence_file = os.path.join(session['chapters_dir_sentences'], f'{converted_number}.{default_audio_proc_format}')
+                info = sf.info(sentence_file)
+                subtitles.append(converted_number, info.frames, info.samplerate, text)
+            for chapter_num in sorted(blocks):
+                block = blocks[chapter_num]
+                if not block['submitted'] or block['outstanding']:
+                    continue
+                del blocks[chapter_num]
+                if block['combine']:
+                    if chapter_num < resume_chapter:
+                        msg = f'**Recovering missing file block {chapter_num}'
+                        print(msg)
+                    chapter_audio_file = f'chapter_{chapter_num}.{block_audio_format}'
+                    if combine_audio_sentences(chapter_audio_file, block['start'], block['end'], session, journal):
+                        journal.record_chapter(chapter_num)
+                        msg = f"Combining block {chapter_num} to audio, sentence {block['start']} to {block['end']}"
+                        print(msg)
+                    else:
+                        msg = 'combine_audio_sentences() failed!'
+                        print(msg)
+                        return False
+            return True
 
-def combine_audio_sentences(chapter_audio_file, start, end, session):
+        with tqdm(total=total_sentences, desc='conversion 0.00%', bar_format='{desc}: {n_fmt}/{total_fmt} ', unit='step', initial=len(journal.sentences)) as t:
+            for x, sentences in enumerate(chapters):
+                chapter_num = x + 1
+                block = {'start': sentence_number, 'end': None, 'outstanding': set(), 'submitted': False, 'combine': False}
+                blocks[chapter_num] = block
+                pending = []
+                msg = f'Block {chapter_num} containing {len(sentences)} sentences...'
+                print(msg)
+                for sentence in sentences:
+                    if session['cancellation_requested']:
+                        msg = 'Cancel requested'
+                        print(msg)
+                        tts_pool.terminate()
+                        return False
+                    if not journal.has_sentence(sentence_number):
+                        if sentence_number < resume_sentence:
+                            msg = f'**Recovering missing file sentence {sentence_number}'
+                            print(msg)
+                        pending.append((sentence_number, sentence))
+                        block['outstanding'].add(sentence_number)
+                        block['combine'] = True
+                        sentence_blocks[sentence_number] = chapter_num
+                        sentences_text[sentence_number] = sentence
+                        vtt_order.append(sentence_number)
+                        if len(pending) >= tts_batch_size:
+                            tts_pool.submit(pending)
+                            pending = []
+                            if not handle_results(tts_pool.poll(), t):
+                                return False
+                    if progress_bar is not None and total_sentences:
+                        progress_bar(sentence_number / total_sentences)
+                    sentence_number += 1
+                if pending:
+                    tts_pool.submit(pending)
+                block['end'] = sentence_number - 1 if sentence_number > 1 else sentence_number
+                block['combine'] = block['combine'] or not journal.has_chapter(chapter_num)
+                block['submitted'] = True
+                msg = f"End of Block {chapter_num}"
+                print(msg)
+                if not handle_results(tts_pool.poll(), t):
+                    return False
+            while tts_pool.pending:
+                if session['cancellation_requested']:
+                    msg = 'Cancel requested'
+                    print(msg)
+                    tts_pool.terminate()
+                    return False
+                if not handle_results(tts_pool.wait(), t):
+                    return False
+            if progress_bar is not None and total_sentences:
+                progress_bar(1.0)
+        return not blocks
+    except Exception as e:
+        DependencyError(e)
+        return False
+    finally:
+        if tts_pool is not None:
+            tts_pool.close()
+        if subtitles is not None:
+            subtitles.close()
+        if journal is not None:
+            journal.close()
+
+def combine_audio_sentences(chapter_audio_file, start, end, session, journal):
     try:
         chapter_audio_file = os.path.join(session['chapters_dir'], chapter_audio_file)
         file_list = os.path.join(session['chapters_dir_sentences'], 'sentences.txt')
-        sentence_files = [f for f in os.listdir(session['chapters_dir_sentences']) if f.endswith(f'.{default_audio_proc_format}')]
-        sentences_dir_ordered = sorted(sentence_files, key=lambda x: int(re.search(r'\d+', x).group()))
-        selected_files = [
-            os.path.join(session['chapters_dir_sentences'], f)
-            for f in sentences_dir_ordered
-            if start <= int(''.join(filter(str.isdigit, os.path.basename(f)))) <= end
-        ]
+        selected_files = journal.get_sentence_files(start, end)
         if not selected_files:
             error = 'No audio files found in the specified range.'
             print(error)
@@ -1037,9 +1380,14 @@ def combine_audio_sentences(chapter_audio_file, start, end, session):
             for file in selected_files:
                 file = file.replace("\\", "/")
                 f.write(f'file {file}\n')
+        if lossless_assembly:
+            # Decoded only, the block keeps the sample format of the sentences
+            audio_codec = pcm_codecs.get(sf.info(selected_files[0]).subtype, 'pcm_s16le')
+        else:
+            audio_codec = default_audio_proc_format
         ffmpeg_cmd = [
             shutil.which('ffmpeg'), '-hide_banner', '-nostats', '-y', '-safe', '0', '-f', 'concat', '-i', file_list,
-            '-c:a', default_audio_proc_format, '-map_metadata', '-1', chapter_audio_file
+            '-c:a', audio_codec, '-map_metadata', '-1', chapter_audio_file
         ]
         try:
             process = subprocess.Popen(
@@ -1069,6 +1417,23 @@ def combine_audio_sentences(chapter_audio_file, start, end, session):
         DependencyError(e)
         return False
 
+def get_audio_frames(file_path):
+    # Sample count and rate from the FLAC STREAMINFO or WAV header, without decoding
+    info = sf.info(file_path)
+    frames = info.frames
+    if not 0 < frames < 2**62:
+        # Total left unknown by the encoder, the frames are counted block by block
+        frames = sum(len(block) for block in sf.blocks(file_path, blocksize=1 << 16))
+    return frames, info.samplerate
+
+def get_aac_frames(file_path, frame_size=1024):
+    # Joined by the concat demuxer with -c copy, an aac file plays every packet
+    # in full, its priming and padding included: its length in the book is its
+    # packet count times the frame size, not the duration of its edit list
+    ffmpeg_cmd = [shutil.which('ffmpeg'), '-hide_banner', '-v', 'error', '-i', file_path, '-map', '0:a', '-c', 'copy', '-f', 'framecrc', '-']
+    output = subprocess.run(ffmpeg_cmd, env={}, capture_output=True, text=True, check=True).stdout
+    return sum(1 for line in output.splitlines() if line and not line.startswith('#')) * frame_size
+
 def combine_audio_chapters(session):
     def assemble_segments():
         try:
@@ -1082,6 +1447,11 @@ def combine_audio_chapters(session):
                 for file in chapter_files_ordered:
                     file = file.replace("\\", "/")
                     f.write(f"file '{file}'\n")
+            if lossless_assembly:
+                # The list is read by the export as a single input, no combined file is written
+                msg = f'********* total audio blocks listed in {combined_chapters_file}'
+                print(msg)
+                return True
             ffmpeg_cmd = [
                 shutil.which('ffmpeg'), '-hide_banner', '-nostats', '-y', '-safe', '0', '-f', 'concat', '-i', file_list,
                 '-c:a', default_audio_proc_format, '-map_metadata', '-1', combined_chapters_file
@@ -1114,7 +1484,8 @@ def combine_audio_chapters(session):
             DependencyError(e)
             return False
 
-    def generate_ffmpeg_metadata():
+    def generate_ffmpeg_metadata(file_path, block_durations):
+        # block_durations: length in seconds of each block in the exported audio
         try:
             if session['cancellation_requested']:
                 print('Cancel requested')
@@ -1149,113 +1520,304 @@ def combine_audio_chapters(session):
                 mobi_asin = session['metadata']['identifiers'].get('mobi-asin', None)
                 if mobi_asin:
                     ffmpeg_metadata += f'asin={mobi_asin}\n'  # ASIN                   
+            # Marks are rounded from the running sample count, they never drift from the audio
             start_time = 0
-            for index, chapter_file in enumerate(chapter_files):
-                if session['cancellation_requested']:
-                    msg = 'Cancel requested'
-                    print(msg)
-                    return False
-                duration_ms = len(AudioSegment.from_file(os.path.join(session['chapters_dir'],chapter_file), format=default_audio_proc_format))
+            total_seconds = 0
+            for index, duration in enumerate(block_durations):
+                total_seconds += duration
+                end_time = round(total_seconds * 1000)
                 ffmpeg_metadata += f'[CHAPTER]\nTIMEBASE=1/1000\nSTART={start_time}\n'
-                ffmpeg_metadata += f'END={start_time + duration_ms}\ntitle=Part {index + 1}\n'
-                start_time += duration_ms
+                ffmpeg_metadata += f'END={end_time}\ntitle=Part {index + 1}\n'
+                start_time = end_time
             # Write the metadata to the file
-            with open(metadata_file, 'w', encoding='utf-8') as f:
+            with open(file_path, 'w', encoding='utf-8') as f:
                 f.write(ffmpeg_metadata)
             return True
         except Exception as e:
             DependencyError(e)
             return False
 
-    def export_audio():
+    def get_block_durations():
+        durations = []
+        for chapter_file in chapter_files:
+            if session['cancellation_requested']:
+                msg = 'Cancel requested'
+                print(msg)
+                return None
+            frames, sample_rate = get_audio_frames(os.path.join(session['chapters_dir'], chapter_file))
+            durations.append(Fraction(frames, sample_rate))
+        return durations
+
+    def run_ffmpeg(ffmpeg_cmd):
+        try:
+            process = subprocess.Popen(
+                ffmpeg_cmd,
+                env={},
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
+                encoding='utf-8',
+                errors='ignore'
+            )
+            for line in process.stdout:
+                print(line, end='')  # Print each line of stdout
+            process.wait()
+            if process.returncode == 0:
+                return True
+            else:
+                error = process.returncode
+                print(error, ffmpeg_cmd)
+                return False
+        except subprocess.CalledProcessError as e:
+            DependencyError(e)
+            return False
+
+    def normalize_master():
+        # Loudness normalization runs once for all the output formats
+        try:
+            if session['cancellation_requested']:
+                print('Cancel requested')
+                return False
+            sample_rate = sf.info(os.path.join(session['chapters_dir'], chapter_files[0])).samplerate
+            ffmpeg_cmd = [shutil.which('ffmpeg'), '-hide_banner', '-nostats']
+            if lossless_assembly:
+                ffmpeg_cmd += ['-f', 'concat', '-safe', '0']
+            ffmpeg_cmd += ['-i', combined_chapters_file, '-af', audio_filters, '-ar', str(sample_rate)]
+            ffmpeg_cmd += ['-c:a', 'pcm_s16le', '-rf64', 'auto', '-map_metadata', '-1', '-y', master_file]
+            if run_ffmpeg(ffmpeg_cmd):
+                msg = f'********* normalized master saved to {master_file}'
+                print(msg)
+                return True
+            return False
+        except Exception as e:
+            DependencyError(e)
+            return False
+
+    def export_audio(output_format, input_file, normalized, threads):
         try:
             if session['cancellation_requested']:
                 print('Cancel requested')
                 return False
             ffmpeg_cover = None
-            ffmpeg_combined_audio = combined_chapters_file
+            ffmpeg_combined_audio = input_file
             ffmpeg_metadata_file = metadata_file
-            ffmpeg_final_file = final_file
+            ffmpeg_final_file = get_final_file(output_format)
             if session['cover'] is not None:
                 ffmpeg_cover = session['cover']                    
-            ffmpeg_cmd = [shutil.which('ffmpeg'), '-hide_banner', '-nostats', '-i', ffmpeg_combined_audio, '-i', ffmpeg_metadata_file]
-            if session['output_format'] == 'wav':
+            ffmpeg_cmd = [shutil.which('ffmpeg'), '-hide_banner', '-nostats']
+            if lossless_assembly and not normalized:
+                ffmpeg_cmd += ['-f', 'concat', '-safe', '0']
+            ffmpeg_cmd += ['-i', ffmpeg_combined_audio, '-i', ffmpeg_metadata_file]
+            if output_format == 'wav':
                 ffmpeg_cmd += ['-map', '0:a']
-            elif session['output_format'] ==  'aac':
+            elif output_format ==  'aac':
                 ffmpeg_cmd += ['-c:a', 'aac', '-b:a', '128k', '-ar', '44100']
             else:
                 if ffmpeg_cover is not None:
-                    if session['output_format'] == 'mp3' or session['output_format'] == 'm4a' or session['output_format'] == 'm4b' or session['output_format'] == 'mp4' or session['output_format'] == 'flac':
+                    if output_format == 'mp3' or output_format == 'm4a' or output_format == 'm4b' or output_format == 'mp4' or output_format == 'flac':
                         ffmpeg_cmd += ['-i', ffmpeg_cover]
                         ffmpeg_cmd += ['-map', '0:a', '-map', '2:v']
                         if ffmpeg_cover.endswith('.png'):
                             ffmpeg_cmd += ['-c:v', 'png', '-disposition:v', 'attached_pic']  # PNG cover
                         else:
                             ffmpeg_cmd += ['-c:v', 'copy', '-disposition:v', 'attached_pic']  # JPEG cover (no re-encoding needed)
-                    elif session['output_format'] == 'mov':
+                    elif output_format == 'mov':
                         ffmpeg_cmd += ['-framerate', '1', '-loop', '1', '-i', ffmpeg_cover]
                         ffmpeg_cmd += ['-map', '0:a', '-map', '2:v', '-shortest']
-                    elif session['output_format'] == 'webm':
+                    elif output_format == 'webm':
                         ffmpeg_cmd += ['-framerate', '1', '-loop', '1', '-i', ffmpeg_cover]
                         ffmpeg_cmd += ['-map', '0:a', '-map', '2:v']
                         ffmpeg_cmd += ['-c:v', 'libvpx-vp9', '-crf', '40', '-speed', '8', '-shortest']
-                    elif session['output_format'] == 'ogg':
+                    elif output_format == 'ogg':
                         ffmpeg_cmd += ['-framerate', '1', '-loop', '1', '-i', ffmpeg_cover]
-                        ffmpeg_cmd += ['-filter_complex', '[2:v:0][0:a:0]concat=n=1:v=1:a=1[outv][rawa];[rawa]loudnorm=I=-16:LRA=11:TP=-1.5,afftdn=nf=-70[outa]', '-map', '[outv]', '-map', '[outa]', '-shortest']
+                        if normalized:
+                            ffmpeg_cmd += ['-filter_complex', '[2:v:0][0:a:0]concat=n=1:v=1:a=1[outv][outa]', '-map', '[outv]', '-map', '[outa]', '-shortest']
+                        else:
+                            ffmpeg_cmd += ['-filter_complex', f'[2:v:0][0:a:0]concat=n=1:v=1:a=1[outv][rawa];[rawa]{audio_filters}[outa]', '-map', '[outv]', '-map', '[outa]', '-shortest']
                     if ffmpeg_cover.endswith('.png'):
                         ffmpeg_cmd += ['-pix_fmt', 'yuv420p']
                 else:
                     ffmpeg_cmd += ['-map', '0:a']
-                if session['output_format'] == 'm4a' or session['output_format'] == 'm4b' or session['output_format'] == 'mp4':
+                if output_format == 'm4a' or output_format == 'm4b' or output_format == 'mp4':
                     ffmpeg_cmd += ['-c:a', 'aac', '-b:a', '128k', '-ar', '44100']
                     ffmpeg_cmd += ['-movflags', '+faststart']
-                elif session['output_format'] == 'webm':
+                elif output_format == 'webm':
                     ffmpeg_cmd += ['-c:a', 'libopus', '-b:a', '64k']
-                elif session['output_format'] == 'ogg':
+                elif output_format == 'ogg':
                     ffmpeg_cmd += ['-c:a', 'libopus', '-b:a', '128k', '-compression_level', '0']
-                elif session['output_format'] == 'flac':
+                elif output_format == 'flac':
                     ffmpeg_cmd += ['-c:a', 'flac', '-compression_level', '4']
-                elif session['output_format'] == 'mp3':
+                elif output_format == 'mp3':
                     ffmpeg_cmd += ['-c:a', 'libmp3lame', '-b:a', '128k', '-ar', '44100']
-                if session['output_format'] != 'ogg':
-                    ffmpeg_cmd += ['-af', 'loudnorm=I=-16:LRA=11:TP=-1.5,afftdn=nf=-70']
+                if output_format != 'ogg' and not normalized:
+                    ffmpeg_cmd += ['-af', audio_filters]
             ffmpeg_cmd += ['-strict', 'experimental', '-map_metadata', '1']
-            ffmpeg_cmd += ['-threads', '8', '-y', ffmpeg_final_file]
-            try:
-                process = subprocess.Popen(
-                    ffmpeg_cmd,
-                    env={},
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.STDOUT,
-                    encoding='utf-8',
-                    errors='ignore'
-                )
-                for line in process.stdout:
-                    print(line, end='')  # Print each line of stdout
-                process.wait()
-                if process.returncode == 0:
-                    return True
-                else:
-                    error = process.returncode
-                    print(error, ffmpeg_cmd)
+            ffmpeg_cmd += ['-threads', str(threads), '-y', ffmpeg_final_file]
+            if run_ffmpeg(ffmpeg_cmd):
+                msg = f'********* {output_format} audiobook saved to {ffmpeg_final_file}'
+                print(msg)
+                return True
+            return False
+        except Exception as e:
+            DependencyError(e)
+            return False
+
+    def encode_aac_blocks(cpu_count):
+        # Each block is encoded alone and kept with the key of what it was encoded
+        # from and its length once encoded, only the new or changed blocks (or a
+        # new gain) are encoded again. The chapter table of the remux is built
+        # from the encoded lengths, each block adding its aac priming and padding.
+        try:
+            os.makedirs(aac_dir, exist_ok=True)
+            jobs = []
+            aac_frames = {}
+            for chapter_file in chapter_files:
+                chapter_path = os.path.join(session['chapters_dir'], chapter_file)
+                aac_file = os.path.join(aac_dir, os.path.splitext(chapter_file)[0] + '.m4a')
+                stat = os.stat(chapter_path)
+                key = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'filters': audio_filters, 'codec': aac_params}
+                try:
+                    with open(f'{aac_file}.json', 'r', encoding='utf-8') as f:
+                        encoded = json.load(f)
+                    if encoded['key'] == key and os.path.exists(aac_file):
+                        aac_frames[chapter_file] = encoded['frames']
+                        continue
+                except (OSError, ValueError, KeyError, TypeError):
+                    pass
+                jobs.append((chapter_file, chapter_path, aac_file, key))
+            msg = f'Encoding {len(jobs)} new or changed block(s) to aac, {len(chapter_files) - len(jobs)} kept'
+            print(msg)
+
+            def encode(job):
+                if session['cancellation_requested']:
                     return False
-            except subprocess.CalledProcessError as e:
-                DependencyError(e)
+                chapter_file, chapter_path, aac_file, key = job
+                ffmpeg_cmd = [shutil.which('ffmpeg'), '-hide_banner', '-nostats', '-i', chapter_path, '-af', audio_filters]
+                ffmpeg_cmd += aac_params + ['-map_metadata', '-1', '-threads', '1', '-y', aac_file]
+                if not run_ffmpeg(ffmpeg_cmd):
+                    return False
+                aac_frames[chapter_file] = get_aac_frames(aac_file)
+                with open(f'{aac_file}.json', 'w', encoding='utf-8') as f:
+                    json.dump({'key': key, 'frames': aac_frames[chapter_file]}, f)
+                return True
+
+            if jobs:
+                with ThreadPoolExecutor(max_workers=min(len(jobs), cpu_count)) as executor:
+                    if not all(list(executor.map(encode, jobs))):
+                        return False
+            block_durations = [Fraction(aac_frames[chapter_file], aac_sample_rate) for chapter_file in chapter_files]
+            return generate_ffmpeg_metadata(aac_metadata_file, block_durations)
+        except Exception as e:
+            DependencyError(e)
+            return False
+
+    def remux_aac_blocks(output_format):
+        # The aac blocks are joined without encoding, with the chapter table and cover
+        try:
+            if session['cancellation_requested']:
+                print('Cancel requested')
                 return False
- 
+            file_list = os.path.join(aac_dir, f'blocks_{output_format}.txt')
+            with open(file_list, 'w') as f:
+                for chapter_file in chapter_files:
+                    f.write(f"file '{os.path.splitext(chapter_file)[0]}.m4a'\n")
+            ffmpeg_final_file = get_final_file(output_format)
+            ffmpeg_cmd = [shutil.which('ffmpeg'), '-hide_banner', '-nostats', '-f', 'concat', '-safe', '0', '-i', file_list, '-i', aac_metadata_file]
+            if session['cover'] is not None:
+                ffmpeg_cmd += ['-i', session['cover'], '-map', '0:a', '-map', '2:v']
+                if session['cover'].endswith('.png'):
+                    ffmpeg_cmd += ['-c:v', 'png', '-disposition:v', 'attached_pic']  # PNG cover
+                else:
+                    ffmpeg_cmd += ['-c:v', 'copy', '-disposition:v', 'attached_pic']  # JPEG cover (no re-encoding needed)
+            else:
+                ffmpeg_cmd += ['-map', '0:a']
+            ffmpeg_cmd += ['-c:a', 'copy', '-movflags', '+faststart', '-map_metadata', '1', '-y', ffmpeg_final_file]
+            if run_ffmpeg(ffmpeg_cmd):
+                os.remove(file_list)
+                msg = f'********* {output_format} audiobook saved to {ffmpeg_final_file}'
+                print(msg)
+                return True
+            return False
         except Exception as e:
             DependencyError(e)
             return False
+
+    def export_all():
+        export_formats = list(session.get('export_formats') or [session['output_format']])
+        cpu_count = os.cpu_count() or 1
+        # Blocks encoded apart only add up to the book with a linear gain, the
+        # dynamic loudnorm would level each block on its own
+        incremental_formats = [f for f in export_formats if incremental_export and two_pass_loudnorm and f in ('m4b', 'm4a', 'mp4')]
+        if incremental_formats and not encode_aac_blocks(cpu_count):
+            return False
+        # wav and aac are exported without the filters
+        normalized_formats = [f for f in export_formats if f not in incremental_formats and f not in ('wav', 'aac')]
+        if len(normalized_formats) > 1 and not normalize_master():
+            return False
+
+        def export(output_format):
+            if output_format in incremental_formats:
+                return remux_aac_blocks(output_format)
+            if len(normalized_formats) > 1 and output_format in normalized_formats:
+                return export_audio(output_format, master_file, True, threads)
+            return export_audio(output_format, combined_chapters_file, False, threads)
+
+        try:
+            # One ffmpeg per format, the cores are shared between them
+            workers = min(len(export_formats), cpu_count)
+            threads = max(1, cpu_count // workers)
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                results = list(executor.map(export, export_formats))
+            return all(results)
+        finally:
+            if os.path.exists(master_file):
+                os.remove(master_file)
+
+    def get_audio_filters():
+        if not two_pass_loudnorm:
+            return export_audio_filters
+        # Blocks measured by a previous export are read from the cache, the others in parallel
+        loudness_meter = LoudnessMeter(os.path.join(session['chapters_dir'], 'loudness'), *loudnorm_target)
+        chapter_paths = [os.path.join(session['chapters_dir'], f) for f in chapter_files]
+        measures = [loudness_meter.load(f) for f in chapter_paths]
+        missing = [i for i, measure in enumerate(measures) if measure is None]
+        if missing:
+            msg = f'Measuring the loudness of {len(missing)} block(s)...'
+            print(msg)
+            with ProcessPoolExecutor(max_workers=min(len(missing), os.cpu_count() or 1)) as executor:
+                for i, measure in zip(missing, executor.map(loudness_meter.analyze_file, [chapter_paths[i] for i in missing])):
+                    measures[i] = measure
+        stats = loudness_meter.get_stats(measures)
+        # A small change of the book loudness does not invalidate its aac blocks
+        gain = loudness_meter.get_gain(stats, 0.5 if incremental_export else 0)
+        if stats['integrated'] is not None:
+            msg = f"Loudness {stats['integrated']:.1f} LUFS, range {stats['lra'] or 0:.1f} LU, true peak {stats['true_peak']:.1f} dBTP, gain {gain:+.2f} dB"
+            print(msg)
+        # Gain only: the measured loudness and true peak hold for the exported audio
+        return f'volume={gain:.2f}dB'
+
+    def get_final_file(output_format):
+        return os.path.join(session['audiobooks_dir'], os.path.splitext(session['final_name'])[0] + '.' + output_format)
+
     try:
-        chapter_files = [f for f in os.listdir(session['chapters_dir']) if f.endswith(f'.{default_audio_proc_format}')]
+        chapter_files = [f for f in os.listdir(session['chapters_dir']) if f.endswith(f'.{block_audio_format}')]
         chapter_files = sorted(chapter_files, key=lambda x: int(re.search(r'\d+', x).group()))
         if len(chapter_files) > 0:
-            combined_chapters_file = os.path.join(session['process_dir'], get_sanitized(session['metadata']['title']) + '.' + default_audio_proc_format)
+            if lossless_assembly:
+                combined_chapters_file = os.path.join(session['chapters_dir'], 'chapters.txt')
+            else:
+                combined_chapters_file = os.path.join(session['process_dir'], get_sanitized(session['metadata']['title']) + '.' + default_audio_proc_format)
+            master_file = os.path.join(session['process_dir'], 'master.wav')
+            aac_dir = os.path.join(session['chapters_dir'], 'aac')
+            aac_sample_rate = 44100
+            aac_params = ['-c:a', 'aac', '-b:a', '128k', '-ar', str(aac_sample_rate)]
             metadata_file = os.path.join(session['process_dir'], 'metadata.txt')
+            aac_metadata_file = os.path.join(session['process_dir'], 'metadata_aac.txt')
             if assemble_segments():
-                if generate_ffmpeg_metadata():
-                    final_file = os.path.join(session['audiobooks_dir'], session['final_name'])                       
-                    if export_audio():
+                block_durations = get_block_durations()
+                if block_durations is not None and generate_ffmpeg_metadata(metadata_file, block_durations):
+                    final_file = get_final_file(session['output_format'])
+                    audio_filters = get_audio_filters()
+                    if export_all():
                         return final_file
         else:
             error = 'No block files exists!'
@@ -1412,15 +1974,16 @@ def convert_ebook(args):
         error = None
         id = None
         info_session = None
+        pdf_extractor = None
         if args['language'] is not None:
             if not os.path.splitext(args['ebook'])[1]:
                 error = f"{args['ebook']} needs a format extension."
                 print(error)
-                return error, false
+                return error, False
             if not os.path.exists(args['ebook']):
                 error = 'File does not exist or Directory empty.'
                 print(error)
-                return error, false
+                return error, False
             try:
                 if len(args['language']) == 2:
                     lang_array = languages.get(part1=args['language'])
@@ -1440,7 +2003,15 @@ def convert_ebook(args):
             if args['language'] not in language_mapping.keys():
                 error = 'The language you provided is not (yet) supported'
                 print(error)
-                return error, false
+                return error, False
+
+            # Several formats can be exported at once, e.g. m4b,mp3,ogg
+            export_formats = [f.strip().lower() for f in str(args['output_format'] or default_output_format).split(',') if f.strip()]
+            unsupported_formats = [f for f in export_formats if f not in output_formats]
+            if not export_formats or unsupported_formats:
+                error = f'Unsupported output format {unsupported_formats}, supported formats are {output_formats}'
+                print(error)
+                return error, False
 
             is_gui_process = args['is_gui_process']
             id = args['session'] if args['session'] is not None else str(uuid.uuid4())
@@ -1454,7 +2025,8 @@ def convert_ebook(args):
             session['tts_engine'] = args['tts_engine'] if args['tts_engine'] is not None else get_compatible_tts_engines(args['language'])[0]
             session['custom_model'] = args['custom_model'] if not is_gui_process or args['custom_model'] is None else os.path.join(session['custom_model_dir'], args['custom_model'])
             session['fine_tuned'] = args['fine_tuned']
-            session['output_format'] = args['output_format']
+            session['output_format'] = export_formats[0]
+            session['export_formats'] = list(dict.fromkeys(export_formats))
             session['temperature'] =  args['temperature']
             session['length_penalty'] = args['length_penalty']
             session['num_beams'] = args['num_beams']
@@ -1463,6 +2035,10 @@ def convert_ebook(args):
             session['top_p'] = args['top_p']
             session['speed'] = args['speed']
             session['enable_text_splitting'] = args['enable_text_splitting']
+            session['parse_workers'] = args['parse_workers'] if args.get('parse_workers') is not None else default_parse_workers
+            session['streaming'] = args['streaming'] if args.get('streaming') is not None else default_streaming
+            session['tts_batch_size'] = args['tts_batch_size'] if args.get('tts_batch_size') is not None else default_tts_batch_size
+            session['tts_workers'] = args['tts_workers'] if args.get('tts_workers') is not None else default_tts_workers
             session['audiobooks_dir'] = args['audiobooks_dir']
             session['voice'] = args['voice']
             
@@ -1547,14 +2123,33 @@ def convert_ebook(args):
                                 msg = 'deepspeed is detected!'
                                 print(msg)
                         session['epub_path'] = os.path.join(session['process_dir'], '__' + session['filename_noext'] + '.epub')
-                        if convert2epub(session):
-                            epubBook = epub.read_epub(session['epub_path'], {'ignore_ncx': True})       
+                        cached = None
+                        parse_cache_key = get_parse_cache_key(session) if enable_parse_cache else None
+                        if parse_cache_key is not None:
+                            cached = parse_cache.load(parse_cache_key)
+                        if cached is not None:
+                            msg = 'Parsed ebook found in cache, conversion and parsing skipped'
+                            print(msg)
+                            converted = True
+                        elif os.path.splitext(session['ebook'])[1].lower() == '.pdf' and native_pdf:
+                            # PDF pages go straight to get_sentences() without the Markdown/Calibre/EPUB round trip
+                            pdf_extractor = get_pdf_extractor(session)
+                            converted = pdf_extractor is not None
+                        else:
+                            converted = convert2epub(session)
+                        if converted:
                             metadata = dict(session['metadata'])
-                            for key, value in metadata.items():
-                                data = epubBook.get_metadata('DC', key)
-                                if data:
-                                    for value, attributes in data:
-                                        metadata[key] = value
+                            if cached is not None:
+                                metadata.update(cached['metadata'])
+                            elif pdf_extractor is not None:
+                                metadata.update(pdf_extractor.get_metadata())
+                            else:
+                                epubBook = epub.read_epub(session['epub_path'], {'ignore_ncx': True})       
+                                for key, value in metadata.items():
+                                    data = epubBook.get_metadata('DC', key)
+                                    if data:
+                                        for value, attributes in data:
+                                            metadata[key] = value
                             metadata['language'] = session['language']
                             metadata['title'] = metadata['title'] if metadata['title'] else os.path.splitext(os.path.basename(session['ebook']))[0].replace('_',' ')
                             metadata['creator'] =  False if not metadata['creator'] or metadata['creator'] == 'Unknown' else metadata['creator']
@@ -1571,12 +2166,46 @@ def convert_ebook(args):
                             if session['metadata']['language'] != session['language']:
                                 error = f"WARNING!!! language selected {session['language']} differs from the EPUB file language {session['metadata']['language']}"
                                 print(error)
-                            session['cover'] = get_cover(epubBook, session)
+                            if cached is not None:
+                                session['cover'] = get_cached_cover(parse_cache_key, session)
+                            elif pdf_extractor is not None:
+                                session['cover'] = get_pdf_cover(pdf_extractor, session)
+                            else:
+                                session['cover'] = get_cover(epubBook, session)
                             if session['cover']:
-                                session['toc'], session['chapters'] = get_chapters(epubBook, session)
                                 session['final_name'] = get_sanitized(session['metadata']['title'] + '.' + session['output_format'])
-                                if session['chapters'] is not None:
-                                    if convert_chapters2audio(session):
+                                if cached is not None:
+                                    session['toc'] = cached['toc']
+                                    chapters = parse_cache.iter_chapters(parse_cache_key)
+                                    if not session['streaming']:
+                                        session['chapters'] = list(chapters)
+                                        chapters = session['chapters']
+                                elif pdf_extractor is not None:
+                                    session['toc'] = pdf_extractor.toc
+                                    if session['streaming']:
+                                        chapters = stream_chapters(iter_pdf_chapters(pdf_extractor, session))
+                                    else:
+                                        session['chapters'] = get_pdf_chapters(pdf_extractor, session)
+                                        chapters = session['chapters']
+                                elif session['streaming']:
+                                    # TTS starts on the first block while the next ones are parsed
+                                    session['toc'] = epubBook.toc
+                                    chapters = stream_chapters(iter_chapters(get_spine_docs(epubBook), session))
+                                else:
+                                    session['toc'], session['chapters'] = get_chapters(epubBook, session)
+                                    chapters = session['chapters']
+                                if chapters is not None and cached is None and parse_cache_key is not None:
+                                    cache_header = {
+                                        'toc': ParseCache.toc2list(session['toc']),
+                                        'metadata': dict(session['metadata'])
+                                    }
+                                    if session['streaming']:
+                                        # Blocks are cached as the TTS consumes them
+                                        chapters = parse_cache.record(parse_cache_key, cache_header, chapters, session['cover'], lambda: session['cancellation_requested'])
+                                    else:
+                                        parse_cache.save(parse_cache_key, cache_header, chapters, session['cover'])
+                                if chapters is not None:
+                                    if convert_chapters2audio(session, chapters):
                                         final_file = combine_audio_chapters(session)               
                                         if final_file is not None:
                                             chapters_dirs = [
@@ -1632,6 +2261,10 @@ def convert_ebook(args):
     except Exception as e:
         print(f'convert_ebook() Exception: {e}')
         return e, False
+    finally:
+        # Streamed PDF blocks are read until the conversion ends
+        if pdf_extractor is not None:
+            pdf_extractor.close()
 
 def restore_session_from_data(data, session):
     try:
@@ -1651,6 +2284,7 @@ def reset_ebook_session(id):
         "chapters_dir": None,
         "chapters_dir_sentences": None,
         "epub_path": None,
+        "ebook_hash": None,
         "filename_noext": None,
         "chapters": None,
         "cover": None,
@@ -2569,6 +3203,10 @@ def web_interface(args):
                     "top_p": float(top_p),
                     "speed": float(speed),
                     "enable_text_splitting": enable_text_splitting,
+                    "parse_workers": session['parse_workers'],
+                    "streaming": session['streaming'],
+                    "tts_batch_size": session['tts_batch_size'],
+                    "tts_workers": session['tts_workers'],
                     "fine_tuned": fine_tuned
                 }
 
@@ -1,5 +1,6 @@
 import os
 from lib.conf import voices_dir
+from lib.classes.model_cache import ModelCache
 
 XTTSv2 = 'xtts'
 BARK = 'bark'
@@ -19,9 +20,10 @@ voice_conversion_models/multilingual/multi-dataset/openvoice_v2
 """
 default_vc_model = "voice_conversion_models/multilingual/multi-dataset/knnvc"
 
-loaded_tts = {} # must be empty
+max_tts_in_memory = None # max TTS models kept in memory (1 tts engine ~= 4GB to 8GB RAM), None = only limited by max_tts_memory
+max_tts_memory = None # bytes the loaded TTS models may use per device, None = 75% of the VRAM (cuda) or RAM (cpu/mps)
 
-max_tts_in_memory = 2 # TTS engines to keep in memory (1 tts engine ~= 4GB to 8GB RAM) Xtts being selected if set on 1.
+loaded_tts = ModelCache(max_entries=max_tts_in_memory, max_bytes=max_tts_memory) # least recently used models are unloaded first
 max_custom_model = 10
 max_custom_voices = 100
 max_upload_size = '6GB'
@@ -0,0 +1,83 @@
+# Benchmark of the audio handoff between the TTS model and the sentence file.
+# Replays what Coqui.convert() does with the waveform of each sentence part:
+# model output -> tensor segments + silences -> concatenation -> trim -> flac,
+# once the former way (.tolist(), torch.tensor(), .clone().detach()) and once
+# the current way (tensors wrapped without copy by Coqui._audio_segment()).
+# Each mode runs in its own process so the peak RSS of one does not hide the other.
+#
+# Usage (from the ebook2audiobook root directory):
+#   python tools/benchmark_audio_handoff.py [--sentences 50] [--parts 2] [--seconds 8]
+
+import argparse
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import torch
+import torchaudio
+
+sample_rate = 24000
+
+def legacy_segment(audio_part):
+    audio_part = audio_part.tolist()
+    source_tensor = torch.tensor(audio_part, dtype=torch.float32)
+    return source_tensor.clone().detach().unsqueeze(0).cpu()
+
+def current_segment(audio_part):
+    return torch.as_tensor(audio_part, dtype=torch.float32).detach().to('cpu', torch.float32).reshape(1, -1)
+
+def trim(audio_tensor, silence_threshold=0.001, buffer_sec=0.07):
+    non_silent_indices = torch.where(audio_tensor.abs() > silence_threshold)[0]
+    start_index = max(non_silent_indices[0] - int(buffer_sec * sample_rate), 0)
+    end_index = non_silent_indices[-1] + int(buffer_sec * sample_rate)
+    return audio_tensor[start_index:end_index]
+
+def run(mode, sentences, parts, seconds):
+    segment = legacy_segment if mode == 'legacy' else current_segment
+    rng = np.random.default_rng(0)
+    # Same kind of buffer as Xtts.inference()['wav']: float32 numpy
+    waveform = (rng.standard_normal(int(seconds * sample_rate)) * 0.1).astype(np.float32)
+    silence_tensor = torch.zeros(1, sample_rate * 2)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        cpu_start = time.process_time()
+        for sentence_number in range(sentences):
+            audio_segments = []
+            for _ in range(parts):
+                audio_segments.append(segment(waveform))
+                audio_segments.append(silence_tensor.clone() if mode == 'legacy' else silence_tensor)
+            audio_tensor = torch.cat(audio_segments[:-1], dim=-1)
+            audio_tensor = trim(audio_tensor.squeeze()).unsqueeze(0)
+            torchaudio.save(os.path.join(tmp_dir, f'{sentence_number}.flac'), audio_tensor, sample_rate, format='flac')
+        cpu_time = time.process_time() - cpu_start
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        peak_rss //= 1024
+    print(f'{cpu_time / sentences * 1000:.2f} {peak_rss / 1024:.1f}')
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the handoff of the TTS waveforms to the sentence files.')
+    parser.add_argument('--sentences', type=int, default=50, help='Number of sentences to process')
+    parser.add_argument('--parts', type=int, default=2, help='Sentence parts (pauses) per sentence')
+    parser.add_argument('--seconds', type=float, default=8, help='Duration of each sentence part')
+    parser.add_argument('--mode', choices=['legacy', 'current'], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        run(args.mode, args.sentences, args.parts, args.seconds)
+        return
+    results = {}
+    for mode in ('legacy', 'current'):
+        output = subprocess.run(
+            [sys.executable, __file__, '--mode', mode, '--sentences', str(args.sentences), '--parts', str(args.parts), '--seconds', str(args.seconds)],
+            capture_output=True, text=True, check=True
+        ).stdout.split()
+        results[mode] = float(output[0]), float(output[1])
+        print(f'{mode:8} {results[mode][0]:8.2f} ms cpu/sentence {results[mode][1]:8.1f} MB peak rss')
+    print(f"cpu time: {results['legacy'][0] / results['current'][0]:.1f}x less, peak rss: {results['legacy'][1] - results['current'][1]:.1f} MB less")
+
+if __name__ == '__main__':
+    main()
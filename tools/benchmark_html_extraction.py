@@ -0,0 +1,55 @@
+# Benchmark of the chapter html extraction backends.
+# Runs get_text_array_bs4() and get_text_array_lxml() on every spine document
+# of the given EPUB files, checks both return the same text blocks and prints
+# the documents/sec of each.
+#
+# Usage (from the ebook2audiobook root directory):
+#   python tools/benchmark_html_extraction.py [--language eng] [--repeat 3] book.epub [book2.epub ...]
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from ebooklib import epub
+
+from lib.functions import get_spine_docs, get_text_array_bs4, get_text_array_lxml
+
+def run(extract, documents, language, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        results = [extract(document, language) for document in documents]
+    elapsed = time.perf_counter() - start
+    return results, elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the bs4 and lxml chapter extraction backends.')
+    parser.add_argument('--language', type=str, default='eng', help='ISO-639-3 language code')
+    parser.add_argument('--repeat', type=int, default=3, help='Number of passes over each book')
+    parser.add_argument('files', nargs='+', help='EPUB files to extract')
+    args = parser.parse_args()
+
+    documents = []
+    for file in args.files:
+        epubBook = epub.read_epub(file, {'ignore_ncx': True})
+        documents += [doc.get_content().decode('utf-8') for doc in get_spine_docs(epubBook)]
+    print(f'{len(documents)} documents, {sum(len(d) for d in documents) / 1024:.0f} KB of html')
+
+    bs4_results, bs4_elapsed = run(get_text_array_bs4, documents, args.language, args.repeat)
+    lxml_results, lxml_elapsed = run(get_text_array_lxml, documents, args.language, args.repeat)
+    total = len(documents) * args.repeat
+    print(f'bs4:  {total / bs4_elapsed:.1f} documents/sec')
+    print(f'lxml: {total / lxml_elapsed:.1f} documents/sec ({bs4_elapsed / lxml_elapsed:.1f}x)')
+
+    mismatches = [i for i, (a, b) in enumerate(zip(bs4_results, lxml_results)) if a != b]
+    if mismatches:
+        print(f'{len(mismatches)} documents differ, first one is #{mismatches[0]}:')
+        print(f'bs4:  {bs4_results[mismatches[0]]}')
+        print(f'lxml: {lxml_results[mismatches[0]]}')
+        sys.exit(1)
+    print('Outputs are identical')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,199 @@
+# Micro-benchmark of the chapter text normalization.
+# Compares the former per-call normalize_text() (copied below as the baseline)
+# with the precompiled TextNormalizer, checks both outputs are identical and
+# prints the chapters/sec of each.
+#
+# Usage (from the ebook2audiobook root directory):
+#   python tools/benchmark_normalize_text.py [--language eng] [--tts_engine xtts] [--chapters 200] [file.txt ...]
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import regex as re
+
+from num2words import num2words
+
+from lib.lang import *
+from lib.models import XTTSv2, VITS, FAIRSEQ, YOURTTS, BARK
+from lib.classes.text_normalizer import get_text_normalizer
+
+sample_chapter = '''Chapter IV
+
+Mr. Smith and Dr. Jones met at 10 o'clock on St. Patrick's Ave. (the one near the F.B.I. building) in 1984.
+"It's 3 + 5 = 8," he said… ok, maybe 7-2 or 8 * 4; who knows? The U.S.A. had 1,234,567 people & 12% of them said ‘yes’.
+### The temperature was 25° – cold for June! Prices rose from $3.50 to $4.75 (roughly 35.7%).
+Page 42 — see § 3.1, e.g. the table [pause] and the “appendix”…   Done!!!
+
+'''
+
+def legacy_math2word(text, lang, lang_iso1, tts_engine):
+    def check_compat():
+        try:
+            num2words(1, lang=lang_iso1)
+            return True
+        except NotImplementedError:
+            return False
+        except Exception as e:
+            return False
+
+    def rep_num(match):
+        number = match.group().strip().replace(",", "")
+        try:
+            if "." in number or "e" in number or "E" in number:
+                number_value = float(number)
+            else:
+                number_value = int(number)
+            number_in_words = num2words(number_value, lang=lang_iso1)
+            return f" {number_in_words}"
+        except Exception as e:
+            print(f"Error converting number: {number}, Error: {e}")
+            return f"{number}"
+
+    def replace_ambiguous(match):
+        symbol2 = match.group(2)
+        symbol3 = match.group(3)
+        if symbol2 in ambiguous_replacements: # "num SYMBOL num" case
+            return f"{match.group(1)} {ambiguous_replacements[symbol2]} {match.group(3)}"            
+        elif symbol3 in ambiguous_replacements: # "SYMBOL num" case
+            return f"{ambiguous_replacements[symbol3]} {match.group(4)}"
+        return match.group(0)
+
+    is_num2words_compat = check_compat()
+    phonemes_list = language_math_phonemes.get(lang, language_math_phonemes[default_language_code])
+    # Separate ambiguous and non-ambiguous symbols
+    ambiguous_symbols = {"-", "/", "*", "x"}
+    replacements = {k: v for k, v in phonemes_list.items() if not k.isdigit()}  # Keep only math symbols
+    normal_replacements = {k: v for k, v in replacements.items() if k not in ambiguous_symbols}
+    ambiguous_replacements = {k: v for k, v in replacements.items() if k in ambiguous_symbols}
+    # Replace unambiguous math symbols normally
+    if normal_replacements:
+        math_pattern = r'(' + '|'.join(map(re.escape, normal_replacements.keys())) + r')'
+        text = re.sub(math_pattern, lambda m: f" {normal_replacements[m.group(0)]} ", text)
+    # Regex pattern for ambiguous symbols (match only valid equations)
+    ambiguous_pattern = (
+        r'(?<!\S)(\d+)\s*([-/*x])\s*(\d+)(?!\S)|'  # Matches "num SYMBOL num" (e.g., "3 + 5", "7-2", "8 * 4")
+        r'(?<!\S)([-/*x])\s*(\d+)(?!\S)'           # Matches "SYMBOL num" (e.g., "-4", "/ 9")
+    )
+    if ambiguous_replacements:
+        text = re.sub(ambiguous_pattern, replace_ambiguous, text)
+    # Regex pattern for detecting numbers (handles negatives, commas, decimals, scientific notation)
+    number_pattern = r'\s*(-?\d{1,3}(?:,\d{3})*(?:\.\d+(?!\s|$))?(?:[eE][-+]?\d+)?)\s*'
+    if tts_engine == VITS or tts_engine == FAIRSEQ or tts_engine == YOURTTS:
+        if is_num2words_compat:
+            # Pattern 2: Split big numbers into groups of 4
+            text = re.sub(r'(\d{4})(?=\d{4}(?!\.\d))', r'\1 ', text)
+            text = re.sub(number_pattern, rep_num, text)
+        else:
+            # Pattern 2: Split big numbers into groups of 2
+            text = re.sub(r'(\d{2})(?=\d{2}(?!\.\d))', r'\1 ', text)
+            # Fallback: Replace numbers using phonemes dictionary
+            sorted_numbers = sorted((k for k in phonemes_list if k.isdigit()), key=len, reverse=True)
+            if sorted_numbers:
+                number_pattern = r'\b(' + '|'.join(map(re.escape, sorted_numbers)) + r')\b'
+                text = re.sub(number_pattern, lambda match: phonemes_list[match.group(0)], text)
+    return text
+
+def legacy_normalize_text(text, lang, lang_iso1, tts_engine):
+    # Remove emojis
+    emoji_pattern = re.compile(f"[{''.join(emojis_array)}]+", flags=re.UNICODE)
+    emoji_pattern.sub('', text)
+    if lang in abbreviations_mapping:
+        text = re.sub(r'\b(?:[a-zA-Z]+\.)+|[a-zA-Z]+', lambda m: {re.sub(r'\.', '', k).lower(): v for k, v in abbreviations_mapping["eng"].items()}.get(m.group().replace('.', '').lower(), m.group()), text)
+    # This regex matches sequences like a., c.i.a., f.d.a., m.c., etc...
+    pattern = re.compile(r'\b(?:[a-zA-Z]\.){1,}[a-zA-Z]?\b\.?')
+    # uppercase acronyms
+    text = re.sub(r'\b(?:[a-zA-Z]\.){1,}[a-zA-Z]?\b\.?', lambda m: m.group().replace('.', '').upper(), text)
+    # Replace ### and [pause] with ‡pause‡ (‡ = double dagger U+2021)
+    text = re.sub(r'(###|\[pause\])', '‡pause‡', text)
+    # Replace punctuations causing hallucinations
+    pattern = f"[{''.join(map(re.escape, punctuation_switch.keys()))}]"
+    text = re.sub(pattern, lambda match: punctuation_switch.get(match.group(), match.group()), text)
+    # Replace NBSP with a normal space
+    text = text.replace("\xa0", " ")
+    # Replace multiple newlines ("\n\n", "\r\r", "\n\r", etc.) with a single "\n"
+    text = re.sub(r'(\r\n|\r|\n)+', '\n', text)
+    # Replace single newlines ("\n" or "\r") with spaces
+    text = re.sub(r'[\r\n]', ' ', text)
+    # Replace multiple  and spaces with single space
+    text = re.sub(r'[     ]+', ' ', text)
+    # Replace ok by 'Owkey'
+    text = re.sub(r'\bok\b', '"Okhey"', text, flags=re.IGNORECASE)
+    # Replace parentheses with double quotes
+    text = re.sub(r'\(([^)]+)\)', r'"\1"', text)
+    # Escape special characters in the punctuation list for regex
+    pattern = '|'.join(map(re.escape, punctuation_split))
+    # Reduce multiple consecutive punctuations
+    text = re.sub(rf'(\s*({pattern})\s*)+', r'\2 ', text).strip()
+    if tts_engine == XTTSv2:
+        # Pattern 1: Add a space between UTF-8 characters and numbers
+        text = re.sub(r'(?<=[\p{L}])(?=\d)|(?<=\d)(?=[\p{L}])', ' ', text)
+    if tts_engine == XTTSv2:
+        pattern_space = re.escape(''.join(punctuation_list))
+        # Ensure space before and after punctuation (excluding `,` and `.`)
+        punctuation_pattern_space = r'\s*([{}])\s*'.format(pattern_space.replace(',', '').replace('.', ''))
+        text = re.sub(punctuation_pattern_space, r' \1 ', text)
+        # Ensure spaces before & after `,` and `.` ONLY when NOT between numbers
+        comma_dot_pattern = r'(?<!\d)\s*(\.{3}|[,.])\s*(?!\d)'
+        text = re.sub(comma_dot_pattern, r' \1 ', text)
+    # Replace special chars with words
+    specialchars = specialchars_mapping[lang] if lang in specialchars_mapping else specialchars_mapping["eng"]
+    for char, word in specialchars.items():
+        text = text.replace(char, f" {word} ")
+    for char in specialchars_remove:
+        text = text.replace(char, ' ')
+    text = ' '.join(text.split())
+    if text.strip():
+        # Add punctuation after numbers or Roman numerals at start of a chapter.
+        roman_pattern = r'^(?=[IVXLCDM])((?:M{0,3})(?:CM|CD|D?C{0,3})?(?:XC|XL|L?X{0,3})?(?:IX|IV|V?I{0,3}))(?=\s|$)'
+        arabic_pattern = r'^(\d+)(?=\s|$)'
+        if re.match(roman_pattern, text, re.IGNORECASE) or re.match(arabic_pattern, text):
+            # Add punctuation if not already present (e.g. "II", "4")
+            if not re.match(r'^([IVXLCDM\d]+)[\.,:;]', text, re.IGNORECASE):
+                text = re.sub(r'^([IVXLCDM\d]+)', r'\1' + ' — ', text, flags=re.IGNORECASE)
+        # Replace math symbols with words
+        text = legacy_math2word(text, lang, lang_iso1, tts_engine)
+    return text
+
+
+def run(normalize, chapters, lang, lang_iso1, tts_engine):
+    start = time.perf_counter()
+    results = [normalize(text, lang, lang_iso1, tts_engine) for text in chapters]
+    elapsed = time.perf_counter() - start
+    return results, elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark normalize_text() against TextNormalizer.')
+    parser.add_argument('--language', type=str, default='eng', help='ISO-639-3 language code')
+    parser.add_argument('--language_iso1', type=str, default=None, help='ISO-639-1 language code (default derived from the tts engine table)')
+    parser.add_argument('--tts_engine', type=str, default=XTTSv2)
+    parser.add_argument('--chapters', type=int, default=200, help='Number of chapters to normalize per run')
+    parser.add_argument('files', nargs='*', help='Text files used as chapters (default: builtin sample)')
+    args = parser.parse_args()
+    lang = args.language
+    lang_iso1 = args.language_iso1 or language_tts.get(args.tts_engine, {}).get(lang, 'en').split('-')[0]
+    sources = []
+    for path in args.files:
+        with open(path, 'r', encoding='utf-8') as f:
+            sources.append(f.read())
+    if not sources:
+        sources = [sample_chapter * 20]
+    chapters = [sources[i % len(sources)] for i in range(args.chapters)]
+    get_text_normalizer(lang, lang_iso1, args.tts_engine)
+    before, before_time = run(legacy_normalize_text, chapters, lang, lang_iso1, args.tts_engine)
+    after, after_time = run(lambda text, *a: get_text_normalizer(*a).normalize(text), chapters, lang, lang_iso1, args.tts_engine)
+    mismatches = sum(1 for a, b in zip(before, after) if a != b)
+    print(f'language: {lang} ({lang_iso1}), tts engine: {args.tts_engine}, chapters: {len(chapters)}')
+    print(f'before: {len(chapters) / before_time:10.1f} chapters/sec ({before_time:.3f}s)')
+    print(f'after:  {len(chapters) / after_time:10.1f} chapters/sec ({after_time:.3f}s)')
+    print(f'speedup: x{before_time / after_time:.2f}')
+    if mismatches:
+        print(f'ERROR: {mismatches} chapters differ between both implementations!')
+        sys.exit(1)
+    print('outputs are identical')
+
+if __name__ == '__main__':
+    main()
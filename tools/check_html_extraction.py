@@ -0,0 +1,88 @@
+# Differential check of the chapter html extraction backends.
+# get_text_array(), the lxml backend with its BeautifulSoup fallback for
+# documents that are not well formed XHTML, must return the same text blocks
+# as the BeautifulSoup reference get_text_array_bs4(). The built-in cases
+# cover invalid nesting found in publisher XHTML (blocks inside <p> or <h*>,
+# tables inside paragraphs), named entities, namespaced epub:type and plain
+# HTML markup (unquoted attributes, void tags, bare &, unknown entities,
+# scripts, CDATA). The spine documents of EPUB files given on the command
+# line are checked too. Documents parsed by the fallback are counted.
+#
+# Usage (from the ebook2audiobook root directory):
+#   python tools/check_html_extraction.py [--language eng] [book.epub ...]
+
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from ebooklib import epub
+
+from lib.functions import get_spine_docs, get_text_array, get_text_array_bs4, get_text_array_lxml
+
+xhtml_head = '<?xml version="1.0" encoding="utf-8"?>\n<!DOCTYPE html>\n<html xmlns="http://www.w3.org/1999/xhtml" xmlns:epub="http://www.idpf.org/2007/ops"><head><title>Chapter</title></head>'
+
+cases = {
+    'div inside p': '<html><body><p>one<div>two</div>three</p></body></html>',
+    'table inside p': '<html><body><p>pre<table><tr><th>Name</th><th>Age</th></tr><tr><td>Ann</td><td>30</td></tr></table>post</p></body></html>',
+    'p inside heading': '<html><body><h2><p>inner</p></h2><p>text</p></body></html>',
+    'list inside p': '<html><body><p>items<ul><li>first</li><li>second</li></ul>end</p></body></html>',
+    'nested p': '<html><body><p>outer<p>inner</p>tail</p></body></html>',
+    'unclosed tags': '<html><body><p>a<br>b<p>c</body></html>',
+    'uppercase tags': '<HTML><BODY><H1>Title</H1><P>Text</P></BODY></HTML>',
+    'entities': '<html><body><p>a&nbsp;b &eacute;t&eacute; &amp; &lt;tag&gt; &#233;&#x00E9;</p></body></html>',
+    'comments and scripts': '<html><body><p>x<!-- note -->y</p><script>var a = 1;</script><style>p {}</style></body></html>',
+    'xhtml': xhtml_head + '<body><section><h1>I</h1><p>First&nbsp;paragraph.</p><div><p>Second <em>one</em>.</p></div></section></body></html>',
+    'xhtml excluded body': xhtml_head + '<body epub:type="frontmatter"><p>Copyright</p></body></html>',
+    'xhtml excluded section': xhtml_head + '<body><section epub:type="toc"><p>Contents</p></section></body></html>',
+    'xhtml table': xhtml_head + '<body><table><tr><td>a</td><td>b</td></tr><tr><td>1</td><td>2</td></tr><tr><td>3</td></tr></table></body></html>',
+    'empty body': '<html><body><p> </p></body></html>',
+    'no body': '<html><p>orphan</p></html>',
+    'unquoted attribute': '<html><body class=x><p>Kept text</p></body></html>',
+    'void tag': '<html><body><p>Before <img src=x> after</p><p>Next<br>line</p></body></html>',
+    'bare ampersand': '<html><body><p>Tom & Jerry</p></body></html>',
+    'unknown entity': '<html><body><p>a &foo; b &hellip2; c</p></body></html>',
+    'text after script': '<html><body><p>a<script>var x = 1;</script> b</p><p>c<style>p {}</style>  d</p></body></html>',
+    'script with markup': '<html><body><script>if (a < b && c) {}</script><p>text</p></body></html>',
+    'cdata': xhtml_head + '<body><p>a <![CDATA[ b <c> ]]> d</p></body></html>',
+    'xhtml comments': xhtml_head + '<body><p>x<!-- note --> y</p><?pi data?><p>z</p></body></html>',
+}
+
+def is_well_formed(document, language):
+    try:
+        get_text_array_lxml(document, language)
+        return True
+    except Exception:
+        return False
+
+def compare(name, document, language):
+    expected = get_text_array_bs4(document, language)
+    result = get_text_array(document, language)
+    if result == expected:
+        return True
+    print(f'{name} differs:')
+    print(f'bs4:  {expected}')
+    print(f'lxml: {result}')
+    return False
+
+def main():
+    parser = argparse.ArgumentParser(description='Check the lxml chapter extraction against the bs4 one.')
+    parser.add_argument('--language', type=str, default='eng', help='ISO-639-3 language code')
+    parser.add_argument('files', nargs='*', help='EPUB files whose spine documents are checked too')
+    args = parser.parse_args()
+
+    documents = list(cases.items())
+    for file in args.files:
+        epubBook = epub.read_epub(file, {'ignore_ncx': True})
+        documents += [(f'{file}: {doc.get_name()}', doc.get_content().decode('utf-8')) for doc in get_spine_docs(epubBook)]
+    failures = [name for name, document in documents if not compare(name, document, args.language)]
+    fallbacks = sum(1 for name, document in documents if not is_well_formed(document, args.language))
+    print(f'{fallbacks} of {len(documents)} documents parsed by the BeautifulSoup fallback')
+    if failures:
+        print(f'{len(failures)} of {len(documents)} documents differ')
+        sys.exit(1)
+    print(f'{len(documents)} documents, outputs are identical')
+
+if __name__ == '__main__':
+    main()
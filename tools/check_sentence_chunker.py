@@ -0,0 +1,114 @@
+# Property check of the SentenceChunker against the former recursive
+# split_sentence() of get_sentences() (copied below as the reference).
+# Random sentences mixing words, spaces, punctuation and long unpunctuated
+# runs are split by both implementations and must give the same chunks.
+#
+# Usage (from the ebook2audiobook root directory):
+#   python tools/check_sentence_chunker.py [--runs 5000] [--seed 0]
+
+import argparse
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from lib.classes.sentence_chunker import SentenceChunker
+
+def legacy_split_sentence(sentence, max_chars, lang):
+    def find_best_split_point_prioritize_punct(sentence, max_chars):
+        best_index = -1
+        min_diff = float('inf')
+        punctuation_priority = '.!?,;:'
+        space_priority = ' '
+        for i in range(1, min(len(sentence), max_chars)):
+            if sentence[i] in punctuation_priority:
+                left_len = i
+                right_len = len(sentence) - i
+                diff = abs(left_len - right_len)
+                if left_len <= max_chars and right_len <= max_chars and diff < min_diff:
+                    best_index = i + 1
+                    min_diff = diff
+        if best_index == -1:
+            for i in range(1, min(len(sentence), max_chars)):
+                if sentence[i] in space_priority:
+                    left_len = i
+                    right_len = len(sentence) - i
+                    diff = abs(left_len - right_len)
+                    if left_len <= max_chars and right_len <= max_chars and diff < min_diff:
+                        best_index = i + 1
+                        min_diff = diff
+        return best_index
+
+    def split_sentence(sentence):
+        sentence = sentence.strip()
+        if len(sentence) <= max_chars:
+            if lang not in ['zho', 'jpn', 'kor', 'tha', 'lao', 'mya', 'khm']:
+                if sentence and sentence[-1].isalpha():
+                    return [sentence + ' -']
+            return [sentence]
+        split_index = find_best_split_point_prioritize_punct(sentence, max_chars)
+        if split_index == -1:
+            split_index = len(sentence) // 2
+        delim_used = sentence[split_index - 1] if split_index > 0 else None
+        end = ''
+        if lang not in ['zho', 'jpn', 'kor', 'tha', 'lao', 'mya', 'khm']:
+            end = ' -' if delim_used == ' ' else end
+        part1 = sentence[:split_index].rstrip()
+        part2 = sentence[split_index:].lstrip(' ,;:')
+        result = []
+        if len(part1) <= max_chars:
+            if part1 and part1[-1].isalpha():
+                part1 += end
+            result.append(part1)
+        else:
+            result.extend(split_sentence(part1))
+        if part2:
+            if len(part2) <= max_chars:
+                if part2 and part2[-1].isalpha():
+                    part2 += ' -'
+                result.append(part2)
+            else:
+                result.extend(split_sentence(part2))
+        return result
+
+    return split_sentence(sentence)
+
+alphabet = ['a', 'b', 'é', '中', '1', ' ', ' ', ' ', '.', ',', ';', ':', '!', '?', '\t', '\n', '-', '"']
+
+def random_sentence(rng):
+    parts = []
+    for _ in range(rng.randint(1, 12)):
+        kind = rng.random()
+        if kind < 0.5:
+            parts.append(''.join(rng.choice(alphabet) for _ in range(rng.randint(0, 60))))
+        elif kind < 0.8:
+            # long unpunctuated run, like OCR'd text
+            parts.append(''.join(rng.choice('abcdefgh') for _ in range(rng.randint(50, 900))))
+        else:
+            parts.append(' '.join('word' for _ in range(rng.randint(1, 80))))
+    return ''.join(parts).strip()
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare SentenceChunker with the former recursive split_sentence().')
+    parser.add_argument('--runs', type=int, default=5000)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+    failures = 0
+    for run in range(args.runs):
+        sentence = random_sentence(rng)
+        max_chars = rng.randint(2, 250)
+        lang = rng.choice(['eng', 'fra', 'zho', 'jpn', 'tha'])
+        expected = legacy_split_sentence(sentence, max_chars, lang)
+        result = list(SentenceChunker(max_chars, lang).split(sentence))
+        if result != expected:
+            failures += 1
+            if failures <= 5:
+                print(f'MISMATCH run={run} lang={lang} max_chars={max_chars}\n{sentence!r}\nexpected: {expected}\nresult:   {result}')
+    print(f'{args.runs} random sentences checked, {failures} mismatches')
+    if failures:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()